@@ -11,6 +11,7 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage , BaseMessage
 import json
 import os
+from utils.ttl_cache import TTLCache
 
 # from utils import api_key , google_developer_api_key
 api_key  = os.getenv("OPEN_API_KEY", "")
@@ -18,6 +19,31 @@ genai_api_key = os.getenv("GENAI_API_KEY")
 
 LOCATION = "us-central1"
 
+# Chat model clients keep HTTP connection pools, TLS sessions and credentials, so
+# they are built once per (model_type, model_id, location) and shared by every
+# request; max_tokens/temperature are applied per call on a shallow copy.
+llm_client_cache = TTLCache(
+    maxsize=int(os.getenv("LLM_CLIENT_CACHE_SIZE", 16)),
+    ttl=float(os.getenv("LLM_CLIENT_CACHE_TTL", 6 * 3600)),
+    name="llm_clients",
+)
+
+
+def _field_name(model, name):
+    """Field of a LangChain model called `name` or aliased to it (max_tokens is max_output_tokens on Vertex/GenAI)."""
+    for field_name, info in type(model).model_fields.items():
+        if name in (field_name, info.alias):
+            return field_name
+    return name
+
+
+def with_call_settings(model, max_tokens, temperature):
+    """Shallow copy of a cached client with per-call settings; the underlying HTTP/gRPC clients are shared."""
+    return model.model_copy(update={
+        _field_name(model, "max_tokens"): max_tokens,
+        _field_name(model, "temperature"): temperature,
+    })
+
 class Agent(ABC):
     """
     The core class for all Agents
@@ -45,7 +71,7 @@ class Agent(ABC):
             self.temperature = temperature
             self.location = location
             self.model_type = model_type
-            self.model = self._initialize_model()
+            self.model = self._get_model()
 
         
 
@@ -55,7 +81,7 @@ class Agent(ABC):
         self.temperature = temperature
         self.model_type = model_type
         self.location = location
-        self.model = self._initialize_model()
+        self.model = self._get_model()
 
     def _default_safety_settings(self) -> Dict[HarmCategory, HarmBlockThreshold]:
         return {
@@ -65,6 +91,11 @@ class Agent(ABC):
             HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
         }
 
+    def _get_model(self):
+        key = (self.model_type, self.model_id, self.location)
+        model = llm_client_cache.get_or_load(key, self._initialize_model)
+        return with_call_settings(model, self.max_tokens, self.temperature)
+
     def _initialize_model(self):
         if self.model_type == "openai":
             return ChatOpenAI(
@@ -128,6 +159,20 @@ class Agent(ABC):
         except Exception as e:
             raise Exception(f"Error streaming response generate_llm_response_v_streaming: {e}")            
 
+    async def agenerate_llm_response_v_streaming(self, prompt: str):
+        """Async counterpart of generate_llm_response_v_streaming; holds no thread while waiting for tokens."""
+        try:
+            response_stream = self.model.astream(prompt)
+            if "claude" in self.model_id or "gpt" in self.model_id or 'thinking' in self.model_id or "gemini" in self.model_id:
+                async for chunk in response_stream:
+                    yield chunk.content
+            else:
+                async for chunk in response_stream:
+                    yield str(chunk)
+
+        except Exception as e:
+            raise Exception(f"Error streaming response agenerate_llm_response_v_streaming: {e}")
+
     def generate_llm_response_in_json(self,context_prompt):
         try:
             parser = JsonOutputParser()
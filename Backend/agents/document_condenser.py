@@ -0,0 +1,205 @@
+"""
+Map-reduce condensation of uploads that do not fit the model's context.
+
+Oversized files are split into chunks on page/section boundaries, every chunk
+is condensed concurrently on one executor shared by all requests (at most
+CONDENSE_MAX_WORKERS model calls in flight per process) and the condensed
+chunks are joined back per file. Chunk results are cached by hash of model,
+target size and text, so regenerating a proposal over the same upload does not
+call the model again. Token counts are cl100k counts, like the ones persisted
+at upload time.
+
+Any object with `invoke(prompt)` can stand in for the model; ExtractiveModel
+is a deterministic local one for testing:
+
+    python -m agents.document_condenser requirements.txt --budget 4000
+    python -m agents.document_condenser requirements.txt --budget 4000 --model-id gemini-2.5-flash --model-type google_genai
+"""
+import argparse
+import hashlib
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+from .core import Agent
+from utils import logger
+from utils.model_token_manager import get_valid_llm_config, number_of_tokens, truncate_to_tokens
+from utils.prompt_assembler import file_budget_for_model
+from utils.retrieval import split_into_chunks
+from utils.ttl_cache import TTLCache
+
+CONDENSE_MAX_WORKERS = int(os.getenv("CONDENSE_MAX_WORKERS", 4))
+CONDENSE_CHUNK_TOKENS = int(os.getenv("CONDENSE_CHUNK_TOKENS", 6000))
+CONDENSE_MIN_CHUNK_TOKENS = int(os.getenv("CONDENSE_MIN_CHUNK_TOKENS", 150))
+CONDENSE_OUTPUT_TOKENS = int(os.getenv("CONDENSE_OUTPUT_TOKENS", 4096))
+CONDENSE_ROUNDS = int(os.getenv("CONDENSE_ROUNDS", 2))
+# Share of the room left after the required segments that condensed files may use;
+# the rest stays available for chat history.
+CONDENSE_FILE_SHARE = float(os.getenv("CONDENSE_FILE_SHARE", 0.8))
+CONDENSE_MODEL_ID = os.getenv("CONDENSE_MODEL_ID")
+CONDENSE_MODEL_TYPE = os.getenv("CONDENSE_MODEL_TYPE")
+
+# Shared so concurrent proposals queue for the same workers instead of each
+# starting CONDENSE_MAX_WORKERS threads of its own.
+condense_executor = ThreadPoolExecutor(max_workers=CONDENSE_MAX_WORKERS, thread_name_prefix="condense")
+
+condensed_chunk_cache = TTLCache(
+    maxsize=int(os.getenv("CONDENSE_CACHE_SIZE", 2048)),
+    ttl=float(os.getenv("CONDENSE_CACHE_TTL", 24 * 3600)),
+    name="condensed_chunks",
+)
+
+CONDENSE_PROMPT = """
+<SYSTEM_PROMPT>
+You are condensing one part of a document a user uploaded for a software requirements analysis.
+Rewrite the excerpt in at most {target_words} words. Keep every requirement, constraint, business rule,
+actor, integration, figure, date and name. Drop boilerplate, repetition and formatting. Use short
+bullet points and do not add anything that is not in the excerpt.
+</SYSTEM_PROMPT>
+<EXCERPT source="{source}">
+{text}
+</EXCERPT>
+"""
+
+
+class ExtractiveModel:
+    """
+    Local stand-in for a chat model: keeps the leading sentences of each
+    paragraph of the excerpt up to the requested word count.
+    """
+
+    def invoke(self, prompt: str) -> str:
+        target_words = int(re.search(r"at most (\d+) words", prompt).group(1))
+        excerpt = re.search(r"<EXCERPT[^>]*>\n(.*)\n</EXCERPT>", prompt, re.S).group(1)
+        paragraphs = [p.strip() for p in excerpt.split("\n\n") if p.strip()]
+        kept, words = [], 0
+        for depth in range(1, 4):
+            kept, words = [], 0
+            for paragraph in paragraphs:
+                lead = " ".join(re.split(r"(?<=[.!?])\s+", paragraph)[:depth])
+                kept.append(f"- {lead}")
+                words += len(lead.split())
+            if words > target_words:
+                break
+        return " ".join("\n".join(kept).split(" ")[:target_words])
+
+
+class DocumentCondenser(Agent):
+
+    agentType: str = "DocumentCondenser"
+
+    def __init__(self, model_id='', model_type=None, location=None, model=None,
+                 chunk_tokens: int = CONDENSE_CHUNK_TOKENS):
+        """`model` replaces the provider client, e.g. ExtractiveModel() or a LangChain fake chat model."""
+        super().__init__(
+            model_id='' if model is not None else model_id,
+            max_tokens=CONDENSE_OUTPUT_TOKENS,
+            temperature=0.0,
+            model_type=model_type,
+            location=location,
+        )
+        if model is not None:
+            self.model_id = model_id or type(model).__name__
+            self.model_type = model_type
+            self.model = model
+        self.chunk_tokens = chunk_tokens
+
+    def condense_chunk(self, source: str, text: str, target_tokens: int) -> str:
+        key = hashlib.sha256(f"{self.model_id}\0{target_tokens}\0{text}".encode("utf-8", errors="surrogatepass")).hexdigest()
+
+        def load():
+            prompt = CONDENSE_PROMPT.format(target_words=int(target_tokens * 0.75), source=source, text=text)
+            return self.generate_llm_response(prompt).strip()
+
+        try:
+            return condensed_chunk_cache.get_or_load(key, load)
+        except Exception as e:
+            # Keep the start of the chunk rather than failing the whole proposal.
+            logger.warning(f"Condensing {source} failed, truncating it instead: {e}")
+            return truncate_to_tokens(text, target_tokens)
+
+    def condense_files(self, files: List[Dict[str, Any]], token_budget: int) -> List[Dict[str, Any]]:
+        """
+        Condense attachments from DB.read_file_texts to about `token_budget`
+        tokens in total. Returns new file dicts; each condensed chunk becomes a
+        section so the prompt assembler can still cut on chunk boundaries.
+        """
+        for round_number in range(1, CONDENSE_ROUNDS + 1):
+            totals = [f.get("token_count") if f.get("token_count") is not None else number_of_tokens(f.get("text") or "")
+                      for f in files]
+            total = sum(totals)
+            if total <= token_budget:
+                break
+            ratio = token_budget / total
+
+            jobs = []
+            for file_index, file in enumerate(files):
+                text = file.get("text") or ""
+                for chunk in split_into_chunks(text, file.get("sections") or [], self.chunk_tokens):
+                    chunk_text = text[chunk["start"]:chunk["end"]]
+                    target = max(CONDENSE_MIN_CHUNK_TOKENS, int(number_of_tokens(chunk_text) * ratio))
+                    source = f"{file['file_name']}, {chunk['label']}"
+                    jobs.append((file_index, chunk["label"], source, chunk_text, target))
+
+            results = list(condense_executor.map(lambda job: self.condense_chunk(job[2], job[3], job[4]), jobs))
+
+            condensed = [{**f, "text": "", "sections": []} for f in files]
+            for (file_index, label, _, _, _), summary in zip(jobs, results):
+                file = condensed[file_index]
+                part = f"[{label}]\n{summary}\n\n"
+                start = len(file["text"])
+                file["text"] += part
+                file["sections"].append({"label": label, "start": start, "end": start + len(part),
+                                         "token_count": number_of_tokens(part)})
+            for file in condensed:
+                file["token_count"] = sum(s["token_count"] for s in file["sections"])
+            logger.info(
+                f"Condensed {len(files)} file(s) from {total} to {sum(f['token_count'] for f in condensed)} tokens "
+                f"(budget {token_budget}, {len(jobs)} chunk(s), round {round_number})"
+            )
+            files = condensed
+        return files
+
+
+def condense_files_for_model(files: List[Dict[str, Any]], model_id: str, reserved_texts: List[str],
+                             llm_config=None, model=None, model_type=None) -> List[Dict[str, Any]]:
+    """
+    Condense `files` when they do not fit the prompt budget of `model_id` next
+    to `reserved_texts` (the required segments). Files that fit are returned as is.
+    """
+    model_config = get_valid_llm_config(llm_config, model_id, model_type)
+    available = file_budget_for_model(model_id, reserved_texts, model_config)
+    file_tokens = sum(f.get("token_count") if f.get("token_count") is not None else number_of_tokens(f.get("text") or "")
+                      for f in files)
+    if file_tokens <= available:
+        return files
+
+    condenser = DocumentCondenser(
+        model_id=CONDENSE_MODEL_ID or model_config["model_name"],
+        model_type=CONDENSE_MODEL_TYPE or model_config["model_type"],
+        location=model_config.get("location"),
+        model=model,
+    )
+    return condenser.condense_files(files, int(available * CONDENSE_FILE_SHARE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Condense a text file to a token budget")
+    parser.add_argument("path")
+    parser.add_argument("--budget", type=int, required=True)
+    parser.add_argument("--model-id", help="Condense with this model instead of the local extractive one")
+    parser.add_argument("--model-type")
+    parser.add_argument("--chunk-tokens", type=int, default=CONDENSE_CHUNK_TOKENS)
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8") as f:
+        text = f.read()
+    model = None if args.model_id else ExtractiveModel()
+    condenser = DocumentCondenser(model_id=args.model_id or '', model_type=args.model_type, model=model,
+                                  chunk_tokens=args.chunk_tokens)
+    files = [{"file_name": os.path.basename(args.path), "text": text, "token_count": None, "sections": []}]
+    print(condenser.condense_files(files, args.budget)[0]["text"])
+
+
+if __name__ == "__main__":
+    main()
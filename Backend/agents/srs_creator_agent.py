@@ -1,17 +1,45 @@
 from abc import ABC
+import asyncio
 from .core import Agent 
+from .document_condenser import condense_files_for_model
 import json 
-from utils.model_token_manager import adjust_prompt_and_history_for_proposal
+from utils import blob_store
+from utils.prompt_assembler import PromptSegment, assemble_prompt_for_model, file_budget_for_model
+from utils.retrieval import select_relevant_chunks
+from utils.chat_history_manager import HISTORY_SUMMARY_MAX_TOKENS
+from utils.response_cache import response_cache
 
 class SRSCreatorAgent(Agent, ABC):
     
     agentType: str = "SRSCreatorAgent"
 
     def generate_srs_document(self, chat_history, user_query, model_type, model_id, temperature, file_text):
+        """`file_text` is the list from DB.read_file_texts or a plain string."""
         try:
-            base_prompt = f"""
-            <USER_QUERY>{user_query}</USER_QUERY>
-            
+            context_prompt = self.prepare_srs_document(chat_history, user_query, model_type, model_id, temperature, file_text)
+            for chunk in self.generate_llm_response_v_streaming(context_prompt):
+                yield chunk
+
+        except Exception as e:
+            raise Exception(f"Error streaming response generate_srs_document: {e}")
+
+    async def agenerate_srs_document(self, chat_history, user_query, model_type, model_id, temperature, file_text):
+        """Async generate_srs_document: the stream itself holds no thread, however long it runs."""
+        try:
+            # Retrieval, condensing and prompt assembly are bounded blocking work, so they run off the event loop.
+            context_prompt = await asyncio.to_thread(
+                self.prepare_srs_document, chat_history, user_query, model_type, model_id, temperature, file_text
+            )
+            async for chunk in self.agenerate_llm_response_v_streaming(context_prompt):
+                yield chunk
+
+        except Exception as e:
+            raise Exception(f"Error streaming response agenerate_srs_document: {e}")
+
+    def prepare_srs_document(self, chat_history, user_query, model_type, model_id, temperature, file_text):
+        """Initializes the model for the SRS request and returns its prompt."""
+        try:
+            system_prompt = """
             <SYSTEM_PROMPT>
             You are an expert software requirements analyst. Your task is to create a comprehensive Software Requirements Specification (SRS) document based on the user's query and requirements.
 
@@ -79,10 +107,30 @@ class SRSCreatorAgent(Agent, ABC):
 
             </SYSTEM_PROMPT>
             """
+
+            # Large uploads are narrowed to the chunks relevant to the query; whatever
+            # still cannot fit is condensed chunk by chunk instead of losing its tail.
+            if isinstance(file_text, list) and file_text:
+                file_budget = file_budget_for_model(model_id, [system_prompt, user_query], model_type=model_type)
+                file_text = select_relevant_chunks(blob_store, file_text, user_query, file_budget)
+                file_text = condense_files_for_model(file_text, model_id, [system_prompt, user_query], model_type=model_type)
+
+            component = assemble_prompt_for_model(model_id, model_type=model_type, segments=[
+                PromptSegment("user_query", user_query, required=True, template="<USER_QUERY>{text}</USER_QUERY>\n"),
+                PromptSegment("system_prompt", system_prompt, required=True),
+                PromptSegment(
+                    "file_text",
+                    text=file_text if isinstance(file_text, str) else "",
+                    files=file_text if isinstance(file_text, list) else None,
+                    priority=1,
+                    template="<USER_UPLOADED_FILE>: {text} </USER_UPLOADED_FILE>",
+                ),
+                # The most recent turns matter most, so history is cut from the front.
+                PromptSegment("chat_history", chat_history or "", priority=2, keep="tail",
+                              template="<CHAT_HISTORY> {text}</CHAT_HISTORY>"),
+            ])
             
-            component = adjust_prompt_and_history_for_proposal(model_id, base_prompt, chat_history, file_text)
-            
-            context_prompt = component.get('prompt', base_prompt)
+            context_prompt = component['prompt']
             required_token = component.get('required_token', 8192)
             model_name = component.get('model_name', model_id)
             model_type = component.get('model_type', model_type)
@@ -94,26 +142,25 @@ class SRSCreatorAgent(Agent, ABC):
                 model_type=model_type,
                 location=component.get('location')
             )
-            
-            for chunk in self.generate_llm_response_v_streaming(context_prompt):
-                yield chunk
-                
+            return context_prompt
+
         except Exception as e:
-            raise Exception(f"Error streaming response generate_srs_document: {e}")
+            raise Exception(f"Error preparing prepare_srs_document: {e}")
         
 
 
-    def generate_summary(self, model_id,model_type, temperature , src_document):
+    def generate_summary(self, model_id,model_type, temperature , src_document, src_document_tokens=None, bypass_cache=False):
+        """Summaries of an unchanged SRS are served from the response cache unless `bypass_cache`."""
         try:
 
-            base_prompt = f"""
+            system_prompt = """
             <SYSTEM_PROMPT>
             You are an executive-level technical communication specialist. Create a concise, professional summary of the SRS document below formatted as a stakeholder email.
             JSON FORMAT:
-            {{
-            "subject": "SRS Summary for {src_document}",
+            {
+            "subject": "SRS Summary for <project name>",
             "body": "Body here",
-            }}
+            }
             Your summary must include:
             • Project overview (1-2 sentences)
             • 3-5 key requirements/features
@@ -123,14 +170,17 @@ class SRSCreatorAgent(Agent, ABC):
             
             Keep the summary under 300 words. Use professional language, bullet points for clarity, and a formal but approachable tone.
             
-            Document to summarize:
-            {src_document}
+            Document to summarize is in <SRS_DOCUMENT>.
             </SYSTEM_PROMPT>
             """
             
-            component = adjust_prompt_and_history_for_proposal(model_id, base_prompt, '', src_document)
+            component = assemble_prompt_for_model(model_id, model_type=model_type, segments=[
+                PromptSegment("system_prompt", system_prompt, required=True),
+                PromptSegment("srs_document", src_document or "", priority=1, token_count=src_document_tokens,
+                              template="<SRS_DOCUMENT>{text}</SRS_DOCUMENT>"),
+            ])
             
-            context_prompt = component.get('prompt', base_prompt)
+            context_prompt = component['prompt']
             required_token = component.get('required_token', 8192)
             model_name = component.get('model_name', model_id)
             model_type = component.get('model_type', model_type)
@@ -142,8 +192,46 @@ class SRSCreatorAgent(Agent, ABC):
                 model_type=model_type,
                 location=component.get('location')
             )
-            response = self.generate_llm_response_in_json(context_prompt)
+            response = response_cache.get_or_compute(
+                context_prompt, model_name, temperature,
+                lambda: self.generate_llm_response_in_json(context_prompt),
+                bypass=bypass_cache,
+            )
             return response
 
         except Exception as e:
-            raise Exception(f"Error streaming response generate_summary: {e}")
\ No newline at end of file
+            raise Exception(f"Error streaming response generate_summary: {e}")
+
+
+    def summarize_history(self, model_id, model_type, previous_summary, user_turns):
+        """Rolling summary of older user turns for ChatHistoryManager.refresh_history_summary."""
+        try:
+            system_prompt = f"""
+            <SYSTEM_PROMPT>
+            You maintain a running summary of what a user has asked for while refining a Software Requirements Specification.
+            Merge the new requests into the previous summary. Keep every concrete requirement, change, removal and decision,
+            and when a later request overrides an earlier one keep only the latest. Use short bullet points, no commentary,
+            at most {int(HISTORY_SUMMARY_MAX_TOKENS * 0.75)} words.
+            </SYSTEM_PROMPT>
+            """
+            new_requests = "\n".join(f"User: {turn}" for turn in user_turns)
+
+            component = assemble_prompt_for_model(model_id, model_type=model_type, segments=[
+                PromptSegment("system_prompt", system_prompt, required=True),
+                PromptSegment("previous_summary", previous_summary or "", required=True,
+                              template="<PREVIOUS_SUMMARY>{text}</PREVIOUS_SUMMARY>"),
+                PromptSegment("new_requests", new_requests, priority=1, keep="tail",
+                              template="<NEW_REQUESTS>{text}</NEW_REQUESTS>"),
+            ])
+
+            self.initialize_model_from_child(
+                model_id=component.get('model_name', model_id),
+                max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+                temperature=0.0,
+                model_type=component.get('model_type', model_type),
+                location=component.get('location')
+            )
+            return self.generate_llm_response(component['prompt'])
+
+        except Exception as e:
+            raise Exception(f"Error generating summarize_history: {e}")
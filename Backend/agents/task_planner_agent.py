@@ -1,15 +1,40 @@
 from abc import ABC
 from .core import Agent 
 import json 
-from utils.model_token_manager import adjust_prompt_and_history_for_proposal
+import uuid
+from utils.prompt_assembler import PromptSegment, assemble_prompt_for_model
+from utils.response_cache import response_cache
 from utils import logger
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+def assign_task_ids(task_plan):
+    """
+    Replace the model's task ids (TASK-001, ...) with unique ones, keeping the
+    dependencies between tasks. The ids become task_id primary keys, and a
+    replayed or repeated plan would otherwise collide with the first insert.
+    """
+    if not isinstance(task_plan, dict) or not isinstance(task_plan.get("tasks"), list):
+        return task_plan
+    tasks = [task for task in task_plan["tasks"] if isinstance(task, dict)]
+    new_ids = {}
+    for task in tasks:
+        new_id = f"TASK-{uuid.uuid4().hex[:8]}"
+        if task.get("id") is not None:
+            new_ids[str(task["id"])] = new_id
+        task["id"] = new_id
+    for task in tasks:
+        if isinstance(task.get("dependencies"), list):
+            task["dependencies"] = [new_ids.get(str(dep), dep) for dep in task["dependencies"]]
+    return task_plan
+
 
 class TaskPlannerAgent(Agent, ABC):
     
     agentType: str = "TaskPlannerAgent"
 
-    def generate_task_plan(self, model_type: str, model_id: str, temperature: float, src_document: str) -> Dict[str, Any]:
+    def generate_task_plan(self, model_type: str, model_id: str, temperature: float, src_document: str,
+                           src_document_tokens: Optional[int] = None, bypass_cache: bool = False,
+                           project_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Generate a comprehensive task plan from an SRS document
         
@@ -18,12 +43,15 @@ class TaskPlannerAgent(Agent, ABC):
             model_id: Specific model identifier
             temperature: Creativity parameter for generation
             src_document: The SRS document content
+            src_document_tokens: Token count of src_document if already known (project_srs)
+            bypass_cache: Call the model even if an identical request is in the response cache
+            project_id: Project the plan is for; cached plans are never shared between projects
             
         Returns:
             Dict containing project analysis and task breakdown
         """
         try:
-            base_prompt = f"""
+            base_prompt = """
             You are an expert Task Planner Agent specializing in software development project management. Your role is to analyze the provided document and break it down into actionable, well-defined tasks.
             
             INSTRUCTIONS:
@@ -45,10 +73,10 @@ class TaskPlannerAgent(Agent, ABC):
             - Complexity level (high, medium, low) - YOU decide this based on technical difficulty
             
             FORMAT YOUR RESPONSE AS JSON:
-            {{
+            {
                 "project_analysis": "Brief overall analysis of the project based on the document",
                 "tasks": [
-                    {{
+                    {
                         "id": "TASK-001",
                         "task_title": "Descriptive Task Name",
                         "description": "Detailed explanation of what needs to be done",
@@ -60,26 +88,23 @@ class TaskPlannerAgent(Agent, ABC):
                         "complexity": "high|medium|low",
                         "estimated_hours": number,
                         "status": "open"
-                    }}
+                    }
                 ]
-            }}
+            }
             
             Ensure your task breakdown is comprehensive, covering all aspects of the project described in the document.
             
             The SRS document is as follows:
-            {src_document}
             """
             
-            # Adjust prompt based on the model and document content
-            component = adjust_prompt_and_history_for_proposal(
-                model_name=model_id, 
-                base_prompt=base_prompt, 
-                llm_response='', 
-                file_data=src_document
-            )
+            # Pack the instructions and as much of the document as fits the model's budget
+            component = assemble_prompt_for_model(model_id, model_type=model_type, segments=[
+                PromptSegment("system_prompt", base_prompt, required=True),
+                PromptSegment("srs_document", src_document or "", priority=1, token_count=src_document_tokens),
+            ])
             
             # Extract optimized parameters
-            context_prompt = component.get('prompt', base_prompt)
+            context_prompt = component['prompt']
             required_token = component.get('required_token', 8192)
             model_name = component.get('model_name', model_id)
             model_type = component.get('model_type', model_type)
@@ -94,30 +119,40 @@ class TaskPlannerAgent(Agent, ABC):
                 location=location
             )
             
-            # Generate response from LLM
-            response = self.generate_llm_response_in_json(context_prompt)
+            def generate():
+                # Generate response from LLM
+                response = self.generate_llm_response_in_json(context_prompt)
             
-            # Ensure the response is properly formatted
-            if isinstance(response, str):
-                try:
-                    response_dict = json.loads(response)
-                    return response_dict
-                except json.JSONDecodeError:
-                    logger.error("Failed to parse JSON response from LLM")
-                    # Try to extract JSON from text response (handling cases where LLM adds explanatory text)
-                    import re
-                    json_match = re.search(r'({[\s\S]*})', response)
-                    if json_match:
-                        try:
-                            response_dict = json.loads(json_match.group(1))
-                            return response_dict
-                        except:
-                            pass
+                # Ensure the response is properly formatted
+                if isinstance(response, str):
+                    try:
+                        response_dict = json.loads(response)
+                        return response_dict
+                    except json.JSONDecodeError:
+                        logger.error("Failed to parse JSON response from LLM")
+                        # Try to extract JSON from text response (handling cases where LLM adds explanatory text)
+                        import re
+                        json_match = re.search(r'({[\s\S]*})', response)
+                        if json_match:
+                            try:
+                                response_dict = json.loads(json_match.group(1))
+                                return response_dict
+                            except:
+                                pass
                     
-                    # Return raw response if parsing fails
-                    return {"raw_response": response}
+                        # Return raw response if parsing fails
+                        return {"raw_response": response}
             
-            return response
+                return response
+
+            # Unparsed output is not cached, so the next click retries the model
+            task_plan = response_cache.get_or_compute(
+                context_prompt, model_name, temperature, generate,
+                bypass=bypass_cache,
+                cacheable=lambda plan: not (isinstance(plan, dict) and "raw_response" in plan),
+                scope=project_id,
+            )
+            return assign_task_ids(task_plan)
             
         except Exception as e:
             logger.error(f"Error in task plan generation: {str(e)}")
@@ -0,0 +1,110 @@
+"""
+Rows/sec of DB.insert_task (bulk_insert / execute_values) against the
+string-building insert it replaced: one INSERT whose VALUES list had a
+placeholder group per task, executed with a flat parameter tuple.
+
+Each size is inserted --repeat times into a throwaway project (ids prefixed
+`bench-`), which is deleted afterwards. Needs a migrated database.
+
+    python -m benchmarks.bulk_insert_benchmark --sizes 100 1000 10000 --repeat 3
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from utils import db_obj
+
+BENCH_PROJECT = "bench-project-bulk-insert"
+TASK_COLUMNS = """
+    task_id, title, description, project_id, status, priority, complexity,
+    estimated_hours, created_by, due_date, technical_requirements, acceptance_criteria,
+    created_at, updated_at
+"""
+
+
+def make_tasks(count: int):
+    return [
+        {
+            "task_id": f"bench-{uuid.uuid4().hex[:16]}",
+            "task_title": f"Task {i}: implement endpoint",
+            "description": "Implement the endpoint, validate the payload and persist the result. " * 3,
+            "priority": "high" if i % 3 == 0 else "medium",
+            "complexity": "medium",
+            "estimated_hours": 1 + i % 8,
+            "technical_requirements": "FastAPI, PostgreSQL, pytest",
+            "acceptance_criteria": "Returns 200 with the stored object; invalid payloads return 422.",
+        }
+        for i in range(count)
+    ]
+
+
+def string_building_insert(db, project_id: str, task_data):
+    """The insert_task body before bulk_insert, kept verbatim in behaviour."""
+    insert_query = f"INSERT INTO {db.schema}.tasks ({TASK_COLUMNS}) VALUES "
+    all_values = ()
+    for task in task_data:
+        insert_query += "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP),"
+        all_values += (
+            task["task_id"],
+            task.get("task_title"),
+            task.get("description"),
+            project_id,
+            task.get("status", "open"),
+            task.get("priority", "medium"),
+            task.get("complexity", "medium"),
+            task.get("estimated_hours", 4),
+            task.get("created_by"),
+            task.get("due_date"),
+            task.get("technical_requirements", ""),
+            task.get("acceptance_criteria", ""),
+        )
+    db.execute_query(insert_query[:-1], all_values)
+
+
+def bulk_insert(db, project_id: str, task_data):
+    db.insert_task(project_id, task_data)
+
+
+def clean_up(db):
+    db.execute_query(f"DELETE FROM {db.schema}.tasks WHERE project_id = %s", (BENCH_PROJECT,))
+
+
+def run(db, sizes, repeat: int):
+    db.insert_project(BENCH_PROJECT, "Bulk insert benchmark", None, None)
+    report = {}
+    try:
+        for size in sizes:
+            report[size] = {}
+            for name, insert in (("string_building", string_building_insert), ("bulk_insert", bulk_insert)):
+                timings = []
+                for _ in range(repeat):
+                    task_data = make_tasks(size)
+                    started = time.perf_counter()
+                    insert(db, BENCH_PROJECT, task_data)
+                    timings.append(time.perf_counter() - started)
+                    clean_up(db)
+                best = min(timings)
+                report[size][name] = {
+                    "median_seconds": round(statistics.median(timings), 4),
+                    "rows_per_second": round(size / best),
+                }
+            report[size]["speedup"] = round(
+                report[size]["bulk_insert"]["rows_per_second"] / report[size]["string_building"]["rows_per_second"], 2
+            )
+    finally:
+        clean_up(db)
+        db.execute_query(f"DELETE FROM {db.schema}.projects WHERE project_id = %s", (BENCH_PROJECT,))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rows/sec of bulk_insert vs the string-building insert it replaced")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(db_obj, args.sizes, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
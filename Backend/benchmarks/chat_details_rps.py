@@ -0,0 +1,178 @@
+"""
+Requests/sec of concurrent /fetch-user-chat-details calls when the async
+endpoint awaits AsyncDB (as main.py does) versus when it calls the blocking
+DB method directly (as it did before AsyncDB), plus the latency of a trivial
+/ping endpoint polled during the load, i.e. how long other requests and SSE
+streams on the same worker are stalled.
+
+Both variants are served by one uvicorn worker in a subprocess with the same
+pool size. With --db-latency-ms each request first runs `SELECT pg_sleep(...)`
+through the same data-access path, standing in for network round trips and a
+busy database; a local database answers too fast to show the difference.
+Needs a database with chat history, e.g.
+`python -m utils.migrations seed --messages 100000`; the user/project pair
+with the most messages is used unless --user-id/--project-id are given.
+The client uses httpx, which is not in requirements.txt.
+
+    python -m benchmarks.chat_details_rps --requests 2000 --concurrency 100 --page-size 50 --db-latency-ms 10
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+import httpx
+
+PING_INTERVAL = 0.01
+
+
+def create_app():
+    """uvicorn --factory target: the body of /fetch-user-chat-details on each data-access path."""
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+    from models import FetchUserChatDetailRequest
+    from utils import async_db_obj, db_obj
+    db_latency = float(os.getenv("BENCHMARK_DB_LATENCY_MS", 0)) / 1000
+    # Every query is logged at INFO with its SQL; that costs the same on both paths and would dominate the CPU.
+    logging.getLogger("sprint_speed").setLevel(logging.WARNING)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        await async_db_obj.open_pool()
+        yield
+        await async_db_obj.close_pool()
+        db_obj.close_pool()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.post("/blocking")
+    async def blocking(request: FetchUserChatDetailRequest):
+        if db_latency:
+            db_obj.retrieve_data("SELECT pg_sleep(%s)", (db_latency,))
+        chat_details, next_cursor = db_obj.get_user_chat_details(
+            request.user_id, request.project_id, page_size=request.page_size, cursor=request.cursor
+        )
+        return JSONResponse(content={"status": "success", "chat_details": chat_details, "next_cursor": next_cursor})
+
+    @app.post("/async")
+    async def awaiting(request: FetchUserChatDetailRequest):
+        if db_latency:
+            await async_db_obj.retrieve_data("SELECT pg_sleep(%s)", (db_latency,))
+        chat_details, next_cursor = await async_db_obj.get_user_chat_details(
+            request.user_id, request.project_id, page_size=request.page_size, cursor=request.cursor
+        )
+        return JSONResponse(content={"status": "success", "chat_details": chat_details, "next_cursor": next_cursor})
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    return app
+
+
+def busiest_chat():
+    from utils import db_obj
+    rows = db_obj.retrieve_data("""
+        SELECT c.user_id, c.project_id
+        FROM task_management.conversation c
+        JOIN task_management.conversation_message cm ON cm.conversation_id = c.conversation_id
+        GROUP BY c.user_id, c.project_id
+        ORDER BY COUNT(*) DESC
+        LIMIT 1
+    """)
+    if not rows:
+        raise Exception("No chat history found; seed some with `python -m utils.migrations seed`")
+    db_obj.close_pool()
+    return rows[0]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def load(client: httpx.AsyncClient, path: str, body: dict, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, pings, failures = [], [], []
+    done = asyncio.Event()
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                failures.append(response.status_code)
+
+    async def poll():
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/ping")
+            pings.append(time.perf_counter() - started)
+            await asyncio.sleep(PING_INTERVAL)
+
+    for _ in range(min(50, requests)):
+        await one()
+    latencies.clear()
+
+    poller = asyncio.create_task(poll())
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - started
+    done.set()
+    await poller
+    return {
+        "requests": requests,
+        "failures": len(failures),
+        "requests_per_second": round(requests / wall, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "ping_p50_ms": round(statistics.median(pings) * 1000, 1),
+        "ping_max_ms": round(max(pings) * 1000, 1),
+    }
+
+
+async def run(port: int, body: dict, requests: int, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency + 1, max_keepalive_connections=concurrency + 1)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=120) as client:
+        for _ in range(100):
+            try:
+                await client.get("/ping")
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+        return {path.strip("/"): await load(client, path, body, requests, concurrency) for path in ("/blocking", "/async")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Requests/sec of /fetch-user-chat-details, blocking DB vs AsyncDB")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--db-latency-ms", type=float, default=10, help="Extra database wait per request (pg_sleep)")
+    parser.add_argument("--user-id")
+    parser.add_argument("--project-id")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    user_id, project_id = (args.user_id, args.project_id) if args.user_id else busiest_chat()
+    body = {"user_id": user_id, "project_id": project_id, "page_size": args.page_size}
+    server = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "--factory", "benchmarks.chat_details_rps:create_app",
+        "--port", str(args.port), "--log-level", "warning", "--no-access-log", "--timeout-keep-alive", "120",
+    ], env={**os.environ, "BENCHMARK_DB_LATENCY_MS": str(args.db_latency_ms)})
+    try:
+        report = asyncio.run(run(args.port, body, args.requests, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+    print(json.dumps({"chat": body, "db_latency_ms": args.db_latency_ms, **report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
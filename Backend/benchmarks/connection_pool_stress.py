@@ -0,0 +1,180 @@
+"""
+Multi-threaded stress check for InstrumentedConnectionPool, using fake
+connections that take --connect-ms to open. Exits non-zero if a check fails.
+
+- saturation: --threads threads check out, hold and return connections in a
+  loop; in-use never exceeds maxconn, every checkout succeeds and the wait
+  stats record the contention.
+- timeout: with every connection held, a checkout fails with PoolTimeoutError
+  after its timeout and is counted.
+- slow connect: while one thread is stuck opening a new connection, idle
+  connections are still checked out and returned without waiting for it.
+- connect failure: a failed connect releases its reserved slot.
+
+    python -m benchmarks.connection_pool_stress --threads 32 --maxconn 8 --iterations 50
+"""
+import argparse
+import json
+import threading
+import time
+from types import SimpleNamespace
+from psycopg2 import extensions
+from utils.connection_pool import InstrumentedConnectionPool, PoolTimeoutError
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = 0
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+
+    def close(self):
+        self.closed = 1
+
+    def rollback(self):
+        pass
+
+
+class FakePool(InstrumentedConnectionPool):
+    """Pool whose connections are FakeConnections, opened after `connect_delay` seconds."""
+
+    def __init__(self, minconn, maxconn, connect_delay=0.0, fail_connects=0, **kwargs):
+        self.connect_delay = connect_delay
+        self.fail_connects = fail_connects
+        super().__init__(minconn, maxconn, **kwargs)
+
+    def _connect(self, key=None):
+        conn = FakeConnection()
+        self._pool.append(conn)
+        return conn
+
+    def new_connection(self):
+        time.sleep(self.connect_delay)
+        if self.fail_connects:
+            self.fail_connects -= 1
+            raise Exception("connection refused")
+        return FakeConnection()
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        raise Exception(f"Check failed: {message}")
+
+
+def saturation(threads: int, maxconn: int, iterations: int, hold: float, connect_delay: float):
+    # Half the connections stay idle between checkouts, the rest are reopened, so connects run under contention.
+    connection_pool = FakePool(maxconn // 2, maxconn, connect_delay=connect_delay, timeout=60)
+    over_limit = []
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(iterations):
+                conn = connection_pool.getconn()
+                in_use = connection_pool.stats()["in_use"]
+                if in_use > maxconn:
+                    over_limit.append(in_use)
+                time.sleep(hold)
+                connection_pool.putconn(conn)
+        except Exception as e:
+            errors.append(repr(e))
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    stats = connection_pool.stats()
+    stats["wall_seconds"] = round(time.perf_counter() - started, 3)
+
+    check(not errors, f"checkouts failed: {errors[:3]}")
+    check(not over_limit, f"in_use exceeded maxconn: {max(over_limit or [0])}")
+    check(stats["checkouts"] == threads * iterations, f"{stats['checkouts']} checkouts, expected {threads * iterations}")
+    check(stats["peak_in_use"] == maxconn, f"peak_in_use {stats['peak_in_use']}, expected {maxconn}")
+    check(stats["in_use"] == 0 and stats["connecting"] == 0, "connections left checked out")
+    if threads > maxconn:
+        check(stats["exhausted_waits"] > 0, "no exhausted waits recorded although threads > maxconn")
+        check(stats["max_wait_seconds"] >= hold / 2, "max_wait_seconds does not reflect the contention")
+    check(stats["timeouts"] == 0, "unexpected timeouts")
+    return stats
+
+
+def timeout(maxconn: int, timeout_seconds: float):
+    connection_pool = FakePool(0, maxconn, timeout=60)
+    held = [connection_pool.getconn() for _ in range(maxconn)]
+    started = time.perf_counter()
+    try:
+        connection_pool.getconn(timeout=timeout_seconds)
+        raise Exception("Check failed: checkout of a saturated pool did not time out")
+    except PoolTimeoutError:
+        waited = time.perf_counter() - started
+    for conn in held:
+        connection_pool.putconn(conn)
+    stats = connection_pool.stats()
+    check(timeout_seconds <= waited < timeout_seconds + 0.5, f"timed out after {waited:.3f}s, expected {timeout_seconds}s")
+    check(stats["timeouts"] == 1 and stats["exhausted_waits"] == 1, f"timeouts/waits not counted: {stats}")
+    return {"timeout_seconds": timeout_seconds, "waited_seconds": round(waited, 3), "timeouts": stats["timeouts"]}
+
+
+def slow_connect(connect_delay: float):
+    connection_pool = FakePool(1, 4, connect_delay=connect_delay, timeout=60)
+    idle = connection_pool.getconn()
+    connection_pool.putconn(idle)
+    first = connection_pool.getconn()
+    # Pool is empty now, so this checkout has to open a connection and sleeps in new_connection.
+    connecting = threading.Thread(target=lambda: connection_pool.putconn(connection_pool.getconn()))
+    connecting.start()
+    time.sleep(min(connect_delay / 4, 0.1))
+
+    started = time.perf_counter()
+    for _ in range(100):
+        connection_pool.putconn(first)
+        first = connection_pool.getconn()
+        connection_pool.stats()
+    elapsed = time.perf_counter() - started
+    connection_pool.putconn(first)
+    connecting.join()
+    check(elapsed < connect_delay / 2, f"idle checkouts took {elapsed:.3f}s while another thread was connecting")
+    return {"connect_seconds": connect_delay, "idle_checkouts": 100, "idle_checkout_seconds": round(elapsed, 4)}
+
+
+def connect_failure():
+    connection_pool = FakePool(0, 1, fail_connects=1, timeout=1)
+    try:
+        connection_pool.getconn()
+        failed = False
+    except PoolTimeoutError:
+        raise
+    except Exception:
+        failed = True
+    check(failed, "connect failure was not raised")
+    conn = connection_pool.getconn(timeout=0.5)
+    connection_pool.putconn(conn)
+    stats = connection_pool.stats()
+    check(stats["connect_failures"] == 1 and stats["timeouts"] == 0, f"failed connect kept its slot: {stats}")
+    return {"connect_failures": stats["connect_failures"], "checkouts_after_failure": stats["checkouts"]}
+
+
+def run(threads: int, maxconn: int, iterations: int, hold_ms: float, connect_ms: float):
+    return {
+        "saturation": saturation(threads, maxconn, iterations, hold_ms / 1000, connect_ms / 1000),
+        "timeout": timeout(maxconn, 0.2),
+        "slow_connect": slow_connect(max(connect_ms / 1000, 0.5)),
+        "connect_failure": connect_failure(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-threaded stress check for InstrumentedConnectionPool")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--maxconn", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--hold-ms", type=float, default=5, help="How long each checkout keeps its connection")
+    parser.add_argument("--connect-ms", type=float, default=20, help="Time to open a new connection")
+    args = parser.parse_args()
+    print(json.dumps(run(args.threads, args.maxconn, args.iterations, args.hold_ms, args.connect_ms), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Fault-injection check for the DB retry policy: DB runs on stub connections
+whose connect or statement raises OperationalError on demand, and each
+scenario counts how often the statement reached the "server". Exits non-zero
+if a check fails.
+
+- insert: an INSERT whose connection drops after the server applied it is
+  not re-run (it would be written twice) and the error is raised.
+- idempotent: the same failure on a statement marked idempotent is retried.
+- checkout: a failed connect is retried and the INSERT then runs once.
+- read: a failed SELECT is retried.
+- bulk insert: a failed execute_values batch is not re-run.
+- outage: with the server refusing connections, a wave of concurrent reads
+  that all fail tries to rebuild the pool once, not once per failed attempt.
+
+    python -m benchmarks.db_retry_fault_injection
+"""
+import json
+import threading
+from types import SimpleNamespace
+from typing import Optional
+from psycopg2 import OperationalError, extensions
+from utils.connection_pool import InstrumentedConnectionPool
+from utils.database import DB
+from utils.retry_policy import CircuitBreaker, RetryPolicy
+
+
+class FaultyServer:
+    """Counts statements and injects the next `fail_connects` / `fail_statements` failures."""
+
+    def __init__(self, fail_connects: int = 0, fail_statements: int = 0):
+        self.fail_connects = fail_connects
+        self.fail_statements = fail_statements
+        self.connects = 0
+        self.executed = 0
+        self.applied = 0
+        # While `down`, every connect fails once all parties of `wave` have tried.
+        self.down = False
+        self.wave: Optional[threading.Barrier] = None
+        self.failed_rebuilds = 0
+
+
+class FaultyCursor:
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+
+    def execute(self, query, data=None):
+        server = self.connection.server
+        server.executed += 1
+        # The statement is applied before the connection drops, as when the server dies before acknowledging the commit.
+        server.applied += 1
+        if server.fail_statements:
+            server.fail_statements -= 1
+            self.connection.closed = 2
+            raise OperationalError("server closed the connection unexpectedly")
+
+    def mogrify(self, template, args):
+        return ("(" + ",".join(repr(arg) for arg in args) + ")").encode()
+
+    def fetchall(self):
+        return [(1,)]
+
+    def close(self):
+        self.closed = True
+
+
+class FaultyConnection:
+    encoding = "UTF8"
+
+    def __init__(self, server: FaultyServer):
+        self.server = server
+        self.closed = 0
+        self.autocommit = False
+        self.info = SimpleNamespace(transaction_status=extensions.TRANSACTION_STATUS_IDLE)
+
+    def cursor(self, name=None):
+        return FaultyCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class FaultyPool(InstrumentedConnectionPool):
+
+    def __init__(self, server: FaultyServer, minconn, maxconn, **kwargs):
+        self.server = server
+        super().__init__(minconn, maxconn, **kwargs)
+
+    def _connect(self, key=None):
+        conn = FaultyConnection(self.server)
+        self._pool.append(conn)
+        return conn
+
+    def new_connection(self):
+        self.server.connects += 1
+        if self.server.down:
+            self.server.wave.wait()
+            raise OperationalError("could not connect to server: Connection refused")
+        if self.server.fail_connects:
+            self.server.fail_connects -= 1
+            raise OperationalError("could not connect to server: Connection refused")
+        return FaultyConnection(self.server)
+
+
+class FaultyDB(DB):
+    """DB whose pools hand out FaultyConnections; no idle connections, so every checkout connects."""
+
+    def __init__(self, server: FaultyServer, maxconn: int = 2):
+        self.server = server
+        self.maxconn = maxconn
+        super().__init__(
+            schema="task_management", port="5432", host="fault-injection", username="", password="",
+            retry_policy=RetryPolicy(max_attempts=3, base_delay=0, max_delay=0, retry_on=(OperationalError,)),
+            circuit_breaker=CircuitBreaker(failure_threshold=100, reset_timeout=1, name="fault injection"),
+        )
+
+    def create_connection_pool(self):
+        if self.server.down:
+            self.server.failed_rebuilds += 1
+            raise OperationalError("could not connect to server: Connection refused")
+        return FaultyPool(self.server, 0, self.maxconn, timeout=1)
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        raise Exception(f"Check failed: {message}")
+
+
+def outage_wave(server: FaultyServer, threads: int = 8):
+    """`threads` concurrent reads against a server that refuses every connection."""
+    db = FaultyDB(server, maxconn=threads)
+    server.down = True
+    server.wave = threading.Barrier(threads, timeout=5)
+    errors = []
+
+    def read():
+        try:
+            db.retrieve_data("SELECT 1")
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=read) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return {"failed_reads": len(errors), "connects": server.connects,
+            "failed_rebuilds": server.failed_rebuilds, "pool_generation": db.pool_generation}
+
+
+def run_scenario(server: FaultyServer, operation):
+    db = FaultyDB(server)
+    try:
+        result, error = operation(db), None
+    except Exception as e:
+        result, error = None, e
+    return {
+        "succeeded": error is None,
+        "connects": server.connects,
+        "executed": server.executed,
+        "applied": server.applied,
+        "pool_generation": db.pool_generation,
+    }
+
+
+INSERT = "INSERT INTO task_management.conversation_message (message_id) VALUES (%s)"
+
+
+def run():
+    report = {}
+
+    report["insert"] = outcome = run_scenario(FaultyServer(fail_statements=1), lambda db: db.execute_query(INSERT, ("m-1",)))
+    check(not outcome["succeeded"], "a dropped INSERT was reported as successful")
+    check(outcome["executed"] == 1 and outcome["applied"] == 1, f"non-idempotent INSERT was re-run: {outcome}")
+
+    report["idempotent"] = outcome = run_scenario(
+        FaultyServer(fail_statements=1),
+        lambda db: db.execute_and_fetch(INSERT + " ON CONFLICT (message_id) DO NOTHING RETURNING 1", ("m-1",), idempotent=True))
+    check(outcome["succeeded"] and outcome["executed"] == 2, f"idempotent statement was not retried: {outcome}")
+    check(outcome["pool_generation"] == 1, f"pool was not rebuilt exactly once: {outcome}")
+
+    report["checkout"] = outcome = run_scenario(FaultyServer(fail_connects=1), lambda db: db.execute_query(INSERT, ("m-1",)))
+    check(outcome["succeeded"], f"INSERT failed after a retried connect: {outcome}")
+    check(outcome["connects"] >= 2 and outcome["executed"] == 1, f"checkout was not retried, or the INSERT ran twice: {outcome}")
+
+    report["read"] = outcome = run_scenario(
+        FaultyServer(fail_statements=1),
+        lambda db: db.retrieve_data("SELECT 1 FROM task_management.projects WHERE project_id = %s", ("p-1",)))
+    check(outcome["succeeded"] and outcome["executed"] == 2, f"read was not retried: {outcome}")
+
+    report["bulk_insert"] = outcome = run_scenario(
+        FaultyServer(fail_statements=1),
+        lambda db: db.bulk_insert("task_management.tasks", ["task_id", "title"], [("t-1", "a"), ("t-2", "b")]))
+    check(not outcome["succeeded"] and outcome["executed"] == 1, f"bulk insert was re-run: {outcome}")
+
+    report["outage"] = outcome = outage_wave(FaultyServer())
+    check(outcome["failed_reads"] == 8, f"reads succeeded against a down server: {outcome}")
+    check(outcome["failed_rebuilds"] == 1, f"one failure wave rebuilt the pool more than once: {outcome}")
+    return report
+
+
+def main():
+    print(json.dumps(run(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
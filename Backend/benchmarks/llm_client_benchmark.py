@@ -0,0 +1,150 @@
+"""
+Time to first token (streaming) and full response time (invoke) with and
+without the LLM client cache, measured against a local OpenAI-compatible mock.
+The mock can charge a delay per new connection (standing in for TCP/TLS setup)
+and per request (model latency).
+
+The openai client closes a stream's connection as soon as it sees [DONE], so
+streamed requests only save client construction; non-streaming calls also
+reuse pooled connections.
+
+Needs the LangChain packages from requirements.txt (agents.core imports every
+provider); no database, Redis or API key.
+
+    python -m benchmarks.llm_client_benchmark --requests 50 --connect-ms 40 --latency-ms 20
+"""
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from agents import core
+from agents.core import Agent, llm_client_cache
+
+MOCK_MODEL = "gpt-4o"
+
+
+def _mock_handler(connect_delay: float, latency: float, tokens: int):
+
+    class MockChatCompletions(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; Nagle would hold the body for a delayed ACK.
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            time.sleep(connect_delay)
+            super().setup()
+
+        def log_message(self, *args):
+            pass
+
+        def _write_chunk(self, payload: str):
+            data = payload.encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            time.sleep(latency)
+            if not body.get("stream"):
+                payload = json.dumps({
+                    "id": "mock", "object": "chat.completion", "created": 0, "model": MOCK_MODEL,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": " ".join(f"token{i}" for i in range(tokens))}}],
+                    "usage": {"prompt_tokens": 3, "completion_tokens": tokens, "total_tokens": tokens + 3},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i in range(tokens):
+                chunk = {
+                    "id": "mock", "object": "chat.completion.chunk", "created": 0, "model": MOCK_MODEL,
+                    "choices": [{"index": 0, "delta": {"content": f"token{i} "}, "finish_reason": None}],
+                }
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return MockChatCompletions
+
+
+def _agent():
+    # Endpoints build a new agent per request; only the client behind it is cached.
+    return Agent(model_id=MOCK_MODEL, max_tokens=256, temperature=0.2, model_type="openai")
+
+
+def time_to_first_token() -> float:
+    started = time.perf_counter()
+    first_token = None
+    for chunk in _agent().generate_llm_response_v_streaming("Say something"):
+        if chunk and first_token is None:
+            first_token = (time.perf_counter() - started) * 1000
+    if first_token is None:
+        raise Exception("The mock returned no tokens")
+    return first_token
+
+
+def time_to_response() -> float:
+    started = time.perf_counter()
+    _agent().generate_llm_response("Say something")
+    return (time.perf_counter() - started) * 1000
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[max(int(len(samples) * 0.95) - 1, 0)], 2),
+        "mean_ms": round(statistics.mean(samples), 2),
+    }
+
+
+def run(requests: int, connect_ms: float, latency_ms: float, tokens: int):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _mock_handler(connect_ms / 1000, latency_ms / 1000, tokens))
+    # Discarded clients drop their idle connections; that is expected, not an error.
+    server.handle_error = lambda request, client_address: None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    core.api_key = "mock"
+
+    report = {"requests": requests}
+    try:
+        for metric, measure in (("time_to_first_token", time_to_first_token), ("invoke", time_to_response)):
+            report[metric] = {}
+            for mode in ("uncached", "cached"):
+                llm_client_cache.invalidate()
+                samples = []
+                for _ in range(requests):
+                    if mode == "uncached":
+                        llm_client_cache.invalidate()
+                    samples.append(measure())
+                report[metric][mode] = _summary(samples)
+            report[metric]["p50_speedup"] = round(
+                report[metric]["uncached"]["p50_ms"] / report[metric]["cached"]["p50_ms"], 2
+            )
+    finally:
+        server.shutdown()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM latency with and without the client cache")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--connect-ms", type=float, default=40, help="Delay per new connection (TCP/TLS setup)")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Delay before the first token")
+    parser.add_argument("--tokens", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.connect_ms, args.latency_ms, args.tokens), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Latency of /models with and without the in-process cache. Three sources of
+the model list, each behind the /models response body from main.py:
+
+- database: query llm_models on every request (before the cache)
+- ttl_cache: DB.get_all_llm_models through the shared reference cache
+- registry: model_registry.all(), what /models serves now
+
+Each is timed in-process (--calls calls, no HTTP) and over HTTP
+(--requests sequential keep-alive requests to one uvicorn worker in a
+subprocess). Needs a migrated database. The HTTP client uses httpx, which is
+not in requirements.txt.
+
+    python -m benchmarks.models_endpoint_benchmark --calls 5000 --requests 2000
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+
+SOURCES = ("database", "ttl_cache", "registry")
+LLM_MODELS_QUERY = """
+    SELECT model_id, display_model_name, model_name, model_type, context_window, max_token, location, is_image_support, is_deleted, created_at
+    FROM task_management.llm_models
+    WHERE is_deleted = FALSE
+    ORDER BY created_at DESC
+"""
+
+
+def model_sources(db, registry):
+    from utils.model_registry import MODEL_COLUMNS
+
+    return {
+        "database": lambda: [dict(zip(MODEL_COLUMNS, row)) for row in db.retrieve_data(LLM_MODELS_QUERY)],
+        "ttl_cache": lambda: [dict(zip(MODEL_COLUMNS, row)) for row in db.get_all_llm_models()],
+        "registry": registry.all,
+    }
+
+
+def model_list(models):
+    """The /models response body."""
+    return [
+        {
+            "model_id": model.get("model_id"),
+            "display_model_name": model.get("display_model_name") or model["model_name"],
+            "model_name": model["model_name"],
+            "model_type": model["model_type"],
+            "context_window": model["context_window"],
+            "max_token": model["max_token"],
+            "location": model["location"],
+            "is_image_support": model["is_image_support"],
+            "is_deleted": model.get("is_deleted", False),
+            "created_at": model["created_at"].strftime('%Y-%m-%d %H:%M:%S') if model.get("created_at") else None
+        }
+        for model in models
+    ]
+
+
+def create_app():
+    """uvicorn --factory target: /models/<source> for each source."""
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+    from utils import db_obj
+    from utils.model_registry import model_registry
+    # Every query is logged at INFO with its SQL, which would be most of the uncached latency.
+    logging.getLogger("sprint_speed").setLevel(logging.WARNING)
+    model_registry.load(db_obj)
+    sources = model_sources(db_obj, model_registry)
+    app = FastAPI()
+
+    @app.get("/models/{source}")
+    async def get_models(source: str):
+        return JSONResponse(content={"status": "success", "models": model_list(sources[source]())}, status_code=200)
+
+    return app
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        "p50_us": round(statistics.median(ordered) * 1e6, 1),
+        "p99_us": round(ordered[int(len(ordered) * 0.99)] * 1e6, 1),
+    }
+
+
+def in_process(calls: int):
+    from utils import db_obj
+    from utils.model_registry import model_registry
+    logging.getLogger("sprint_speed").setLevel(logging.WARNING)
+    model_registry.load(db_obj)
+    report = {}
+    for name, source in model_sources(db_obj, model_registry).items():
+        latencies = []
+        for _ in range(calls):
+            started = time.perf_counter()
+            model_list(source())
+            latencies.append(time.perf_counter() - started)
+        report[name] = summarize(latencies)
+    report["reference_cache"] = db_obj.reference_cache.stats()
+    db_obj.close_pool()
+    return report
+
+
+def over_http(port: int, requests: int):
+    server = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "--factory", "benchmarks.models_endpoint_benchmark:create_app",
+        "--port", str(port), "--log-level", "warning", "--no-access-log",
+    ], env=dict(os.environ))
+    report = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30) as client:
+            for _ in range(100):
+                try:
+                    client.get("/models/registry")
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.2)
+            for source in SOURCES:
+                for _ in range(50):
+                    client.get(f"/models/{source}").raise_for_status()
+                latencies = []
+                for _ in range(requests):
+                    started = time.perf_counter()
+                    client.get(f"/models/{source}").raise_for_status()
+                    latencies.append(time.perf_counter() - started)
+                report[source] = summarize(latencies)
+    finally:
+        server.terminate()
+        server.wait()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency of /models with and without the in-process cache")
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+    report = {"in_process": in_process(args.calls), "http": over_http(args.port, args.requests)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Time to fit a prompt with a 1M-character upload into a model's context:
+the adjust_prompt_and_history_for_proposal path from before the cached
+tokenizer and the prompt assembler (its token-fitting steps are reproduced
+below as `legacy_*`),
+against assemble_prompt_for_model as srs_creator_agent calls it now.
+
+- legacy: tiktoken.encoding_for_model on every call, full prompt encoded 3+ times
+- assembler (cold): the same text segments, empty token count cache
+- assembler (warm): repeated request for the same text, counts memoised
+- assembler (attachment): the upload as DB.read_file_texts returns it, with
+  the token count stored at upload time
+
+Also reports how many characters each variant passed to tiktoken. The
+document is built from calibration_corpus. Needs tiktoken's cl100k_base.
+
+    python -m benchmarks.prompt_token_benchmark --chars 1000000 --repeat 3
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+import tiktoken
+from utils.model_token_manager import number_of_tokens, token_count_cache
+from utils.prompt_assembler import PromptSegment, assemble_prompt_for_model
+
+CORPUS_DIR = Path(__file__).resolve().parent.parent / "calibration_corpus"
+MODEL_CONFIG = {"model_name": "gpt-4o", "model_type": "openai", "max_token": 8192, "context_window": 100000,
+                "location": "us-central1", "is_image_support": True}
+
+
+def legacy_number_of_tokens(text):
+    enc = tiktoken.encoding_for_model("gpt-4")
+    tokens = enc.encode(text)
+    return len(tokens)
+
+
+def legacy_remove_extra_tokens(summary, exceeded_tokens):
+    enc = tiktoken.encoding_for_model("gpt-4")
+    content = enc.encode(summary)
+    content = content[:int(len(content) * exceeded_tokens)]
+    return enc.decode(content)
+
+
+def legacy_adjust_prompt_and_history_for_proposal(model_name, base_prompt, llm_response, file_data, llm_config):
+    """The token-fitting steps of the original function (logging and error handling left out)."""
+    context_size = llm_config["context_window"]
+    max_token = llm_config["max_token"]
+    final_prompt = base_prompt
+    total_tokens = legacy_number_of_tokens(final_prompt)
+    if file_data:
+        available_tokens = (context_size - total_tokens) / 1.40
+        adjusted_file_data = legacy_remove_extra_tokens(str(file_data), available_tokens / len(str(file_data)))
+        combined_prompt = f"{base_prompt}\n<USER_UPLOADED_FILE>: {adjusted_file_data} </USER_UPLOADED_FILE>"
+        final_prompt = combined_prompt
+        if llm_response:
+            temp_prompt = f"{combined_prompt}\n<CHAT_HISTORY> {llm_response}</CHAT_HISTORY>"
+            if legacy_number_of_tokens(temp_prompt) <= context_size:
+                final_prompt = temp_prompt
+    total_tokens = legacy_number_of_tokens(final_prompt)
+    remaining_tokens = context_size - total_tokens
+    return {"prompt": final_prompt.strip(), "remaining_tokens": remaining_tokens,
+            "required_token": min(max_token, remaining_tokens)}
+
+
+def assembler(system_prompt, user_query, chat_history, file_text=None, files=None):
+    return assemble_prompt_for_model(MODEL_CONFIG["model_name"], llm_config=MODEL_CONFIG, segments=[
+        PromptSegment("user_query", user_query, required=True, template="<USER_QUERY>{text}</USER_QUERY>\n"),
+        PromptSegment("system_prompt", system_prompt, required=True),
+        PromptSegment("file_text", text=file_text or "", files=files, priority=1,
+                      template="<USER_UPLOADED_FILE>: {text} </USER_UPLOADED_FILE>"),
+        PromptSegment("chat_history", chat_history, priority=2, keep="tail",
+                      template="<CHAT_HISTORY> {text}</CHAT_HISTORY>"),
+    ])
+
+
+def build_inputs(chars: int):
+    corpus = "\n\n".join(path.read_text(encoding="utf-8") for path in sorted(CORPUS_DIR.iterdir()) if path.is_file())
+    document = (corpus * (chars // len(corpus) + 1))[:chars]
+    system_prompt = "<SYSTEM_PROMPT>You are a business analyst. Write a software requirements specification.</SYSTEM_PROMPT>" * 20
+    user_query = "Generate an SRS for the attached RFP, focusing on the mobile technician app."
+    chat_history = "\n".join(f"user: question {i}\nassistant: answer {i} " + "detail " * 40 for i in range(40))
+    return document, system_prompt, user_query, chat_history
+
+
+class EncodeCounter:
+    """Counts the characters passed to tiktoken while active."""
+
+    def __init__(self):
+        self.chars = 0
+        self._encode = tiktoken.Encoding.encode
+
+    def __enter__(self):
+        counter = self
+
+        def encode(encoding, text, *args, **kwargs):
+            counter.chars += len(text)
+            return counter._encode(encoding, text, *args, **kwargs)
+
+        tiktoken.Encoding.encode = encode
+        return self
+
+    def __exit__(self, *exc):
+        tiktoken.Encoding.encode = self._encode
+
+
+def measure(run, repeat: int, before_each=None):
+    timings, chars = [], 0
+    for _ in range(repeat):
+        if before_each:
+            before_each()
+        with EncodeCounter() as counter:
+            started = time.perf_counter()
+            result = run()
+            timings.append(time.perf_counter() - started)
+        chars = counter.chars
+    return {"median_seconds": round(statistics.median(timings), 3), "chars_encoded": chars,
+            "prompt_chars": len(result["prompt"])}
+
+
+def run(chars: int, repeat: int):
+    document, system_prompt, user_query, chat_history = build_inputs(chars)
+    base_prompt = f"<USER_QUERY>{user_query}</USER_QUERY>\n{system_prompt}"
+    # Stored by the upload path; not part of the request.
+    files = [{"file_name": "rfp.md", "text": document, "token_count": number_of_tokens(document), "sections": []}]
+
+    report = {"input_chars": len(document)}
+    report["legacy"] = measure(lambda: legacy_adjust_prompt_and_history_for_proposal(
+        MODEL_CONFIG["model_name"], base_prompt, chat_history, document, MODEL_CONFIG), repeat)
+    report["assembler_cold"] = measure(lambda: assembler(system_prompt, user_query, chat_history, file_text=document),
+                                       repeat, before_each=token_count_cache.invalidate)
+    report["assembler_warm"] = measure(lambda: assembler(system_prompt, user_query, chat_history, file_text=document),
+                                       repeat)
+    report["assembler_attachment"] = measure(lambda: assembler(system_prompt, user_query, chat_history, files=files),
+                                             repeat)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt fitting on a large upload, before and after the prompt assembler")
+    parser.add_argument("--chars", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.chars, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
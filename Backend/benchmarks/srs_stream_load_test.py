@@ -0,0 +1,226 @@
+"""
+Concurrent requests to /generate-srs-proposal-async, and to the threadpool
+/generate-srs-proposal for comparison, through main.app itself: httpx's
+ASGITransport calls the app in this process, with its lifespan, middleware,
+request validation, chat history in redis, project/conversation upsert and
+message insert against Postgres. Only the chat model is fake: a model that
+emits --tokens tokens, --token-ms apart, is put in the LLM client cache under
+the registered model the request resolves to, so no API key is used.
+
+For each endpoint and --concurrency level, --rounds x concurrency requests
+are sent, at most concurrency at a time, each for a new project, after one unmeasured warm-up request.
+Reported per level:
+
+- latency p50/p95/max of whole requests; ASGITransport hands the body over
+  when the stream ends, so this is time to last token, not first
+- event-loop lag p50/p95/max: how late a 10 ms asyncio.sleep on the app's
+  loop wakes up while the requests run, i.e. how long any other request or
+  open stream on the worker would be stalled
+- CPU use of this process (app and client) over the level; near 100% the
+  worker is CPU-bound, and every await, pool checkouts included, waits on it
+- errors (non-200 or a stream that did not finish) and how many messages were
+  stored
+
+Needs a migrated database with at least one user (--user-id, else the first
+user) and redis at REDIS_URL. Rows and redis keys of the run's projects
+(ids prefixed `srs-load-`) are deleted afterwards, and "SRS document.txt"
+is put back. httpx is not in
+requirements.txt.
+
+    python -m benchmarks.srs_stream_load_test --concurrency 1 100 500 --tokens 50 --token-ms 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+import uuid
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, List, Optional
+import httpx
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+ENDPOINTS = {"async": "/generate-srs-proposal-async", "sync": "/generate-srs-proposal"}
+PROJECT_PREFIX = "srs-load-"
+LAG_INTERVAL = 0.01
+SRS_DOCUMENT = Path("SRS document.txt")
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Emits `tokens` tokens, `token_delay` seconds apart, blocking in _stream and awaiting in _astream."""
+
+    tokens: int = 50
+    token_delay: float = 0.02
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming"
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> ChatResult:
+        time.sleep(self.token_delay * self.tokens)
+        content = "".join(f"token{i} " for i in range(self.tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager: Optional[CallbackManagerForLLMRun] = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for i in range(self.tokens):
+            time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=f"token{i} "))
+
+    async def _astream(self, messages: List[BaseMessage], stop=None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for i in range(self.tokens):
+            await asyncio.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=f"token{i} "))
+
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 1),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1),
+        "max_ms": round(samples[-1] * 1000, 1),
+    }
+
+
+async def _load(client: httpx.AsyncClient, path: str, body: dict, requests: int, concurrency: int, last_token: str):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, lags, project_ids, errors = [], [], [], []
+    done = asyncio.Event()
+
+    async def one():
+        project_id = f"{PROJECT_PREFIX}{uuid.uuid4()}"
+        project_ids.append(project_id)
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(path, json={**body, "project_id": project_id})
+            latencies.append(time.perf_counter() - started)
+        if response.status_code != 200 or last_token not in response.text:
+            errors.append(response.status_code if response.status_code != 200 else response.text[-200:])
+
+    async def sample_lag():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            lags.append(time.perf_counter() - started - LAG_INTERVAL)
+
+    sampler = asyncio.create_task(sample_lag())
+    started, cpu_started = time.perf_counter(), time.process_time()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    done.set()
+    await sampler
+    return {
+        "requests": requests,
+        "wall_seconds": round(wall, 2),
+        "cpu_percent": round(cpu / wall * 100, 1),
+        "latency": _summary(latencies),
+        "event_loop_lag": _summary(lags),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }, project_ids
+
+
+def _stored_messages(db, project_ids):
+    rows = db.retrieve_data(f"""
+        SELECT COUNT(*)
+        FROM {db.schema}.conversation_message cm
+        JOIN {db.schema}.conversation c ON c.conversation_id = cm.conversation_id
+        WHERE c.project_id = ANY(%s)
+    """, (project_ids,))
+    return rows[0][0]
+
+
+def _cleanup(db, redis_url):
+    import redis
+    project_filter = f"(SELECT project_id FROM {db.schema}.projects WHERE project_id LIKE %s)"
+    pattern = f"{PROJECT_PREFIX}%"
+    db.execute_query(f"""
+        DELETE FROM {db.schema}.conversation_message
+        WHERE conversation_id IN (SELECT conversation_id FROM {db.schema}.conversation WHERE project_id IN {project_filter})
+    """, (pattern,))
+    db.execute_query(f"DELETE FROM {db.schema}.conversation WHERE project_id IN {project_filter}", (pattern,))
+    db.execute_query(f"DELETE FROM {db.schema}.projects WHERE project_id LIKE %s", (pattern,))
+    client = redis.Redis.from_url(redis_url)
+    keys = list(client.scan_iter(match=f"*{PROJECT_PREFIX}*", count=1000))
+    if keys:
+        client.delete(*keys)
+    client.close()
+
+
+async def run(user_id: Optional[str], endpoints: List[str], levels: List[int], rounds: int, tokens: int,
+              token_ms: float, model_type: str, model_id: str):
+    from main import app, lifespan
+    from agents.core import llm_client_cache
+    from utils import db_obj, redis_url
+    from utils.model_registry import model_registry
+    # Every query is logged at INFO with its SQL; that would dominate the CPU under load.
+    logging.getLogger("sprint_speed").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    # /generate-srs-proposal writes each proposal to this file in the working directory.
+    srs_document = SRS_DOCUMENT.read_text(encoding="utf-8") if SRS_DOCUMENT.exists() else None
+    async with lifespan(app):
+        if not user_id:
+            users = db_obj.retrieve_data(f"SELECT user_id FROM {db_obj.schema}.users ORDER BY created_at LIMIT 1")
+            if not users:
+                raise Exception("No users found; register one or seed with `python -m utils.migrations seed`")
+            user_id = users[0][0]
+        model = model_registry.resolve(model_id, model_type)
+        key = (model["model_type"], model["model_name"], model.get("location"))
+        llm_client_cache.set(key, FakeStreamingChatModel(tokens=tokens, token_delay=token_ms / 1000))
+        body = {"user_id": user_id, "user_query": "Write an SRS for a task tracker", "model_type": model_type,
+                "model_id": model_id}
+        report = {"user_id": user_id, "model": model["model_name"], "tokens": tokens, "token_ms": token_ms,
+                  "ideal_ms": round(tokens * token_ms, 1)}
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://srs-load", limits=limits,
+                                         timeout=600) as client:
+                for endpoint in endpoints:
+                    report[endpoint] = {}
+                    # Tokenizer, model client and connection warm-up stay out of the first level.
+                    await _load(client, ENDPOINTS[endpoint], body, 1, 1, f"token{tokens - 1}")
+                    for concurrency in levels:
+                        result, project_ids = await _load(client, ENDPOINTS[endpoint], body, rounds * concurrency,
+                                                          concurrency, f"token{tokens - 1}")
+                        # BackgroundTasks (history summary refresh) run after the body; let them finish first.
+                        await asyncio.sleep(0.5)
+                        result["stored_messages"] = _stored_messages(db_obj, project_ids)
+                        report[endpoint][f"concurrency_{concurrency}"] = result
+        finally:
+            llm_client_cache.invalidate(key)
+            _cleanup(db_obj, redis_url)
+            if srs_document is not None:
+                SRS_DOCUMENT.write_text(srs_document, encoding="utf-8")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the SRS streaming endpoints through the ASGI app")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 100, 500])
+    parser.add_argument("--rounds", type=int, default=3, help="Requests per level = rounds x concurrency")
+    parser.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS), default=list(ENDPOINTS))
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--token-ms", type=float, default=20, help="Delay between tokens")
+    parser.add_argument("--model-type", default="openai")
+    parser.add_argument("--model-id", default="gpt-4o")
+    parser.add_argument("--user-id")
+    args = parser.parse_args()
+    report = asyncio.run(run(args.user_id, args.endpoints, args.concurrency, args.rounds, args.tokens, args.token_ms,
+                             args.model_type, args.model_id))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Checks Tokenizer.measure on text unlike the prose calibration corpus: JSON,
+source code, numeric CSV, base64 and whitespace-indented text, next to the
+corpus itself. For every sample and family, and for budgets around the exact
+count:
+
+- the lower bound never exceeds the exact count, so rejecting on it is safe
+- measure() returns the exact count whenever it is within the budget
+- PromptAssembler packs the sample as a file segment next to a query and a
+  chat history into that budget; the assembled prompt, encoded whole, is
+  within both the budget and the reported token_count
+
+Exits non-zero on a failure. Needs tiktoken's cl100k_base; no database.
+
+    python -m benchmarks.token_estimate_check
+"""
+import argparse
+import base64
+import json
+import random
+import sys
+from pathlib import Path
+from utils.prompt_assembler import PromptAssembler, PromptSegment
+from utils.tokenizers import CALIBRATION_CORPUS_DIR, TOKENIZER_CLASSES, get_tokenizer
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def samples(chars: int, seed: int = 7):
+    rng = random.Random(seed)
+    records = [{"id": rng.randint(0, 10 ** 9), "score": rng.random(), "tags": [rng.choice("abcdef") * 3] * 2,
+                "key": base64.b64encode(rng.randbytes(12)).decode()} for _ in range(chars // 60)]
+    code = "\n\n".join(p.read_text(encoding="utf-8") for p in sorted((BACKEND_DIR / "utils").glob("*.py")))
+    numbers = "\n".join(",".join(f"{rng.uniform(-1e6, 1e6):.4f}" for _ in range(8)) for _ in range(chars // 80))
+    indented = "\n".join(" " * rng.choice((4, 8, 16, 32)) + f"- item {i}" for i in range(chars // 20))
+    corpus = "\n\n".join(p.read_text(encoding="utf-8") for p in sorted(CALIBRATION_CORPUS_DIR.iterdir()) if p.is_file())
+    return {
+        "json": json.dumps(records)[:chars],
+        "python": code[:chars],
+        "numbers_csv": numbers[:chars],
+        "base64": base64.b64encode(rng.randbytes(chars))[:chars].decode(),
+        "indented": indented[:chars],
+        "prose_corpus": (corpus * (chars // len(corpus) + 1))[:chars],
+    }
+
+
+def check(chars: int):
+    report, failures = {}, []
+    for model_type in TOKENIZER_CLASSES:
+        tokenizer = get_tokenizer(model_type)
+        for name, text in samples(chars).items():
+            exact = tokenizer.count(text)
+            low, high = tokenizer.estimate_bounds(text)
+            size = len(text.encode("utf-8"))
+            report[f"{model_type}/{name}"] = {"bytes_per_token": round(size / exact, 2), "low": low,
+                                              "exact": exact, "high": high}
+            if low > exact:
+                failures.append(f"{model_type}/{name}: lower bound {low} > exact count {exact}")
+            for budget in (exact // 4, exact - 1, exact, exact + 1, low, high, high * 2):
+                measured = tokenizer.measure(text, budget)
+                if measured <= budget and measured != exact:
+                    failures.append(f"{model_type}/{name}: measure() = {measured} within budget {budget}, exact {exact}")
+                if (measured <= budget) != (exact <= budget):
+                    failures.append(f"{model_type}/{name}: budget {budget} decided wrongly ({measured} vs exact {exact})")
+                if budget > 100:
+                    failures.extend(check_assembled(tokenizer, f"{model_type}/{name}", text, budget))
+    return report, failures
+
+
+def check_assembled(tokenizer, label: str, text: str, budget: int):
+    history = "\n".join(f"user: question {i}\nassistant: {text[i * 50:i * 50 + 200]}" for i in range(60))
+    assembled = PromptAssembler(budget, tokenizer).assemble([
+        PromptSegment("user_query", "Summarise the attached file.", required=True, template="<USER_QUERY>{text}</USER_QUERY>"),
+        PromptSegment("file_text", text, priority=1, template="<USER_UPLOADED_FILE>: {text} </USER_UPLOADED_FILE>"),
+        PromptSegment("chat_history", history, priority=2, keep="tail", template="<CHAT_HISTORY> {text}</CHAT_HISTORY>"),
+    ])
+    real = tokenizer.count(assembled.prompt)
+    if real > min(budget, assembled.token_count):
+        return [f"{label}: assembled prompt is {real} tokens, reported {assembled.token_count}, budget {budget}"]
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token estimate checks on dense, non-prose text")
+    parser.add_argument("--chars", type=int, default=30000)
+    args = parser.parse_args()
+    report, failures = check(args.chars)
+    print(json.dumps({"samples": report, "failures": failures}, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,25 @@
 from fastapi import FastAPI, APIRouter,Request, Depends, HTTPException, Request, File, Form, UploadFile
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
-from utils import db_obj , logger
+from utils import db_obj , async_db_obj , logger
 from utils.sendEmail import send_email
 from datetime import datetime
 import uuid
+import json
+import asyncio
 import traceback
 from typing import List, Optional
 from models import (
     UserRegisterRequest, UserLogin , SRSGeneratorRequest , CreateProjectRequest,EmailRequest, FetchUserChatDetailRequest,
-    TaskCreatorAgentRequest , EmailSummaryGeneratorRequest , FetchUserChatInfoRequest
+    TaskCreatorAgentRequest , EmailSummaryGeneratorRequest , FetchUserChatInfoRequest, SearchRequest
 )
 from fastapi import Form, UploadFile, File
 
 
-from utils.chat_history_manager import ChatHistoryManager
+from utils.chat_history_manager import ChatHistoryManager, close_async_redis_client
 
 #Agents
 from agents.srs_creator_agent import SRSCreatorAgent
@@ -23,12 +27,26 @@ from agents.task_planner_agent import TaskPlannerAgent
 # from agents.task_creator_agent import TaskCreatorAgent
 
 from utils.helpers import  process_files_for_storage
+from utils.model_token_manager import number_of_tokens
+from utils.migrations import run_migrations, warn_if_pending, AUTO_MIGRATE
+from utils.model_registry import model_registry
+from utils.response_cache import response_cache, wants_cache_bypass
+from utils.pagination import decode_cursor
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI): 
     logger.info("Starting up FastAPI application")
+    if AUTO_MIGRATE:
+        run_migrations(db_obj)
+    else:
+        warn_if_pending(db_obj)
+    model_registry.start_listener(db_obj)
+    await async_db_obj.open_pool()
     yield 
+    model_registry.stop_listener()
+    await async_db_obj.close_pool()
+    await close_async_redis_client()
     db_obj.close_pool()
     logger.info("Database connection pool closed")
 
@@ -46,6 +64,15 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def read_your_writes_middleware(request: Request, call_next):
+    """Clients send `X-Read-Your-Writes: true` to read their own writes from the primary for this request."""
+    if request.headers.get("x-read-your-writes", "").lower() == "true":
+        with db_obj.read_your_writes():
+            return await call_next(request)
+    return await call_next(request)
+
+
 def handle_api_error(e: Exception):
     error_traceback = traceback.format_exc()
     logger.error(f"API error occurred: {str(e)}\nTraceback: {error_traceback}")
@@ -80,6 +107,19 @@ def handle_streaming_error(e: Exception):
     logger.error("Failed to process request")
     return "failed_to_process_your_request"
 
+def validate_cursor(cursor: Optional[str]):
+    """Return a 400 response for a malformed pagination cursor, otherwise None."""
+    if not cursor:
+        return None
+    try:
+        decode_cursor(cursor)
+    except ValueError as e:
+        return JSONResponse(
+            content={"status": "error", "message": str(e)},
+            status_code=400
+        )
+    return None
+
 
 @app.get("/")
 def root():
@@ -100,12 +140,34 @@ def demo(request: Request):
 
 
 
+@app.get("/db-stats")
+def db_stats():
+    try:
+        return JSONResponse(
+            content={
+                "status": "success",
+                "pool": db_obj.pool_stats(),
+                "async_pool": async_db_obj.pool_stats(),
+                "replicas": db_obj.replica_stats(),
+                "async_replicas": async_db_obj.replica_stats(),
+                "circuit_breaker": db_obj.circuit_breaker_stats(),
+                "async_circuit_breaker": async_db_obj.circuit_breaker_stats(),
+                "reference_cache": db_obj.reference_cache.stats(),
+                "model_registry": model_registry.stats(),
+                "response_cache": response_cache.stats()
+            },
+            status_code=200
+        )
+    except Exception as e:
+        return handle_api_error(e)
+
+
 #Register API
 @app.post("/register")
 async def register_user(payload: UserRegisterRequest):
     try:
        
-        existing_user=db_obj.check_user_query(payload.email)
+        existing_user=await async_db_obj.check_user_query(payload.email)
 
         if existing_user:
             return JSONResponse(
@@ -114,7 +176,7 @@ async def register_user(payload: UserRegisterRequest):
             )
 
        
-        role_result=db_obj.get_role_id_by_name(payload.role_name)
+        role_result=await async_db_obj.get_role_id_by_name(payload.role_name)
         if not role_result:
             return JSONResponse(
                 content={"status": "error", "message": "Invalid role name"},
@@ -138,7 +200,7 @@ async def register_user(payload: UserRegisterRequest):
             now
         )
                 
-        db_obj.insert_user(user_data)
+        await async_db_obj.insert_user(user_data)
        
         return JSONResponse(
             content={"status": "success", "message": "User registered successfully", "user_id": user_id},
@@ -152,7 +214,7 @@ async def register_user(payload: UserRegisterRequest):
 async def login_user(payload: UserLogin):
     try:
         
-        result=db_obj.get_user_by_email(payload.email)
+        result=await async_db_obj.get_user_by_email(payload.email)
 
         if not result:
             return JSONResponse(
@@ -193,7 +255,7 @@ async def login_user(payload: UserLogin):
 async def get_roles():
     try:
         
-        roles=db_obj.get_role()
+        roles=await async_db_obj.get_role()
         roles_list = [
             {
                 "role_id": role[0],
@@ -217,16 +279,10 @@ def create_project(
     request: Request,creat_project: CreateProjectRequest):
     try:
         # Insert Project and Conversation
-        db_obj.insert_project(
+        created = db_obj.create_project_and_conversation(
             project_id=creat_project.project_id,
             project_name=creat_project.project_name, 
             conversation_id=creat_project.conversation_id,
-            user_id  = creat_project.user_id
-        )
-        
-        db_obj.insert_conversation(
-            conversation_id=creat_project.conversation_id,
-            project_id=creat_project.project_id,
             chat_type=creat_project.chat_type,
             user_id  = creat_project.user_id
         )
@@ -234,7 +290,8 @@ def create_project(
         return JSONResponse(
             content={
                 "message": "Project created successfully",
-                "project_id": project_id
+                "project_id": project_id,
+                **created
             },
             status_code=200
         )
@@ -250,6 +307,7 @@ def upload_files(
     project_id: str = Form(...),
     conversation_id: str = Form(...),
     chat_type : str = Form(default="srs_creator"),
+    user_id: Optional[str] = Form(default=None),
     files: Optional[List[UploadFile]] = File(None) 
 ):
     try:
@@ -265,7 +323,8 @@ def upload_files(
         db_obj.insert_conversation(
             conversation_id=conversation_id,
             project_id=project_id,
-            chat_type=chat_type
+            chat_type=chat_type,
+            user_id=user_id
         )
         # Save file attachments
         attachment_ids = db_obj.save_file_attachments(conversation_id, processed_files)
@@ -293,22 +352,16 @@ def generate_srs_proposal(request: Request, agent_request: SRSGeneratorRequest):
         user_and_agent_chat_message = history.create_proposal_user_message_string()
 
         #Insert Project and Conversation
-        db_obj.insert_project(
+        db_obj.create_project_and_conversation(
             project_id=agent_request.project_id,
             project_name=agent_request.project_name, 
             conversation_id=agent_request.conversation_id,
-            user_id=agent_request.user_id
-        )
-
-        db_obj.insert_conversation(
-            conversation_id=agent_request.conversation_id,
-            project_id=agent_request.project_id,
             chat_type=agent_request.chat_type,
             user_id=agent_request.user_id
         )
 
-        #Read Files
-        file_text = db_obj.read_files(
+        #Read Files (text and token counts extracted at upload time)
+        file_text = db_obj.read_file_texts(
             file_ids=agent_request.file_ids,
         )
 
@@ -364,31 +417,128 @@ def generate_srs_proposal(request: Request, agent_request: SRSGeneratorRequest):
                     agent_response=accumulated_proposal,
                     model_id=agent_request.model_id,
                     model_type = agent_request.model_type,
+                    token_count=number_of_tokens(accumulated_proposal),
                 )
 
 
             except Exception as e:
                 yield f"data: {handle_streaming_error(e)}\n\n"
             
-        return StreamingResponse(stream_proposal(), media_type="text/event-stream")
+        # Fold older turns into the rolling history summary once the response has been streamed
+        refresh_summary = BackgroundTask(
+            history.refresh_history_summary,
+            lambda previous_summary, user_turns: SRSCreatorAgent().summarize_history(
+                agent_request.model_id, agent_request.model_type, previous_summary, user_turns
+            ),
+        )
+        return StreamingResponse(stream_proposal(), media_type="text/event-stream", background=refresh_summary)
 
     except Exception as e:
         # logger.log(message=f"Unhandled erragentor: {e}", log_level="ERROR")
         return handle_api_error(e)
 
 
+@app.post("/generate-srs-proposal-async")
+async def generate_srs_proposal_async(request: Request, agent_request: SRSGeneratorRequest):
+    """
+    Same contract as /generate-srs-proposal, but streamed with astream and
+    persisted through AsyncDB and redis.asyncio, so an open stream costs a
+    coroutine instead of a threadpool thread for the whole generation.
+    """
+    try:
+
+        history = ChatHistoryManager(session_id=agent_request.project_id)
+        user_and_agent_chat_message = await asyncio.to_thread(history.create_proposal_user_message_string)
+
+        await async_db_obj.create_project_and_conversation(
+            project_id=agent_request.project_id,
+            project_name=agent_request.project_name,
+            conversation_id=agent_request.conversation_id,
+            chat_type=agent_request.chat_type,
+            user_id=agent_request.user_id
+        )
+
+        file_text = await async_db_obj.read_file_texts(
+            file_ids=agent_request.file_ids,
+        )
+
+        proposal_generator_agent_obj = SRSCreatorAgent()
+
+        async def stream_proposal():
+            accumulated_proposal = ""
+            first_chunk = True
+            last_chunk = None
+
+            try:
+                async for chunk in proposal_generator_agent_obj.agenerate_srs_document(
+                    chat_history = user_and_agent_chat_message,
+                    user_query = agent_request.user_query,
+                    model_type = agent_request.model_type,
+                    temperature = agent_request.temperature,
+                    model_id = agent_request.model_id,
+                    file_text = file_text
+                ):
+                    if first_chunk:
+                        first_chunk = False
+                        chunk = chunk.replace("```string", "", 1).replace("```", "", 1).lstrip()
+
+                    if last_chunk is not None:
+                        yield f"data: {last_chunk}\n\n"
+                        accumulated_proposal += last_chunk
+
+                    last_chunk = chunk
+
+                if last_chunk:
+                    last_chunk = last_chunk.rstrip("```")
+                    yield f"data: {last_chunk}\n\n"
+                    accumulated_proposal += last_chunk
+
+                await history.astore_proposal_chat_history(
+                    user_query=agent_request.user_query,
+                    agent_response=accumulated_proposal
+                )
+
+                await async_db_obj.insert_conversation_message(
+                    conversation_id=agent_request.conversation_id,
+                    user_query=agent_request.user_query,
+                    agent_response=accumulated_proposal,
+                    model_id=agent_request.model_id,
+                    model_type = agent_request.model_type,
+                    token_count=await asyncio.to_thread(number_of_tokens, accumulated_proposal),
+                )
+
+            except Exception as e:
+                yield f"data: {handle_streaming_error(e)}\n\n"
+
+        # Fold older turns into the rolling history summary once the response has been streamed
+        refresh_summary = BackgroundTask(
+            history.refresh_history_summary,
+            lambda previous_summary, user_turns: SRSCreatorAgent().summarize_history(
+                agent_request.model_id, agent_request.model_type, previous_summary, user_turns
+            ),
+        )
+        return StreamingResponse(stream_proposal(), media_type="text/event-stream", background=refresh_summary)
+
+    except Exception as e:
+        return handle_api_error(e)
+
+
 @app.post("/email-summary-generator")
-async def email_summary_generator(agent_request: EmailSummaryGeneratorRequest):
+async def email_summary_generator(request: Request, agent_request: EmailSummaryGeneratorRequest):
     try:
        
         # Initialize email summary generator agent
         email_summary_generator_agent = SRSCreatorAgent()
-        src_document = db_obj.get_finalize_srs(
+        project_srs = await async_db_obj.get_project_srs(
             project_id=agent_request.project_id,
-        )
+        ) or {}
         # Generate email summary
-        response = email_summary_generator_agent.generate_summary(
-            agent_request.model_id, agent_request.model_type, agent_request.temperature , src_document
+        # Model call and cache wait block, so they run in the threadpool, not on the event loop
+        response = await run_in_threadpool(
+            email_summary_generator_agent.generate_summary,
+            agent_request.model_id, agent_request.model_type, agent_request.temperature,
+            project_srs.get("content", ""), src_document_tokens=project_srs.get("token_count"),
+            bypass_cache=wants_cache_bypass(request.headers)
         )
 
         #TODO
@@ -441,22 +591,21 @@ async def send_email_api(email_request: EmailRequest):
 @app.get("/models")
 async def get_models():
     try:
-        models = db_obj.get_all_llm_models()  
-
+        # Served from the registry, which reloads itself when llm_models changes
         model_list = [
             {
-                "model_id": model[0],
-                "display_model_name": model[1],
-                "model_name": model[2],
-                "model_type": model[3],
-                "context_window": model[4],
-                "max_token": model[5],
-                "location": model[6],
-                "is_image_support": model[7],
-                "is_deleted": model[8],
-                "created_at": model[9].strftime('%Y-%m-%d %H:%M:%S')
+                "model_id": model.get("model_id"),
+                "display_model_name": model.get("display_model_name") or model["model_name"],
+                "model_name": model["model_name"],
+                "model_type": model["model_type"],
+                "context_window": model["context_window"],
+                "max_token": model["max_token"],
+                "location": model["location"],
+                "is_image_support": model["is_image_support"],
+                "is_deleted": model.get("is_deleted", False),
+                "created_at": model["created_at"].strftime('%Y-%m-%d %H:%M:%S') if model.get("created_at") else None
             }
-            for model in models
+            for model in model_registry.all()
         ]
 
         return JSONResponse(
@@ -471,15 +620,18 @@ async def get_models():
 def task_creation(request: Request , agent_request: TaskCreatorAgentRequest):
     try:
 
-        src_document = db_obj.get_finalize_srs(
-            project_id=agent_request. project_id,
-        )
+        project_srs = db_obj.get_project_srs(
+            project_id=agent_request.project_id,
+        ) or {}
         task_generator = TaskPlannerAgent()
         task_result = task_generator.generate_task_plan(
             model_type=agent_request.model_type,
             model_id=agent_request.model_id,
             temperature=agent_request.temperature,
-            src_document=src_document
+            src_document=project_srs.get("content", ""),
+            src_document_tokens=project_srs.get("token_count"),
+            bypass_cache=wants_cache_bypass(request.headers),
+            project_id=agent_request.project_id
         )
 
         task = task_result.get("tasks", [])
@@ -501,7 +653,12 @@ def task_creation(request: Request , agent_request: TaskCreatorAgentRequest):
 async def fetch_user_chat_info(request: FetchUserChatInfoRequest):
     try:
         user_id = request.user_id
-        chat_info = db_obj.get_user_chat_info(user_id)
+        invalid_cursor = validate_cursor(request.cursor)
+        if invalid_cursor:
+            return invalid_cursor
+        chat_info, next_cursor = await async_db_obj.get_user_chat_info(
+            user_id, page_size=request.page_size, cursor=request.cursor
+        )
 
         if not chat_info:
             return JSONResponse(
@@ -510,7 +667,7 @@ async def fetch_user_chat_info(request: FetchUserChatInfoRequest):
             )
 
         return JSONResponse(
-            content={"status": "success", "chat_info": chat_info},
+            content={"status": "success", "chat_info": chat_info, "next_cursor": next_cursor},
             status_code=200
         )
 
@@ -523,7 +680,12 @@ async def fetch_user_chat_details(request: FetchUserChatDetailRequest):
     try:
         user_id = request.user_id
         project_id = request.project_id
-        chat_details = db_obj.get_user_chat_details(user_id , project_id)
+        invalid_cursor = validate_cursor(request.cursor)
+        if invalid_cursor:
+            return invalid_cursor
+        chat_details, next_cursor = await async_db_obj.get_user_chat_details(
+            user_id , project_id, page_size=request.page_size, cursor=request.cursor
+        )
 
         if not chat_details:
             return JSONResponse(
@@ -532,13 +694,44 @@ async def fetch_user_chat_details(request: FetchUserChatDetailRequest):
             )
 
         return JSONResponse(
-            content={"status": "success", "chat_details": chat_details},
+            content={"status": "success", "chat_details": chat_details, "next_cursor": next_cursor},
             status_code=200
         )
 
     except Exception as e:
         logger.error(f"Error fetching user chat details: {str(e)}")
         return handle_api_error(e)
+
+@app.post("/search")
+async def search(request: SearchRequest):
+    try:
+        results = await async_db_obj.search_user_content(request.user_id, request.query, request.limit)
+        return JSONResponse(
+            content={"status": "success", **results},
+            status_code=200
+        )
+    except Exception as e:
+        logger.error(f"Error searching: {str(e)}")
+        return handle_api_error(e)
+
+@app.post("/export-chat-details")
+def export_chat_details(request: FetchUserChatDetailRequest):
+    try:
+        rows = db_obj.stream_user_chat_details(request.user_id, request.project_id)
+
+        def stream_rows():
+            try:
+                for row in rows:
+                    yield json.dumps(row) + "\n"
+            finally:
+                rows.close()
+
+        return StreamingResponse(stream_rows(), media_type="application/x-ndjson")
+
+    except Exception as e:
+        logger.error(f"Error exporting user chat details: {str(e)}")
+        return handle_api_error(e)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, port=8000)
\ No newline at end of file
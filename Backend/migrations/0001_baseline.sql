@@ -0,0 +1,158 @@
+-- Baseline schema. Idempotent so it can be applied to databases that were
+-- created from Database/schema.sql before migrations existed.
+
+CREATE SCHEMA IF NOT EXISTS task_management;
+
+CREATE TABLE IF NOT EXISTS task_management.roles (
+    role_id VARCHAR(100) PRIMARY KEY,
+    role_name VARCHAR(50) NOT NULL,
+    description TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS task_management.users (
+    user_id VARCHAR(100) PRIMARY KEY,
+    username VARCHAR(50) UNIQUE NOT NULL,
+    email VARCHAR(255) UNIQUE NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    first_name VARCHAR(50),
+    last_name VARCHAR(50),
+    role_id VARCHAR(100) REFERENCES task_management.roles(role_id),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    is_active BOOLEAN DEFAULT TRUE
+);
+
+CREATE TABLE IF NOT EXISTS task_management.projects (
+    project_id VARCHAR(100) PRIMARY KEY,
+    project_name VARCHAR(100) NOT NULL,
+    description TEXT,
+    start_date DATE,
+    end_date DATE,
+    status VARCHAR(20) DEFAULT 'planning',
+    created_by VARCHAR(100) REFERENCES task_management.users(user_id),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS task_management.tasks (
+    task_id VARCHAR(100) PRIMARY KEY,
+    title VARCHAR(100) NOT NULL,
+    description TEXT,
+    project_id VARCHAR(100) REFERENCES task_management.projects(project_id),
+    status VARCHAR(20) DEFAULT 'open',
+    priority VARCHAR(20) DEFAULT 'medium',
+    complexity VARCHAR(20),
+    estimated_hours INTEGER,
+    created_by VARCHAR(100) REFERENCES task_management.users(user_id),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    due_date DATE
+);
+
+ALTER TABLE task_management.tasks ADD COLUMN IF NOT EXISTS technical_requirements TEXT;
+ALTER TABLE task_management.tasks ADD COLUMN IF NOT EXISTS acceptance_criteria TEXT;
+
+CREATE TABLE IF NOT EXISTS task_management.task_assignments (
+    assignment_id VARCHAR(100) PRIMARY KEY,
+    task_id VARCHAR(100) REFERENCES task_management.tasks(task_id),
+    assigned_to VARCHAR(100) REFERENCES task_management.users(user_id),
+    assigned_by VARCHAR(100) REFERENCES task_management.users(user_id),
+    assigned_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    status VARCHAR(20) DEFAULT 'assigned',
+    completed_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE TABLE IF NOT EXISTS task_management.comments (
+    comment_id VARCHAR(100) PRIMARY KEY,
+    content TEXT NOT NULL,
+    task_id VARCHAR(100) REFERENCES task_management.tasks(task_id),
+    user_id VARCHAR(100) REFERENCES task_management.users(user_id),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS task_management.notifications (
+    notification_id VARCHAR(100) PRIMARY KEY,
+    user_id VARCHAR(100) REFERENCES task_management.users(user_id),
+    content TEXT NOT NULL,
+    related_to VARCHAR(100),
+    type VARCHAR(50),
+    is_read BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS task_management.user_availability (
+    availability_id VARCHAR(100) PRIMARY KEY,
+    user_id VARCHAR(100) REFERENCES task_management.users(user_id),
+    available_from TIMESTAMP WITH TIME ZONE,
+    available_to TIMESTAMP WITH TIME ZONE,
+    status VARCHAR(20) DEFAULT 'available'
+);
+
+CREATE TABLE IF NOT EXISTS task_management.conversation (
+    conversation_id VARCHAR(100) PRIMARY KEY,
+    project_id VARCHAR(100) REFERENCES task_management.projects(project_id),
+    chat_type VARCHAR(50) NOT NULL,
+    user_id VARCHAR(100) REFERENCES task_management.users(user_id),
+    title VARCHAR(255),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    is_deleted BOOLEAN DEFAULT FALSE,
+    status VARCHAR(20) DEFAULT 'active'
+);
+
+CREATE TABLE IF NOT EXISTS task_management.conversation_message (
+    message_id VARCHAR(100) PRIMARY KEY,
+    conversation_id VARCHAR(100) REFERENCES task_management.conversation(conversation_id) ON DELETE CASCADE,
+    user_query VARCHAR(5000) NOT NULL,
+    agent_response TEXT NOT NULL,
+    model_id VARCHAR(100),
+    model_type VARCHAR(50),
+    tokens_used INTEGER,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    is_deleted BOOLEAN DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS task_management.conversation_attachment (
+    attachment_id VARCHAR(100) PRIMARY KEY,
+    conversation_id VARCHAR(100) REFERENCES task_management.conversation(conversation_id) ON DELETE CASCADE,
+    file_name VARCHAR(255) NOT NULL,
+    file_type VARCHAR(100) NOT NULL,
+    file_size BIGINT NOT NULL,
+    file_content TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    is_deleted BOOLEAN DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS task_management.llm_models (
+    model_id VARCHAR(100) PRIMARY KEY,
+    display_model_name VARCHAR(100) NOT NULL,
+    model_name VARCHAR(100) NOT NULL UNIQUE,
+    model_type VARCHAR(50) NOT NULL,
+    context_window INTEGER,
+    max_token INTEGER,
+    location VARCHAR(100),
+    is_image_support BOOLEAN DEFAULT FALSE,
+    is_deleted BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO task_management.roles (role_id, role_name, description)
+VALUES
+  ('1', 'Project Manager', 'Responsible for managing the project and coordinating teams.'),
+  ('2', 'Frontend Developer', 'Responsible for UI/UX and client-side application development.'),
+  ('3', 'Backend Developer', 'Handles server-side logic, database, and application integration.'),
+  ('4', 'Database Manager', 'Manages the database schema, security, and data integrity.')
+ON CONFLICT (role_id) DO NOTHING;
+
+INSERT INTO task_management.llm_models (
+    model_id, display_model_name, model_name, model_type, max_token, context_window, location, is_image_support
+) VALUES
+  ('1', 'Gemini 2.5 Pro', 'gemini-2.5-pro', 'google_genai', 64000, 1000000, 'us-central1', TRUE),
+  ('2', 'GPT-4', 'gpt-4o', 'openai', 8192, 8192, 'us-central1', FALSE),
+  ('3', 'Gemini 2.5 Flash', 'gemini-2.0-flash-exp', 'google_genai', 8192, 1048576, 'us-central1', TRUE),
+  ('4', 'Gemini 2.0 Flash Thinking', 'gemini-2.0-flash-thinking-exp', 'google_genai', 64000, 1000000, 'us-central1', TRUE),
+  ('5', 'Gemini 2.5 Flash', 'gemini-2.5-flash', 'google_genai', 64000, 1000000, 'us-central1', TRUE)
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,26 @@
+-- Secondary indexes for the hot read paths in utils/database.py.
+
+-- get_finalize_srs: conversation filtered by project_id, joined to its messages
+-- and ordered by conversation_message.created_at DESC. get_user_chat_details
+-- pages the messages on the keyset (created_at, message_id).
+CREATE INDEX IF NOT EXISTS idx_conversation_project_id
+    ON task_management.conversation (project_id);
+
+CREATE INDEX IF NOT EXISTS idx_conversation_message_conversation_keyset
+    ON task_management.conversation_message (conversation_id, created_at DESC, message_id DESC);
+
+-- get_user_chat_details: conversation filtered by (user_id, project_id).
+CREATE INDEX IF NOT EXISTS idx_conversation_user_project
+    ON task_management.conversation (user_id, project_id, created_at DESC);
+
+-- get_user_chat_info: projects filtered by created_by, paged on the keyset
+-- (created_at, project_id).
+CREATE INDEX IF NOT EXISTS idx_projects_created_by_keyset
+    ON task_management.projects (created_by, created_at DESC, project_id DESC);
+
+-- Foreign-key lookups used by read_files and task listings.
+CREATE INDEX IF NOT EXISTS idx_conversation_attachment_conversation_id
+    ON task_management.conversation_attachment (conversation_id);
+
+CREATE INDEX IF NOT EXISTS idx_tasks_project_id
+    ON task_management.tasks (project_id);
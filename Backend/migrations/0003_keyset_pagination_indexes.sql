@@ -0,0 +1,13 @@
+-- Keyset pagination indexes, for databases that applied 0002 while it still
+-- created the two-column indexes these supersede. 0002 now creates the keyset
+-- indexes itself, so on a fresh database every statement here is a no-op.
+
+CREATE INDEX IF NOT EXISTS idx_conversation_message_conversation_keyset
+    ON task_management.conversation_message (conversation_id, created_at DESC, message_id DESC);
+
+DROP INDEX IF EXISTS task_management.idx_conversation_message_conversation_created;
+
+CREATE INDEX IF NOT EXISTS idx_projects_created_by_keyset
+    ON task_management.projects (created_by, created_at DESC, project_id DESC);
+
+DROP INDEX IF EXISTS task_management.idx_projects_created_by_created_at;
@@ -0,0 +1,10 @@
+-- Attachment bytes move to the content-addressed blob store (utils/blob_store.py).
+-- Postgres keeps only the SHA-256 of the content; file_content is kept, nullable,
+-- for rows written before this migration until `python -m utils.blob_store
+-- migrate-attachments` has moved them.
+
+ALTER TABLE task_management.conversation_attachment
+    ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+
+CREATE INDEX IF NOT EXISTS idx_conversation_attachment_content_hash
+    ON task_management.conversation_attachment (content_hash);
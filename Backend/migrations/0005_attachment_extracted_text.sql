@@ -0,0 +1,8 @@
+-- Text extracted from each attachment at upload time, its token count and the
+-- character range / token count of every page or section, so prompts can be
+-- assembled without re-reading or re-tokenising the file.
+
+ALTER TABLE task_management.conversation_attachment
+    ADD COLUMN IF NOT EXISTS extracted_text TEXT,
+    ADD COLUMN IF NOT EXISTS token_count INTEGER,
+    ADD COLUMN IF NOT EXISTS section_offsets JSONB NOT NULL DEFAULT '[]'::jsonb;
@@ -0,0 +1,26 @@
+-- Pointer to the current SRS (latest conversation message) of every project,
+-- kept up to date by insert_conversation_message in the same statement that
+-- stores the message. get_finalize_srs becomes a primary-key lookup and
+-- content_hash can be used as a cache key by downstream consumers.
+
+CREATE TABLE IF NOT EXISTS task_management.project_srs (
+    project_id VARCHAR(100) PRIMARY KEY REFERENCES task_management.projects(project_id) ON DELETE CASCADE,
+    message_id VARCHAR(100) NOT NULL REFERENCES task_management.conversation_message(message_id) ON DELETE CASCADE,
+    content_hash CHAR(64) NOT NULL,
+    token_count INTEGER,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Backfill from existing messages. token_count is left NULL for these rows.
+INSERT INTO task_management.project_srs (project_id, message_id, content_hash, token_count, updated_at)
+SELECT DISTINCT ON (c.project_id)
+       c.project_id,
+       cm.message_id,
+       encode(sha256(convert_to(COALESCE(cm.agent_response, ''), 'UTF8')), 'hex'),
+       NULL,
+       cm.created_at
+FROM task_management.conversation_message cm
+JOIN task_management.conversation c ON cm.conversation_id = c.conversation_id
+WHERE c.project_id IS NOT NULL
+ORDER BY c.project_id, cm.created_at DESC
+ON CONFLICT (project_id) DO NOTHING;
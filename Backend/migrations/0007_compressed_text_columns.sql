@@ -0,0 +1,17 @@
+-- zstd-compressed storage for large text values (utils/compression.py). When a
+-- value is compressed the text column holds '' (agent_response) or NULL
+-- (extracted_text) and the frame lives in the *_zstd column. Existing rows are
+-- compressed with `python -m utils.compression compress-existing`.
+
+ALTER TABLE task_management.conversation_message
+    ADD COLUMN IF NOT EXISTS agent_response_zstd BYTEA;
+
+ALTER TABLE task_management.conversation_attachment
+    ADD COLUMN IF NOT EXISTS extracted_text_zstd BYTEA;
+
+-- Frames are already compressed; skip TOAST's pglz pass on them.
+ALTER TABLE task_management.conversation_message
+    ALTER COLUMN agent_response_zstd SET STORAGE EXTERNAL;
+
+ALTER TABLE task_management.conversation_attachment
+    ALTER COLUMN extracted_text_zstd SET STORAGE EXTERNAL;
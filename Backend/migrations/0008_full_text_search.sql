@@ -0,0 +1,20 @@
+-- Full-text search over SRS documents and tasks (utils/search.py).
+
+-- Maintained by insert_conversation_message: compressed responses cannot feed a
+-- generated column. Existing rows are backfilled in batches after the upgrade by
+-- `python -m utils.search reindex`, not here in one long transaction; the index
+-- is built on the empty column and filled incrementally.
+ALTER TABLE task_management.conversation_message
+    ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+
+CREATE INDEX IF NOT EXISTS idx_conversation_message_search
+    ON task_management.conversation_message USING GIN (search_vector);
+
+ALTER TABLE task_management.tasks
+    ADD COLUMN IF NOT EXISTS search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+        setweight(to_tsvector('english', COALESCE(description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_tasks_search
+    ON task_management.tasks USING GIN (search_vector);
@@ -0,0 +1,6 @@
+-- Blob store key of each attachment's BM25 chunk index (utils/retrieval.py),
+-- built at upload time. Older attachments are indexed with
+-- `python -m utils.retrieval build-indexes`.
+
+ALTER TABLE task_management.conversation_attachment
+    ADD COLUMN IF NOT EXISTS chunk_index_hash CHAR(64);
@@ -0,0 +1,14 @@
+-- Notify listeners (utils/model_registry.py) whenever llm_models changes, so
+-- every worker reloads its model registry without a restart.
+
+CREATE OR REPLACE FUNCTION task_management.notify_llm_models_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('llm_models_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS llm_models_changed ON task_management.llm_models;
+CREATE TRIGGER llm_models_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON task_management.llm_models
+    FOR EACH STATEMENT EXECUTE FUNCTION task_management.notify_llm_models_changed();
@@ -74,7 +74,16 @@ class TaskCreatorAgentRequest(BaseModel):
 class FetchUserChatInfoRequest(BaseModel):
     user_id: str = Field(..., description="Unique identifier for the user")
     # project_id: str = Field(..., description="Unique identifier for the project")
+    page_size: Optional[int] = Field(default=None, ge=1, description="Number of projects per page; omit to fetch all")
+    cursor: Optional[str] = Field(default=None, description="next_cursor returned by the previous page")
 
 class FetchUserChatDetailRequest(BaseModel):
     user_id: str = Field(..., description="Unique identifier for the user")
-    project_id: str = Field(..., description="Unique identifier for the project")
\ No newline at end of file
+    project_id: str = Field(..., description="Unique identifier for the project")
+    page_size: Optional[int] = Field(default=None, ge=1, description="Number of messages per page (newest first); omit to fetch all")
+    cursor: Optional[str] = Field(default=None, description="next_cursor returned by the previous page")
+
+class SearchRequest(BaseModel):
+    user_id: str = Field(..., description="Unique identifier for the user")
+    query: str = Field(..., min_length=1, max_length=500, description="Search terms; supports \"quoted phrases\", OR and -exclusion")
+    limit: int = Field(default=20, ge=1, le=50, description="Maximum results per kind (messages, tasks)")
@@ -1,6 +1,9 @@
 from .database import DB
+from .async_database import AsyncDB
 from .shared import logger
+from .blob_store import get_blob_store
 import os
+import threading
 
 redis_url = os.getenv("REDIS_URL")
 genai_api_key = os.getenv("GENAI_API_KEY")
@@ -10,12 +13,51 @@ db_schema = os.getenv("DB_SCHEMA")
 db_host = os.getenv("DB_HOST")
 db_user = os.getenv("DB_USER")
 db_password = os.getenv("DB_PASSWORD")
+# Comma-separated libpq DSNs of read replicas, e.g. "host=replica1 user=... password=..."
+db_replica_dsns = [dsn.strip() for dsn in os.getenv("DB_REPLICA_DSNS", "").split(",") if dsn.strip()]
 
 
-db_obj = DB(
-    schema= db_schema,
-    port= '5432',
-    host= db_host,
-    username=db_user,
-    password=db_password,
-)
+blob_store = get_blob_store()
+
+_db_objects_lock = threading.Lock()
+
+
+def _create_db_obj():
+    return DB(
+        schema= db_schema,
+        port= '5432',
+        host= db_host,
+        username=db_user,
+        password=db_password,
+        replica_dsns=db_replica_dsns,
+        blob_store=blob_store,
+    )
+
+
+def _create_async_db_obj():
+    return AsyncDB(
+        schema= db_schema,
+        port= '5432',
+        host= db_host,
+        username=db_user,
+        password=db_password,
+        replica_dsns=db_replica_dsns,
+        blob_store=blob_store,
+    )
+
+
+_DB_OBJECT_FACTORIES = {"db_obj": _create_db_obj, "async_db_obj": _create_async_db_obj}
+
+
+def __getattr__(name):
+    """
+    db_obj and async_db_obj are created on first use (`from utils import db_obj`),
+    so importing utils for its caches, tokenizers or CLIs does not connect to Postgres.
+    """
+    factory = _DB_OBJECT_FACTORIES.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _db_objects_lock:
+        if name not in globals():
+            globals()[name] = factory()
+    return globals()[name]
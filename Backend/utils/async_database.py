@@ -0,0 +1,611 @@
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+import os
+import asyncio
+import time
+from dotenv import load_dotenv
+from psycopg import OperationalError, InterfaceError
+from .shared import logger
+import uuid
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple
+from .pagination import clamp_page_size, encode_cursor
+from .read_queries import project_srs_query, user_chat_details_query, user_chat_info_query
+from .blob_store import BlobStore, blob_text, get_blob_store
+from .ttl_cache import TTLCache, reference_data_cache
+from .compression import compress_text, decompress_text
+from .search import MESSAGE_SEARCH_VECTOR_SQL, SEARCH_CONFIG, HEADLINE_OPTIONS, MAX_SEARCH_RESULTS, headline, query_lexemes
+from .retry_policy import CircuitOpenError, default_db_retry_policy, default_db_circuit_breaker
+from .replica_router import ReplicaRouter, dsn_label, read_your_writes, record_write, reads_pinned_to_primary
+load_dotenv()
+
+MIN_CONNECTION = int(os.getenv("MIN_CONNECTION", 1))
+MAX_CONNECTION = int(os.getenv("MAX_CONNECTION", 6))
+POOL_TIMEOUT = float(os.getenv("POOL_TIMEOUT", 30))
+# Wait for a pooled connection on the request path; POOL_TIMEOUT only bounds opening the pool.
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("POOL_CHECKOUT_TIMEOUT", 5))
+REPLICA_COOLDOWN = float(os.getenv("REPLICA_COOLDOWN", 30))
+
+
+class AsyncDB:
+    """
+    Async counterpart of `DB` built on the psycopg3 async pool.
+    Exposes the same method surface so `async def` endpoints can await
+    queries instead of blocking the event loop.
+    """
+    def __init__(self, schema, port, host, username, password, replica_dsns: Optional[List[str]] = None,
+                 retry_policy=None, circuit_breaker=None, blob_store: Optional[BlobStore] = None,
+                 reference_cache: Optional[TTLCache] = None):
+        self.schema = schema
+        self.port = port
+        self.host = host
+        self.username = username
+        self.password = password
+        self.blob_store = blob_store or get_blob_store()
+        self.reference_cache = reference_cache or reference_data_cache
+        # PoolTimeout subclasses OperationalError but already waited POOL_CHECKOUT_TIMEOUT; never retry it.
+        self.retry_policy = retry_policy or default_db_retry_policy(retry_on=(OperationalError, InterfaceError),
+                                                                    no_retry_on=(PoolTimeout,))
+        self.circuit_breaker = circuit_breaker or default_db_circuit_breaker("primary database (async)")
+        self.pool_generation = 0
+        self._pool_reset_lock = asyncio.Lock()
+        self._last_checkout = 0.0
+        conninfo = f"host={self.host} port={self.port} user={self.username} password={self.password}"
+        self.connection_pool = self.create_connection_pool(conninfo)
+        self.replica_dsns = replica_dsns or []
+        self.replica_pools = [self.create_connection_pool(dsn) for dsn in self.replica_dsns]
+        self.replica_router = ReplicaRouter([dsn_label(dsn) for dsn in self.replica_dsns], cooldown=REPLICA_COOLDOWN)
+
+    def create_connection_pool(self, conninfo: str):
+        """Create an async pool. Connections are opened in `open_pool`."""
+        return AsyncConnectionPool(
+            conninfo=conninfo,
+            min_size=MIN_CONNECTION,
+            max_size=MAX_CONNECTION,
+            timeout=POOL_TIMEOUT,
+            kwargs={"autocommit": True},
+            open=False,
+        )
+
+    async def open_pool(self):
+        """Open the pool; must be called from a running event loop (app lifespan)."""
+        try:
+            await self.connection_pool.open(wait=True, timeout=POOL_TIMEOUT)
+            logger.info("Async connection pool initialized successfully.")
+        except Exception as e:
+            logger.critical(f"Error initializing async connection pool: {e}")
+            raise Exception(f"Error initializing async connection pool: {e}")
+
+        # Replicas that are down are only marked unhealthy; their pools keep reconnecting in the background.
+        for index, replica_pool in enumerate(self.replica_pools):
+            try:
+                await replica_pool.open(wait=True, timeout=POOL_TIMEOUT)
+            except Exception as e:
+                self.replica_router.mark_failed(index, e)
+
+    async def close_pool(self):
+        """Close all connections in the pool."""
+        await self.connection_pool.close()
+        for replica_pool in self.replica_pools:
+            await replica_pool.close()
+        logger.info("Async connection pool closed")
+
+    def pool_stats(self):
+        """Return the psycopg_pool counters (wait time, requests, errors) for the async pool."""
+        return self.connection_pool.get_stats()
+
+    def invalidate_reference_cache(self, key=None):
+        """Drop cached roles/LLM models after they change. The cache is shared with DB."""
+        self.reference_cache.invalidate(key)
+
+    def circuit_breaker_stats(self):
+        return {**self.circuit_breaker.stats(), "pool_generation": self.pool_generation}
+
+    def replica_stats(self):
+        """Health, routing counters and pool metrics of each read replica."""
+        stats = self.replica_router.stats()
+        for index, replica in enumerate(stats["replicas"]):
+            replica["pool"] = self.replica_pools[index].get_stats()
+        return stats
+
+    def read_your_writes(self):
+        """Context manager: after the first write inside it, reads in the same request go to the primary."""
+        return read_your_writes()
+
+    async def reset_connection_pool(self, failed_generation: int):
+        """Drop broken idle connections once per failure wave instead of on every request."""
+        async with self._pool_reset_lock:
+            if failed_generation != self.pool_generation:
+                return
+            self.pool_generation += 1
+            await self.connection_pool.check()
+
+    async def run_with_retry(self, operation, *args):
+        generation = self.pool_generation
+
+        async def on_retry(error, attempt):
+            await self.reset_connection_pool(generation)
+
+        return await self.retry_policy.acall(operation, *args, on_retry=on_retry)
+
+    async def run_write(self, statement, idempotent: bool = False):
+        """
+        Run a writing statement on the primary. A statement whose connection failed
+        mid-flight may still have been committed, so only `idempotent` ones are
+        re-run under the retry policy; the others only retry the connection
+        checkout and run exactly once.
+        """
+        if idempotent:
+            return await self.run_with_retry(self._run_on_primary, statement)
+        return await self._run_on_primary(statement, retry_checkout=True)
+
+    async def _run_on_primary(self, statement, retry_checkout: bool = False):
+        """
+        Run `statement(connection)` on a primary connection, guarded by the circuit
+        breaker. With `retry_checkout`, failing to get a connection is retried.
+        """
+        self.circuit_breaker.before_call()
+        connection = None
+        try:
+            if retry_checkout:
+                connection = await self.run_with_retry(self._checkout)
+            else:
+                connection = await self._checkout()
+            result = await statement(connection)
+        except PoolTimeout:
+            # Recorded by _checkout, which can tell a saturated pool from an unreachable database.
+            raise
+        except (OperationalError, InterfaceError):
+            self.circuit_breaker.record_failure()
+            raise
+        except Exception:
+            self.circuit_breaker.record_success()
+            raise
+        finally:
+            if connection is not None:
+                await self.connection_pool.putconn(connection)
+        self.circuit_breaker.record_success()
+        return result
+
+    async def _checkout(self):
+        waiting_since = time.monotonic()
+        try:
+            connection = await self.connection_pool.getconn(timeout=POOL_CHECKOUT_TIMEOUT)
+        except PoolTimeout:
+            # If other requests got connections while this one waited, the pool is
+            # saturated, which is not an outage; if none did, it could not connect.
+            if self._last_checkout < waiting_since:
+                self.circuit_breaker.record_failure()
+            raise
+        self._last_checkout = time.monotonic()
+        return connection
+
+    async def retrieve_data(self, query='', data=None, use_primary: bool = False):
+        """Run a read query. It is routed to a read replica unless `use_primary` is set."""
+        try:
+            return await self.run_with_retry(self._retrieve_data_once, query, data, use_primary)
+        except CircuitOpenError:
+            raise
+        except Exception as error:
+            logger.error(f"Error retrieving data: {error} for query: {query}")
+            raise Exception(f"Error retrieving data: {error} for query: {query}")
+
+    async def _retrieve_data_once(self, query, data, use_primary):
+        async def fetch(connection):
+            async with connection.cursor() as cursor:
+                await cursor.execute(query, data if data else None)
+                return await cursor.fetchall()
+
+        if not use_primary and not reads_pinned_to_primary():
+            replica_index = self.replica_router.choose()
+            if replica_index is not None:
+                try:
+                    async with self.replica_pools[replica_index].connection(timeout=POOL_CHECKOUT_TIMEOUT) as connection:
+                        result = await fetch(connection)
+                    logger.info(f"Data retrieved successfully in async retrieve_data. query: {query}, rows: {len(result)}")
+                    return result
+                except PoolTimeout as e:
+                    logger.warning(f"Read replica {self.replica_router.replica_names[replica_index]} saturated, using primary: {e}")
+                except (OperationalError, InterfaceError) as e:
+                    self.replica_router.mark_failed(replica_index, e)
+
+        result = await self._run_on_primary(fetch)
+        logger.info(f"Data retrieved successfully in async retrieve_data. query: {query}, rows: {len(result)}")
+        return result
+
+    async def execute_query(self, query, data=None, idempotent: bool = False):
+        """Execute a writing statement. Pass `idempotent=True` if re-running it after a connection error is safe."""
+        async def execute(connection):
+            await connection.execute(query, data if data else None)
+            return True
+
+        try:
+            result = await self.run_write(execute, idempotent=idempotent)
+            record_write()
+            logger.info(f"Query executed successfully. query: {query} , data: {data}")
+            return result
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            error_message = f"Database query failed: {str(e)}\nQuery: {query}\nParameters: {data}"
+            logger.error(error_message)
+            raise Exception("Database query failed")
+
+    async def execute_and_fetch(self, query, data=None, idempotent: bool = False):
+        """Execute a writing statement that RETURNs rows."""
+        async def execute(connection):
+            async with connection.cursor() as cursor:
+                await cursor.execute(query, data if data else None)
+                return await cursor.fetchall()
+
+        try:
+            result = await self.run_write(execute, idempotent=idempotent)
+            record_write()
+            logger.info(f"Query executed successfully in execute_and_fetch. query: {query} , data: {data}")
+            return result
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Database query failed: {str(e)}\nQuery: {query}\nParameters: {data}")
+            raise Exception(f"Database query failed: {e}")
+
+    async def create_project_and_conversation(self, project_id: str, project_name: str, conversation_id: str, chat_type: str, user_id: str) -> Dict[str, bool]:
+        """
+        Idempotently create a project and its conversation in a single statement (one round trip).
+        Returns which of the two rows were newly created.
+        """
+        try:
+            query = f"""
+                WITH new_project AS (
+                    INSERT INTO {self.schema}.projects (project_id, project_name, created_by, created_at)
+                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (project_id) DO NOTHING
+                    RETURNING 1
+                ), new_conversation AS (
+                    INSERT INTO {self.schema}.conversation (conversation_id, project_id, user_id, chat_type, created_at)
+                    VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (conversation_id) DO NOTHING
+                    RETURNING 1
+                )
+                SELECT EXISTS (SELECT 1 FROM new_project), EXISTS (SELECT 1 FROM new_conversation)
+            """
+            data = (project_id, project_name, user_id, conversation_id, project_id, user_id, chat_type)
+            result = await self.execute_and_fetch(query, data, idempotent=True)
+            created = {"project_created": result[0][0], "conversation_created": result[0][1]}
+            logger.info(f"Project/conversation upserted: {project_id}, {conversation_id}, {created}")
+            return created
+        except Exception as e:
+            logger.error(f"Error creating project and conversation: {e}")
+            raise Exception(f"Error creating project and conversation: {e}")
+
+    async def insert_project(self, project_id: str, project_name: str, conversation_id: str, user_id: str) -> bool:
+        """Insert a new project if it does not already exist. Returns True if it was created."""
+        try:
+            insert_query = f"""
+                INSERT INTO {self.schema}.projects (project_id, project_name, created_by ,created_at )
+                VALUES (%s, %s , %s , CURRENT_TIMESTAMP)
+                ON CONFLICT (project_id) DO NOTHING
+                RETURNING project_id
+            """
+            created = bool(await self.execute_and_fetch(insert_query, (project_id, project_name, user_id), idempotent=True))
+            logger.info(f"Project {'inserted' if created else 'already exists'}: {project_id}")
+            return created
+        except Exception as e:
+            logger.error(f"Error inserting project: {e}")
+            raise Exception(f"Error inserting project: {e}")
+
+    async def insert_conversation(self, conversation_id: str, project_id: str, chat_type: str, user_id: str) -> bool:
+        """Insert a new conversation if it does not already exist. Returns True if it was created."""
+        try:
+            insert_query = f"""
+                INSERT INTO {self.schema}.conversation (conversation_id, project_id, user_id ,chat_type, created_at)
+                VALUES (%s, %s, %s,%s, CURRENT_TIMESTAMP)
+                ON CONFLICT (conversation_id) DO NOTHING
+                RETURNING conversation_id
+            """
+            created = bool(await self.execute_and_fetch(insert_query, (conversation_id, project_id, user_id, chat_type), idempotent=True))
+            logger.info(f"Conversation {'inserted' if created else 'already exists'}: {conversation_id}, {project_id}, {chat_type}")
+            return created
+        except Exception as e:
+            logger.error(f"Error inserting conversation: {e}")
+            raise Exception(f"Error inserting conversation: {e}")
+
+    async def read_files(self, file_ids: List[str]) -> str:
+        """
+        Read file contents from the database based on provided file IDs.
+        Returns a string containing the concatenated file contents.
+        """
+        try:
+            return "".join(
+                f"File Name: {file['file_name']}\nContent:\n{file['text']}\n\n"
+                for file in await self.read_file_texts(file_ids)
+            )
+        except Exception as e:
+            logger.error(f"Error reading files: {e}")
+            raise Exception(f"Error reading files: {e}")
+
+    async def read_file_texts(self, file_ids: List[str]) -> List[Dict[str, Any]]:
+        """Async version of DB.read_file_texts."""
+        try:
+            if not file_ids:
+                return []
+
+            query = f"""
+                SELECT file_name, extracted_text, extracted_text_zstd, token_count, section_offsets, content_hash, file_content,
+                       chunk_index_hash
+                FROM {self.schema}.conversation_attachment
+                WHERE attachment_id = ANY(%s) AND is_deleted = FALSE
+            """
+            result = await self.retrieve_data(query, (file_ids,))
+            files = []
+            for file_name, extracted_text, compressed_text, token_count, sections, content_hash, legacy_content, index_hash in result:
+                extracted_text = decompress_text(extracted_text, compressed_text)
+                if extracted_text is None:
+                    if content_hash:
+                        extracted_text = await asyncio.to_thread(blob_text, self.blob_store, content_hash)
+                    else:
+                        extracted_text = legacy_content or ''
+                    token_count, sections, index_hash = None, [], None
+                files.append({
+                    "file_name": file_name,
+                    "text": extracted_text,
+                    "token_count": token_count,
+                    "sections": sections or [],
+                    "chunk_index_hash": index_hash,
+                })
+            return files
+
+        except Exception as e:
+            logger.error(f"Error reading files: {e}")
+            raise Exception(f"Error reading files: {e}")
+
+    async def insert_conversation_message(self, conversation_id: str, user_query: str, agent_response: str, model_id: str, model_type: str,
+                                          token_count: Optional[int] = None):
+        """
+        Insert a new conversation message into the database and, in the same
+        statement, make it the project's current SRS in project_srs.
+        """
+        try:
+            message_id = str(uuid.uuid4())
+            content_hash = hashlib.sha256((agent_response or '').encode("utf-8")).hexdigest()
+            # Large responses are stored zstd-compressed; agent_response is NOT NULL so it is left empty.
+            plain_response, compressed_response = compress_text(agent_response)
+            insert_query = f"""
+                WITH message AS (
+                    INSERT INTO {self.schema}.conversation_message
+                    (message_id , conversation_id, user_query, agent_response, agent_response_zstd, model_id, model_type, created_at, search_vector)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, {MESSAGE_SEARCH_VECTOR_SQL})
+                    RETURNING message_id, conversation_id, created_at
+                )
+                INSERT INTO {self.schema}.project_srs (project_id, message_id, content_hash, token_count, updated_at)
+                SELECT c.project_id, message.message_id, %s, %s, message.created_at
+                FROM message
+                JOIN {self.schema}.conversation c ON c.conversation_id = message.conversation_id
+                WHERE c.project_id IS NOT NULL
+                ON CONFLICT (project_id) DO UPDATE SET
+                    message_id = EXCLUDED.message_id,
+                    content_hash = EXCLUDED.content_hash,
+                    token_count = EXCLUDED.token_count,
+                    updated_at = EXCLUDED.updated_at
+                WHERE {self.schema}.project_srs.updated_at <= EXCLUDED.updated_at
+            """
+            data = (message_id, conversation_id, user_query, plain_response or '', compressed_response, model_id, model_type,
+                    user_query, agent_response, content_hash, token_count)
+            await self.execute_query(insert_query, data)
+            logger.info(f"Conversation message inserted successfully: {conversation_id}")
+        except Exception as e:
+            logger.error(f"Error inserting conversation message: {e}")
+            return
+
+    async def get_all_llm_models(self):
+        try:
+            query = """
+                SELECT model_id, display_model_name, model_name, model_type, context_window, max_token, location, is_image_support, is_deleted, created_at
+                FROM task_management.llm_models
+                WHERE is_deleted = FALSE
+                ORDER BY created_at DESC
+            """
+            return list(await self.reference_cache.aget_or_load("llm_models", lambda: self.retrieve_data(query=query)))
+        except Exception as e:
+            logger.error(f"Error retrieving LLM models: {e}")
+            raise Exception("Failed to retrieve LLM models.")
+
+    async def get_role_id_by_name(self, role_name: str):
+        # Looked up in the cached roles table, so unknown names add no cache entries.
+        role_ids = [(role_id,) for role_id, name, _ in await self.get_role() if name == role_name]
+        return role_ids or None
+
+    async def check_user_query(self, email: str) -> bool:
+        query = """
+            SELECT 1 FROM task_management.users WHERE email = %s
+        """
+        return await self.retrieve_data(query=query, data=(email,))
+
+    async def insert_user(self, user_data: tuple):
+        query = """
+            INSERT INTO task_management.users
+            (user_id, username, email, password, first_name, last_name, role_id, created_at, updated_at, is_active)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, TRUE)
+        """
+        await self.execute_query(query=query, data=user_data)
+
+    async def get_user_by_email(self, email: str):
+        query = """
+            SELECT user_id, username, email, password, first_name, last_name, role_id
+            FROM task_management.users
+            WHERE email = %s
+        """
+        result = await self.retrieve_data(query=query, data=(email,))
+        return result if result else None
+
+    async def get_role(self):
+        query = """
+            SELECT role_id, role_name, description
+            FROM task_management.roles
+        """
+        return list(await self.reference_cache.aget_or_load("roles", lambda: self.retrieve_data(query=query)))
+
+    async def get_project_srs(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Current SRS of a project with its content hash and token count, or None."""
+        try:
+            result = await self.retrieve_data(*project_srs_query(self.schema, project_id))
+            if not result:
+                return None
+            message_id, content, compressed_content, content_hash, token_count, updated_at = result[0]
+            return {
+                "message_id": message_id,
+                "content": decompress_text(content, compressed_content),
+                "content_hash": content_hash,
+                "token_count": token_count,
+                "updated_at": updated_at,
+            }
+        except Exception as e:
+            logger.error(f"Error retrieving project SRS: {e}")
+            raise Exception(f"Error retrieving project SRS: {e}")
+
+    async def get_finalize_srs(self, project_id: str) -> str:
+        """Retrieve the final SRS from the conversation messages."""
+        try:
+            project_srs = await self.get_project_srs(project_id)
+            return project_srs["content"] if project_srs else ""
+        except Exception as e:
+            logger.error(f"Error retrieving final SRS: {e}")
+            raise Exception(f"Error retrieving final SRS: {e}")
+
+    async def search_user_content(self, user_id: str, search_query: str, limit: int = 20) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Full-text search over the user's SRS documents and the tasks of the user's
+        projects. Results are ranked with ts_rank_cd and carry a highlighted snippet.
+        """
+        try:
+            limit = max(1, min(int(limit), MAX_SEARCH_RESULTS))
+            # Plain responses get their snippet here, for the returned page only; compressed
+            # ones are snippeted after decompression, from the lexemes of the query.
+            messages_query = f"""
+                SELECT r.message_id, r.conversation_id, r.project_id, r.project_name, r.user_query,
+                       CASE WHEN r.agent_response_zstd IS NULL
+                            THEN ts_headline('{SEARCH_CONFIG}', COALESCE(r.agent_response, ''), r.q, %s) END AS snippet,
+                       r.agent_response_zstd, r.rank, r.message_created_at, r.q::text
+                FROM (
+                    SELECT cm.message_id, c.conversation_id, c.project_id, p.project_name, cm.user_query,
+                           cm.agent_response, cm.agent_response_zstd, q, ts_rank_cd(cm.search_vector, q) AS rank,
+                           TO_CHAR(cm.created_at, 'YYYY-MM-DD HH24:MI:SS') AS message_created_at, cm.created_at
+                    FROM {self.schema}.conversation_message cm
+                    JOIN {self.schema}.conversation c ON c.conversation_id = cm.conversation_id
+                    LEFT JOIN {self.schema}.projects p ON p.project_id = c.project_id,
+                         websearch_to_tsquery('{SEARCH_CONFIG}', %s) q
+                    WHERE c.user_id = %s AND cm.search_vector @@ q AND cm.is_deleted = FALSE
+                    ORDER BY rank DESC, cm.created_at DESC
+                    LIMIT %s
+                ) r
+                ORDER BY r.rank DESC, r.created_at DESC
+            """
+            tasks_query = f"""
+                SELECT t.task_id, t.project_id, p.project_name, t.title, t.status,
+                       ts_headline('{SEARCH_CONFIG}', COALESCE(t.description, ''), q, %s) AS snippet,
+                       ts_rank_cd(t.search_vector, q) AS rank
+                FROM {self.schema}.tasks t
+                JOIN {self.schema}.projects p ON p.project_id = t.project_id,
+                     websearch_to_tsquery('{SEARCH_CONFIG}', %s) q
+                WHERE p.created_by = %s AND t.search_vector @@ q
+                ORDER BY rank DESC, t.created_at DESC
+                LIMIT %s
+            """
+            message_rows = await self.retrieve_data(messages_query, (HEADLINE_OPTIONS, search_query, user_id, limit))
+            task_rows = await self.retrieve_data(tasks_query, (HEADLINE_OPTIONS, search_query, user_id, limit))
+            snippets = [
+                row[5] if row[6] is None else headline(decompress_text("", row[6]), query_lexemes(row[9]))
+                for row in message_rows
+            ]
+
+            return {
+                "messages": [
+                    {
+                        "message_id": row[0],
+                        "conversation_id": row[1],
+                        "project_id": row[2],
+                        "project_name": row[3],
+                        "user_query": row[4],
+                        "snippet": snippet,
+                        "rank": float(row[7]),
+                        "message_created_at": row[8],
+                    } for row, snippet in zip(message_rows, snippets)
+                ],
+                "tasks": [
+                    {
+                        "task_id": row[0],
+                        "project_id": row[1],
+                        "project_name": row[2],
+                        "title": row[3],
+                        "status": row[4],
+                        "snippet": row[5],
+                        "rank": float(row[6]),
+                    } for row in task_rows
+                ],
+            }
+        except Exception as e:
+            logger.error(f"Error searching user content: {e}")
+            raise Exception(f"Error searching user content: {e}")
+
+    async def get_user_chat_details(self, user_id: str , project_id : str, page_size: Optional[int] = None, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Retrieve chat messages of a user's project.
+        Without `page_size` every message is returned. With it, messages are returned
+        newest first in keyset pages on (created_at, message_id); pass the returned
+        cursor back to fetch the next page. Returns (chat_details, next_cursor).
+        """
+        try:
+            if page_size:
+                page_size = clamp_page_size(page_size)
+            query, data = user_chat_details_query(self.schema, user_id, project_id, page_size, cursor)
+            result = await self.retrieve_data(query, data)
+
+            next_cursor = None
+            if page_size and len(result) > page_size:
+                result = result[:page_size]
+                next_cursor = encode_cursor(result[-1][8], result[-1][4])
+
+            chat_details = [
+                {
+                    "conversation_id": row[0],
+                    "project_id": row[1],
+                    "chat_type": row[2],
+                    "created_at": row[3],
+                    "message_id": row[4],
+                    "user_query": row[5],
+                    "agent_response": decompress_text(row[6], row[9]),
+                    "message_created_at": row[7]
+                } for row in result
+            ]
+            return chat_details, next_cursor
+        except Exception as e:
+            logger.error(f"Error retrieving user chat info: {e}")
+            raise Exception(f"Error retrieving user chat info: {e}")
+    
+    async def get_user_chat_info(self, user_id: str, page_size: Optional[int] = None, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Retrieve the projects owned by a user, newest first.
+        With `page_size` the projects are returned in keyset pages on
+        (created_at, project_id). Returns (chat_info, next_cursor).
+        """
+        try:
+            if page_size:
+                page_size = clamp_page_size(page_size)
+            query, data = user_chat_info_query(self.schema, user_id, page_size, cursor)
+            result = await self.retrieve_data(query, data)
+
+            next_cursor = None
+            if page_size and len(result) > page_size:
+                result = result[:page_size]
+                next_cursor = encode_cursor(result[-1][3], result[-1][0])
+
+            chat_info = [
+                {
+                    "project_id": row[0],
+                    "project_name": row[1],
+                    "created_at": row[2]
+                } for row in result
+            ]
+            return chat_info, next_cursor
+        except Exception as e:
+            logger.error(f"Error retrieving user chat info: {e}")
+            raise Exception(f"Error retrieving user chat info: {e}")
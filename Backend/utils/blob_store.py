@@ -0,0 +1,183 @@
+"""
+Content-addressed storage for attachment bytes.
+
+Blobs are keyed by the SHA-256 of their content, so the same file uploaded to
+many conversations is stored once. Postgres only keeps the hash, size and
+metadata (task_management.conversation_attachment.content_hash).
+
+Usage:
+    python -m utils.blob_store migrate-attachments
+    python -m utils.blob_store stats
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import BinaryIO, Optional
+from .shared import logger
+
+BLOB_STORE_ROOT = os.getenv("BLOB_STORE_ROOT", str(Path(__file__).resolve().parent.parent / "blob_store"))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class BlobNotFoundError(Exception):
+    pass
+
+
+class BlobStore(ABC):
+    """Interface every blob store backend implements."""
+
+    @abstractmethod
+    def put(self, data: bytes) -> str:
+        """Store `data` and return its SHA-256 hex digest."""
+
+    @abstractmethod
+    def put_stream(self, stream: BinaryIO) -> str:
+        """Store the remaining contents of a binary file object and return its SHA-256 hex digest."""
+
+    @abstractmethod
+    def get(self, content_hash: str) -> bytes:
+        ...
+
+    @abstractmethod
+    def exists(self, content_hash: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, content_hash: str) -> bool:
+        ...
+
+    @abstractmethod
+    def stats(self):
+        ...
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Filesystem backend. Blobs live at <root>/<hash[:2]>/<hash[2:4]>/<hash> and
+    are written to a temporary file first and renamed into place, so readers
+    never see a partial blob and concurrent uploads of the same file are safe.
+    """
+
+    def __init__(self, root: str = BLOB_STORE_ROOT):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, content_hash: str) -> Path:
+        if len(content_hash) != 64 or any(c not in "0123456789abcdef" for c in content_hash):
+            raise ValueError(f"Invalid content hash: {content_hash}")
+        return self.root / content_hash[:2] / content_hash[2:4] / content_hash
+
+    def put(self, data: bytes) -> str:
+        content_hash = hashlib.sha256(data).hexdigest()
+        if not self.exists(content_hash):
+            with tempfile.NamedTemporaryFile(dir=self.tmp_dir, delete=False) as temp_file:
+                temp_file.write(data)
+            self._commit(Path(temp_file.name), content_hash)
+        return content_hash
+
+    def put_stream(self, stream: BinaryIO) -> str:
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.tmp_dir, delete=False) as temp_file:
+            for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                temp_file.write(chunk)
+        content_hash = digest.hexdigest()
+        if self.exists(content_hash):
+            os.unlink(temp_file.name)
+        else:
+            self._commit(Path(temp_file.name), content_hash)
+        return content_hash
+
+    def _commit(self, temp_path: Path, content_hash: str):
+        target = self.path_for(content_hash)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, target)
+
+    def get(self, content_hash: str) -> bytes:
+        try:
+            return self.path_for(content_hash).read_bytes()
+        except FileNotFoundError:
+            raise BlobNotFoundError(f"Blob {content_hash} not found in {self.root}")
+
+    def exists(self, content_hash: str) -> bool:
+        return self.path_for(content_hash).is_file()
+
+    def delete(self, content_hash: str) -> bool:
+        try:
+            self.path_for(content_hash).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def stats(self):
+        blobs, total_bytes = 0, 0
+        for path in self.root.glob("??/??/*"):
+            blobs += 1
+            total_bytes += path.stat().st_size
+        return {"backend": "local", "root": str(self.root), "blobs": blobs, "bytes": total_bytes}
+
+
+def get_blob_store(root: Optional[str] = None) -> BlobStore:
+    return LocalBlobStore(root or BLOB_STORE_ROOT)
+
+
+def blob_text(store: BlobStore, content_hash: str) -> str:
+    """Decode a stored blob for use in a prompt."""
+    return store.get(content_hash).decode("utf-8", errors="replace")
+
+
+def _legacy_content_bytes(file_content: str) -> bytes:
+    """file_content used to receive bytes through psycopg2, which Postgres stored as bytea hex text."""
+    if file_content.startswith("\\x"):
+        try:
+            return bytes.fromhex(file_content[2:])
+        except ValueError:
+            pass
+    return file_content.encode("utf-8")
+
+
+def migrate_attachment_contents(db, store: BlobStore, batch_size: int = 100) -> int:
+    """Move legacy conversation_attachment.file_content values into the blob store."""
+    moved = 0
+    while True:
+        rows = db.retrieve_data("""
+            SELECT attachment_id, file_content FROM task_management.conversation_attachment
+            WHERE content_hash IS NULL AND file_content IS NOT NULL
+            LIMIT %s
+        """, (batch_size,), use_primary=True)
+        if not rows:
+            break
+        for attachment_id, file_content in rows:
+            content_hash = store.put(_legacy_content_bytes(file_content))
+            db.execute_query("""
+                UPDATE task_management.conversation_attachment
+                SET content_hash = %s, file_content = NULL
+                WHERE attachment_id = %s
+            """, (content_hash, attachment_id), idempotent=True)
+            moved += 1
+        logger.info(f"Moved {moved} attachment(s) into the blob store")
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SprintSeed attachment blob store")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate-attachments", help="Move legacy file_content values into the blob store")
+    subparsers.add_parser("stats", help="Show blob count and size")
+    args = parser.parse_args()
+
+    from utils import db_obj, blob_store
+
+    if args.command == "migrate-attachments":
+        print(migrate_attachment_contents(db_obj, blob_store))
+    elif args.command == "stats":
+        print(json.dumps(blob_store.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
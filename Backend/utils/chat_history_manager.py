@@ -1,8 +1,36 @@
 from langchain_community.chat_message_histories import RedisChatMessageHistory
 from langchain.schema import HumanMessage, AIMessage
+from langchain_core.messages import message_to_dict
+import redis.asyncio as aioredis
 from utils import redis_url , logger
+from utils.model_token_manager import truncate_to_tokens
+import json
+import os
 import traceback
 
+# Compaction: keep the last HISTORY_VERBATIM_TURNS user turns verbatim and a
+# rolling summary of the older ones, refreshed after each completion.
+HISTORY_COMPACTION_ENABLED = os.getenv("HISTORY_COMPACTION_ENABLED", "true").lower() == "true"
+HISTORY_VERBATIM_TURNS = int(os.getenv("HISTORY_VERBATIM_TURNS", 4))
+HISTORY_SUMMARY_MAX_TOKENS = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", 800))
+SUMMARY_LOCK_SECONDS = 120
+
+_async_redis_client = None
+
+
+def get_async_redis_client():
+    """Shared redis.asyncio client, created on first use inside the running event loop."""
+    global _async_redis_client
+    if _async_redis_client is None:
+        _async_redis_client = aioredis.from_url(redis_url)
+    return _async_redis_client
+
+
+async def close_async_redis_client():
+    global _async_redis_client
+    if _async_redis_client is not None:
+        await _async_redis_client.aclose()
+        _async_redis_client = None
 
 
 class ChatHistoryManager:
@@ -11,6 +39,8 @@ class ChatHistoryManager:
     """
     def __init__(self, session_id, key_prefix='sprint_speed', ttl=3600):
         self.chat_history = RedisChatMessageHistory(session_id=session_id, url=redis_url, key_prefix=key_prefix, ttl=ttl)
+        # Next to the history list (key_prefix + session_id), like the child lists.
+        self.summary_key = f"{self.chat_history.key}:summary"
         logger.debug("Chat history manager initialized successfully.")
 
     def add_message_child(self, session_id, key, message):
@@ -75,21 +105,71 @@ class ChatHistoryManager:
             trace = traceback.format_exc()
             logger.error(f"Failed to store chat history: {e}\nTraceback: {trace}")
 
+    async def astore_proposal_chat_history(self, user_query, agent_response):
+        """store_proposal_chat_history over redis.asyncio, in the same format RedisChatMessageHistory reads."""
+        try:
+            key = self.chat_history.key
+            async with get_async_redis_client().pipeline(transaction=True) as pipe:
+                pipe.lpush(key, json.dumps(message_to_dict(HumanMessage(content=user_query, additional_kwargs={"type": "proposal"}))))
+                pipe.lpush(key, json.dumps(message_to_dict(AIMessage(content=agent_response, additional_kwargs={"type": "proposal"}))))
+                if self.chat_history.ttl:
+                    pipe.expire(key, self.chat_history.ttl)
+                await pipe.execute()
+            logger.debug("Stored chat history successfully.")
+        except Exception as e:
+            trace = traceback.format_exc()
+            logger.error(f"Failed to store chat history: {e}\nTraceback: {trace}")
+
+    def get_proposal_turns(self):
+        """User turns of the proposal conversation and the latest agent response."""
+        user_turns, last_agent_message = [], None
+        for message in self.get_chat_history():
+            if isinstance(message, HumanMessage) and message.additional_kwargs.get("type") == "proposal":
+                user_turns.append(message.content)
+            if isinstance(message, AIMessage) and message.additional_kwargs.get("type") == "proposal":
+                last_agent_message = message.content
+        return user_turns, last_agent_message
+
+    def get_history_summary(self, turn_count):
+        """The stored rolling summary as {summary, turns}, or None when it does not match the history."""
+        try:
+            raw = self.chat_history.redis_client.get(self.summary_key)
+            record = json.loads(raw) if raw else None
+            # The history expired or was cleared after the summary was written.
+            if record and record["turns"] > turn_count:
+                return None
+            return record
+        except Exception as e:
+            logger.error(f"Failed to get history summary: {e}, key: {self.summary_key}")
+            return None
+
     def create_proposal_user_message_string(self):
+        """
+        User turns followed by the latest agent response. With compaction, turns
+        already covered by the rolling summary are replaced by it, so the string
+        stays bounded however long the session runs.
+        """
         try:
-            history = self.get_chat_history()
-            last_agent_message = None
+            user_turns, last_agent_message = self.get_proposal_turns()
             user_message_string = ""
 
-            for message in history:
-                if isinstance(message, HumanMessage) and message.additional_kwargs.get("type") == "proposal":
-                    user_message_string += f"User: {message.content}\n"
-
-                if isinstance(message, AIMessage) and message.additional_kwargs.get("type") == "proposal":
-                    last_agent_message = f"Agent: {message.content}"  # pick only the latest one
+            if HISTORY_COMPACTION_ENABLED and len(user_turns) > HISTORY_VERBATIM_TURNS:
+                record = self.get_history_summary(len(user_turns))
+                covered = record["turns"] if record else 0
+                if record:
+                    user_message_string += f"Summary of earlier user requests:\n{record['summary']}\n\n"
+                pending = user_turns[covered:]
+                # The refresh is behind (or failing); never let the verbatim part grow unbounded.
+                if len(pending) > 2 * HISTORY_VERBATIM_TURNS:
+                    logger.warning(f"History summary of {self.summary_key} is {len(pending)} turns behind")
+                    pending = pending[-2 * HISTORY_VERBATIM_TURNS:]
+                user_turns = pending
+
+            for turn in user_turns:
+                user_message_string += f"User: {turn}\n"
 
             if last_agent_message:
-                user_message_string += f"\n{last_agent_message}"
+                user_message_string += f"\nAgent: {last_agent_message}"
 
             logger.debug(f"Created proposal user message string successfully.\n{user_message_string}")
             return user_message_string
@@ -97,4 +177,37 @@ class ChatHistoryManager:
         except Exception as e:
             trace = traceback.format_exc()
             logger.error(f"Failed to create proposal user message string: {e}\nTraceback: {trace}")
-            return ""
\ No newline at end of file
+            return ""
+
+    def refresh_history_summary(self, summarize):
+        """
+        Fold the user turns that fell out of the verbatim window into the rolling
+        summary. `summarize(previous_summary, new_turns)` returns the new summary;
+        it runs after the response has been streamed, never on the request path.
+        """
+        if not HISTORY_COMPACTION_ENABLED:
+            return
+        redis_client = self.chat_history.redis_client
+        lock_key = f"{self.summary_key}:lock"
+        try:
+            # One refresh per session at a time; a skipped one is caught up by the next completion.
+            if not redis_client.set(lock_key, "1", nx=True, ex=SUMMARY_LOCK_SECONDS):
+                return
+            try:
+                user_turns, _ = self.get_proposal_turns()
+                target = len(user_turns) - HISTORY_VERBATIM_TURNS
+                record = self.get_history_summary(len(user_turns))
+                covered = record["turns"] if record else 0
+                if target <= covered:
+                    return
+
+                summary = summarize(record["summary"] if record else "", user_turns[covered:target])
+                summary = truncate_to_tokens(summary.strip(), HISTORY_SUMMARY_MAX_TOKENS)
+                redis_client.set(self.summary_key, json.dumps({"summary": summary, "turns": target}),
+                                 ex=self.chat_history.ttl)
+                logger.info(f"History summary of {self.summary_key} now covers {target} turn(s)")
+            finally:
+                redis_client.delete(lock_key)
+        except Exception as e:
+            trace = traceback.format_exc()
+            logger.error(f"Failed to refresh history summary: {e}\nTraceback: {trace}")
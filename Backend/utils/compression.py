@@ -0,0 +1,265 @@
+"""
+Transparent zstd compression of large text values (SRS documents in
+conversation_message.agent_response, attachment extracted_text).
+
+Values of at least COMPRESSION_THRESHOLD UTF-8 bytes are stored compressed in a
+BYTEA sibling column (`*_zstd`) and the text column is left empty. Frames are
+compressed with the active dictionary trained on SRS documents; the dictionary
+id is read back from the frame header, so rows written with older dictionaries
+stay readable as long as their .zdict file is kept.
+
+`zstandard` is optional: without it nothing new is compressed, and reading an
+already compressed value raises.
+
+Usage:
+    python -m utils.compression train-dictionary --samples 2000
+    python -m utils.compression compress-existing
+    python -m utils.compression stats
+    python -m utils.compression benchmark --samples 200
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from .shared import logger
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_THRESHOLD = int(os.getenv("COMPRESSION_THRESHOLD", 4096))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", 9))
+COMPRESSION_DICT_DIR = Path(os.getenv("COMPRESSION_DICT_DIR", Path(__file__).resolve().parent.parent / "compression_dicts"))
+COMPRESSION_DICT_ID = int(os.getenv("COMPRESSION_DICT_ID", 0)) or None
+DICTIONARY_SIZE = 112_640
+
+
+class TextCompressor:
+    """Compress/decompress text with zstd and optional trained dictionaries."""
+
+    def __init__(self,
+                 threshold: int = COMPRESSION_THRESHOLD,
+                 level: int = COMPRESSION_LEVEL,
+                 dict_dir: Path = COMPRESSION_DICT_DIR,
+                 dict_id: Optional[int] = COMPRESSION_DICT_ID,
+                 enabled: bool = COMPRESSION_ENABLED):
+        self.threshold = threshold
+        self.level = level
+        self.dict_dir = Path(dict_dir)
+        self.enabled = enabled and zstandard is not None
+        self.dictionaries: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+        self.active_dict_id = None
+        # zstd (de)compressor objects are not thread-safe; keep one set per thread.
+        self._local = threading.local()
+        if zstandard is not None:
+            self.load_dictionaries(dict_id)
+        elif enabled:
+            logger.warning("zstandard is not installed; large text values are stored uncompressed")
+
+    def load_dictionaries(self, dict_id: Optional[int] = None):
+        """Load every <dict_id>.zdict file. The requested id, else the newest file, becomes active."""
+        self.dictionaries = {}
+        newest = None
+        for path in sorted(self.dict_dir.glob("*.zdict"), key=lambda p: p.stat().st_mtime):
+            dictionary = zstandard.ZstdCompressionDict(path.read_bytes())
+            self.dictionaries[dictionary.dict_id()] = dictionary
+            newest = dictionary.dict_id()
+        self.active_dict_id = dict_id if dict_id in self.dictionaries else newest
+        self._local = threading.local()
+        if dict_id and dict_id not in self.dictionaries:
+            logger.warning(f"Compression dictionary {dict_id} not found in {self.dict_dir}")
+
+    def _compressor(self):
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            dictionary = self.dictionaries.get(self.active_dict_id)
+            compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+            self._local.compressor = compressor
+        return compressor
+
+    def _decompressor(self, dict_id: int):
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        if dict_id not in decompressors:
+            if dict_id and dict_id not in self.dictionaries:
+                raise Exception(f"Compression dictionary {dict_id} is missing from {self.dict_dir}")
+            decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=self.dictionaries.get(dict_id))
+        return decompressors[dict_id]
+
+    def compress(self, text: Optional[str]) -> Tuple[Optional[str], Optional[bytes]]:
+        """
+        Return (plain, compressed): values under the threshold, or when compression
+        is unavailable, come back as (text, None); larger ones as (None, frame).
+        """
+        if text is None or not self.enabled:
+            return text, None
+        data = text.encode("utf-8")
+        if len(data) < self.threshold:
+            return text, None
+        return None, self._compressor().compress(data)
+
+    def decompress(self, plain: Optional[str], compressed) -> Optional[str]:
+        """Inverse of `compress`; `compressed` may be bytes or a memoryview (psycopg2 BYTEA)."""
+        if compressed is None:
+            return plain
+        if zstandard is None:
+            raise Exception("zstandard is required to read compressed values")
+        data = bytes(compressed)
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        return self._decompressor(dict_id).decompress(data).decode("utf-8")
+
+
+text_compressor = TextCompressor()
+
+
+def compress_text(text: Optional[str]) -> Tuple[Optional[str], Optional[bytes]]:
+    return text_compressor.compress(text)
+
+
+def decompress_text(plain: Optional[str], compressed) -> Optional[str]:
+    return text_compressor.decompress(plain, compressed)
+
+
+# (table, key column, text column, compressed column, text column is NOT NULL)
+COMPRESSED_COLUMNS = [
+    ("task_management.conversation_message", "message_id", "agent_response", "agent_response_zstd", True),
+    ("task_management.conversation_attachment", "attachment_id", "extracted_text", "extracted_text_zstd", False),
+]
+
+
+def _sample_srs_documents(db, samples: int) -> List[bytes]:
+    rows = db.retrieve_data("""
+        SELECT agent_response, agent_response_zstd FROM task_management.conversation_message
+        WHERE octet_length(agent_response) > 0 OR agent_response_zstd IS NOT NULL
+        ORDER BY random() LIMIT %s
+    """, (samples,))
+    return [decompress_text(plain, compressed).encode("utf-8") for plain, compressed in rows]
+
+
+def train_dictionary(db, samples: int = 2000, dict_size: int = DICTIONARY_SIZE, dict_dir: Path = COMPRESSION_DICT_DIR) -> int:
+    """Train a zstd dictionary on stored SRS documents and save it as <dict_id>.zdict."""
+    if zstandard is None:
+        raise Exception("zstandard is required to train a dictionary")
+    documents = _sample_srs_documents(db, samples)
+    if len(documents) < 10:
+        raise Exception(f"Need at least 10 SRS documents to train a dictionary, found {len(documents)}")
+    dictionary = zstandard.train_dictionary(dict_size, documents)
+    Path(dict_dir).mkdir(parents=True, exist_ok=True)
+    path = Path(dict_dir) / f"{dictionary.dict_id()}.zdict"
+    path.write_bytes(dictionary.as_bytes())
+    logger.info(f"Trained compression dictionary {dictionary.dict_id()} on {len(documents)} documents: {path}")
+    return dictionary.dict_id()
+
+
+def compress_existing_rows(db, batch_size: int = 500) -> Dict[str, int]:
+    """Compress rows written before compression was enabled (or that were under an older threshold)."""
+    if not text_compressor.enabled:
+        raise Exception("Compression is disabled or zstandard is not installed")
+    compressed = {}
+    for table, key, text_column, zstd_column, not_null in COMPRESSED_COLUMNS:
+        empty = "''" if not_null else "NULL"
+        count, last_key = 0, ""
+        while True:
+            rows = db.retrieve_data(f"""
+                SELECT {key}, {text_column} FROM {table}
+                WHERE {zstd_column} IS NULL AND octet_length({text_column}) >= %s AND {key} > %s
+                ORDER BY {key} LIMIT %s
+            """, (text_compressor.threshold, last_key, batch_size), use_primary=True)
+            if not rows:
+                break
+            for row_key, text in rows:
+                _, frame = compress_text(text)
+                if frame is None:
+                    continue
+                db.execute_query(f"""
+                    UPDATE {table} SET {zstd_column} = %s, {text_column} = {empty}
+                    WHERE {key} = %s AND {zstd_column} IS NULL
+                """, (frame, row_key), idempotent=True)
+                count += 1
+            last_key = rows[-1][0]
+        compressed[table] = count
+        logger.info(f"Compressed {count} row(s) of {table}.{text_column}")
+    return compressed
+
+
+def storage_stats(db) -> Dict[str, Dict[str, int]]:
+    """On-disk size (after TOAST) of plain and compressed values per table."""
+    stats = {}
+    for table, _, text_column, zstd_column, _ in COMPRESSED_COLUMNS:
+        row = db.retrieve_data(f"""
+            SELECT COUNT(*),
+                   COUNT({zstd_column}),
+                   COALESCE(SUM(pg_column_size({text_column})), 0),
+                   COALESCE(SUM(pg_column_size({zstd_column})), 0)
+            FROM {table}
+        """)[0]
+        stats[table] = {
+            "rows": row[0],
+            "compressed_rows": row[1],
+            "plain_bytes": int(row[2]),
+            "compressed_bytes": int(row[3]),
+        }
+    return stats
+
+
+def benchmark(db, samples: int = 200) -> Dict[str, Dict[str, float]]:
+    """Compression ratio and decompression latency on sampled SRS documents, with and without the dictionary."""
+    if zstandard is None:
+        raise Exception("zstandard is required for the benchmark")
+    documents = _sample_srs_documents(db, samples)
+    if not documents:
+        raise Exception("No SRS documents to benchmark")
+    raw_bytes = sum(len(d) for d in documents)
+    report = {"documents": {"count": len(documents), "raw_bytes": raw_bytes}}
+    variants = {"zstd": None}
+    if text_compressor.active_dict_id:
+        variants["zstd+dictionary"] = text_compressor.dictionaries[text_compressor.active_dict_id]
+    for name, dictionary in variants.items():
+        compressor = zstandard.ZstdCompressor(level=text_compressor.level, dict_data=dictionary)
+        decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+        frames = [compressor.compress(d) for d in documents]
+        started = time.perf_counter()
+        for frame in frames:
+            decompressor.decompress(frame)
+        elapsed = time.perf_counter() - started
+        compressed_bytes = sum(len(f) for f in frames)
+        report[name] = {
+            "compressed_bytes": compressed_bytes,
+            "ratio": round(raw_bytes / compressed_bytes, 2),
+            "avg_decompress_ms": round(elapsed / len(frames) * 1000, 4),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SprintSeed text compression")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train-dictionary", help="Train a zstd dictionary on stored SRS documents")
+    train_parser.add_argument("--samples", type=int, default=2000)
+    train_parser.add_argument("--size", type=int, default=DICTIONARY_SIZE)
+    subparsers.add_parser("compress-existing", help="Compress existing rows above the threshold")
+    subparsers.add_parser("stats", help="Show plain vs compressed storage size")
+    bench_parser = subparsers.add_parser("benchmark", help="Measure ratio and decompression latency on stored documents")
+    bench_parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    from utils import db_obj
+
+    if args.command == "train-dictionary":
+        print(train_dictionary(db_obj, args.samples, args.size))
+    elif args.command == "compress-existing":
+        print(json.dumps(compress_existing_rows(db_obj), indent=2))
+    elif args.command == "stats":
+        print(json.dumps(storage_stats(db_obj), indent=2))
+    elif args.command == "benchmark":
+        print(json.dumps(benchmark(db_obj, args.samples), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import threading
+import time
+import psycopg2
+from psycopg2 import pool
+from .shared import logger
+
+
+class PoolTimeoutError(pool.PoolError):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class InstrumentedConnectionPool(pool.AbstractConnectionPool):
+    """
+    Thread-safe bounded connection pool.
+
+    Unlike `SimpleConnectionPool`, `getconn` blocks (up to `timeout` seconds)
+    when all `maxconn` connections are checked out instead of raising, and the
+    pool records checkout wait time, in-use count and exhaustion counters.
+
+    New connections are opened outside the pool lock: a checkout reserves a
+    slot, connects, then records itself, so a slow or failing connect never
+    holds up threads that only take or return idle connections.
+    """
+
+    def __init__(self, minconn, maxconn, *args, timeout=30.0, **kwargs):
+        self._condition = threading.Condition(threading.Lock())
+        self.timeout = timeout
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._peak_in_use = 0
+        # Slots reserved by checkouts that are opening a new connection.
+        self._connecting = 0
+        self._connect_failures = 0
+        pool.AbstractConnectionPool.__init__(self, minconn, maxconn, *args, **kwargs)
+
+    def new_connection(self):
+        """Open a connection with the pool's connect arguments. Called without the pool lock held."""
+        return psycopg2.connect(*self._args, **self._kwargs)
+
+    def getconn(self, key=None, timeout=None):
+        """Check out a connection, waiting for one to be returned if the pool is saturated."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._condition:
+            waited = False
+            while not self._pool and len(self._used) + self._connecting >= self.maxconn and not self.closed:
+                if key is not None and key in self._used:
+                    break
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    logger.error(f"Connection pool exhausted: no connection available after {timeout}s (in use: {len(self._used)})")
+                    raise PoolTimeoutError(f"Timed out after {timeout}s waiting for a database connection")
+                self._condition.wait(remaining)
+
+            if self._pool or self.closed or (key is not None and key in self._used):
+                # An idle connection (or the pool's own error when closed); no I/O under the lock.
+                connection = self._getconn(key)
+                self._record_checkout(start)
+                return connection
+            self._connecting += 1
+
+        try:
+            connection = self.new_connection()
+        except Exception:
+            with self._condition:
+                self._connecting -= 1
+                self._connect_failures += 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self._connecting -= 1
+            if self.closed:
+                connection.close()
+                self._condition.notify()
+                raise pool.PoolError("connection pool is closed")
+            if key is None:
+                key = self._getkey()
+            self._used[key] = connection
+            self._rused[id(connection)] = key
+            self._record_checkout(start)
+            return connection
+
+    def _record_checkout(self, start):
+        wait_time = time.monotonic() - start
+        self._checkouts += 1
+        self._total_wait += wait_time
+        self._max_wait = max(self._max_wait, wait_time)
+        self._peak_in_use = max(self._peak_in_use, len(self._used))
+
+    def putconn(self, conn, key=None, close=False):
+        """Return a connection to the pool and wake one waiting thread."""
+        with self._condition:
+            try:
+                self._putconn(conn, key, close)
+            finally:
+                self._condition.notify()
+
+    def owns(self, conn) -> bool:
+        """True if `conn` is currently checked out from this pool."""
+        with self._condition:
+            return id(conn) in self._rused
+
+    def close_idle(self):
+        """Close the idle connections; checked-out ones stay open until returned."""
+        with self._condition:
+            while self._pool:
+                conn = self._pool.pop()
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+    def closeall(self):
+        with self._condition:
+            self._closeall()
+            self._condition.notify_all()
+
+    def stats(self):
+        """Snapshot of pool saturation metrics."""
+        with self._condition:
+            return {
+                "min_connections": self.minconn,
+                "max_connections": self.maxconn,
+                "in_use": len(self._used),
+                "connecting": self._connecting,
+                "connect_failures": self._connect_failures,
+                "idle": len(self._pool),
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "exhausted_waits": self._waits,
+                "timeouts": self._timeouts,
+                "total_wait_seconds": round(self._total_wait, 6),
+                "avg_wait_seconds": round(self._total_wait / self._checkouts, 6) if self._checkouts else 0.0,
+                "max_wait_seconds": round(self._max_wait, 6),
+            }
+
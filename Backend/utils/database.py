@@ -1,22 +1,39 @@
-from psycopg2 import pool
 import os
 from dotenv import load_dotenv
 import psycopg2
+from psycopg2.extras import execute_values, Json
 import time
+import threading
 from psycopg2 import OperationalError, InterfaceError
 from .shared import logger
+from .connection_pool import InstrumentedConnectionPool, PoolTimeoutError
+from .retry_policy import CircuitBreaker, CircuitOpenError, default_db_retry_policy, default_db_circuit_breaker
+from .replica_router import ReplicaRouter, dsn_label, read_your_writes, record_write, reads_pinned_to_primary
 import uuid
-from typing import List, Dict, Any
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple
+from .pagination import clamp_page_size, encode_cursor
+from .read_queries import project_srs_query, user_chat_details_query, user_chat_info_query
+from .blob_store import BlobStore, blob_text, get_blob_store
+from .ttl_cache import TTLCache, reference_data_cache
+from .compression import compress_text, decompress_text
+from .search import MESSAGE_SEARCH_VECTOR_SQL
 load_dotenv()
 
 MIN_CONNECTION = int(os.getenv("MIN_CONNECTION", 1))
 MAX_CONNECTION = int(os.getenv("MAX_CONNECTION", 6))
+POOL_TIMEOUT = float(os.getenv("POOL_TIMEOUT", 30))
+BULK_PAGE_SIZE = int(os.getenv("BULK_PAGE_SIZE", 500))
+STREAM_ITERSIZE = int(os.getenv("STREAM_ITERSIZE", 200))
+REPLICA_COOLDOWN = float(os.getenv("REPLICA_COOLDOWN", 30))
 print("MIN_CONNECTION", MIN_CONNECTION, type(MIN_CONNECTION))
 print("MAX_CONNECTION", MAX_CONNECTION, type(MAX_CONNECTION))
 
 
 class DB:
-    def __init__(self, schema, port, host, username, password):
+    def __init__(self, schema, port, host, username, password, replica_dsns: Optional[List[str]] = None,
+                 retry_policy=None, circuit_breaker=None, blob_store: Optional[BlobStore] = None,
+                 reference_cache: Optional[TTLCache] = None):
         self.schema = schema
         self.port = port
         self.host = host
@@ -24,8 +41,18 @@ class DB:
         self.password = password
         self.connection_pool = None
         self.max_retries = 3
-        self.retry_delay = 3  # seconds
+        self.retry_delay = 3  # seconds, only used while creating the pool at startup
+        self.retry_policy = retry_policy or default_db_retry_policy(retry_on=(OperationalError, InterfaceError))
+        self.circuit_breaker = circuit_breaker or default_db_circuit_breaker("primary database")
+        self.pool_generation = 0
+        self._pool_reset_lock = threading.Lock()
+        self.blob_store = blob_store or get_blob_store()
+        self.reference_cache = reference_cache or reference_data_cache
+        self.replica_dsns = replica_dsns or []
+        self.replica_pools = [None] * len(self.replica_dsns)
+        self.replica_router = ReplicaRouter([dsn_label(dsn) for dsn in self.replica_dsns], cooldown=REPLICA_COOLDOWN)
         self.init_connection_pool()
+        self.init_replica_pools()
 
     def init_connection_pool(self):
         try:
@@ -49,9 +76,10 @@ class DB:
         """Create a connection pool with proper SSL configuration."""
         try:
             print("Creating connection pool")
-            connection_pool = pool.SimpleConnectionPool(
+            connection_pool = InstrumentedConnectionPool(
                 minconn=MIN_CONNECTION,
                 maxconn=MAX_CONNECTION,
+                timeout=POOL_TIMEOUT,
                 host=self.host,
                 port=self.port, 
                 user=self.username,
@@ -70,226 +98,443 @@ class DB:
             logger.critical(f"Error creating connection pool: {e}")
             raise Exception(f"Error creating connection pool: {e}")
 
-    def get_connection_and_cursor(self):
-        """Get a database connection and cursor with retry mechanism."""
-        for attempt in range(1, self.max_retries + 1):
-            try:
-                connection = self.connection_pool.getconn()
+    def init_replica_pools(self):
+        """Create one pool per read replica. A replica that is down is marked unhealthy, not fatal."""
+        for index in range(len(self.replica_dsns)):
+            self.create_replica_pool(index)
 
+    def create_replica_pool(self, index: int):
+        try:
+            self.replica_pools[index] = InstrumentedConnectionPool(
+                minconn=MIN_CONNECTION,
+                maxconn=MAX_CONNECTION,
+                timeout=POOL_TIMEOUT,
+                dsn=self.replica_dsns[index]
+            )
+            self.replica_router.mark_healthy(index)
+        except Exception as e:
+            self.replica_pools[index] = None
+            self.replica_router.mark_failed(index, e)
+
+    def read_your_writes(self):
+        """Context manager: after the first write inside it, reads in the same request go to the primary."""
+        return read_your_writes()
+
+    def get_replica_connection_and_cursor(self):
+        """Check out a connection from a healthy replica, or (None, None) to fall back to the primary."""
+        if not self.replica_dsns or reads_pinned_to_primary():
+            return None, None
+
+        for _ in range(len(self.replica_router)):
+            index = self.replica_router.choose()
+            if index is None:
+                break
+            try:
+                if self.replica_pools[index] is None:
+                    self.create_replica_pool(index)
+                    if self.replica_pools[index] is None:
+                        continue
+                connection = self.replica_pools[index].getconn()
                 if connection.closed != 0:
-                    print(f"Connection status for closed connection: {connection.closed} , Attempt: {attempt}")
-                    logger.warning("Connection closed. Reinitializing connection pool.")
-                    self.init_connection_pool()
-                    connection = self.connection_pool.getconn()
-
-                print(f"Connection status: {connection.closed} , type {type(connection.closed)}, Attempt: {attempt}")
+                    self.replica_pools[index].putconn(connection, close=True)
+                    connection = self.replica_pools[index].getconn()
                 return connection, connection.cursor()
+            except PoolTimeoutError as e:
+                logger.warning(f"Read replica {self.replica_router.replica_names[index]} saturated, using primary: {e}")
+                break
+            except (OperationalError, InterfaceError) as e:
+                self.replica_router.mark_failed(index, e)
+        return None, None
+
+    def _replica_index(self, connection) -> Optional[int]:
+        """Index of the replica pool a checked-out connection belongs to, None for the primary."""
+        if connection is None:
+            return None
+        for index, replica_pool in enumerate(self.replica_pools):
+            if replica_pool is not None and replica_pool.owns(connection):
+                return index
+        return None
+
+    def get_connection_and_cursor(self, read_only: bool = False):
+        """
+        Check out a connection and cursor. `read_only` connections come from a
+        healthy replica when one is configured. Primary checkouts fail fast with
+        CircuitOpenError while the circuit breaker is open; retries are left to
+        the callers' retry policy.
+        """
+        if read_only:
+            connection, cursor = self.get_replica_connection_and_cursor()
+            if connection is not None:
+                return connection, cursor
 
-            except psycopg2.OperationalError as e:
-                logger.error(f"OperationalError: {e}. Retrying {attempt}/{self.max_retries}")
-                time.sleep(self.retry_delay)
-                self.init_connection_pool()  # Reinitialize pool immediately if OperationalError occurs
+        self.circuit_breaker.before_call()
+        try:
+            connection = self.connection_pool.getconn()
+
+            if connection.closed != 0:
+                logger.warning("Connection closed. Discarding it and checking out a fresh one.")
+                self.connection_pool.putconn(connection, close=True)
+                connection = self.connection_pool.getconn()
+
+            return connection, connection.cursor()
+
+        except (OperationalError, InterfaceError) as e:
+            logger.error(f"OperationalError while checking out a connection: {e}")
+            self.circuit_breaker.record_failure()
+            raise
 
+    def reset_connection_pool(self, failed_generation: int):
+        """
+        Replace the primary pool after a connection-level failure, at most once per
+        pool generation: concurrent callers that saw the same broken pool do not
+        each rebuild it. The generation moves on before the rebuild, so a rebuild
+        that fails (primary still down) is not attempted again by the rest of the
+        failure wave. Idle connections of the old pool are closed; checked-out
+        ones are closed when they are returned.
+        """
+        with self._pool_reset_lock:
+            if failed_generation != self.pool_generation:
+                return
+            if self.circuit_breaker.state == CircuitBreaker.OPEN:
+                return
+            self.pool_generation += 1
+            old_pool = self.connection_pool
+            try:
+                self.connection_pool = self.create_connection_pool()
             except Exception as e:
-                logger.critical(f"Unexpected error: {e}")
-                raise Exception(f"Unexpected error: {e}")
+                logger.error(f"Could not recreate connection pool (generation {self.pool_generation}), keeping the old one: {e}")
+                return
+            old_pool.close_idle()
+            logger.warning(f"Connection pool recreated (generation {self.pool_generation})")
+
+    def run_with_retry(self, operation, *args, **kwargs):
+        """Run a single-connection operation under the retry policy, rebuilding the pool once on connection errors."""
+        generation = self.pool_generation
+
+        def on_retry(error, attempt):
+            self.reset_connection_pool(generation)
+
+        return self.retry_policy.call(operation, *args, on_retry=on_retry, **kwargs)
+
+    def checkout_with_retry(self):
+        """Check out a primary connection, retrying connect/checkout failures only."""
+        return self.run_with_retry(self.get_connection_and_cursor)
+
+    def run_write(self, operation, *args, idempotent: bool = False):
+        """
+        Run a writing operation. A statement whose connection failed mid-flight
+        may still have been committed, so only `idempotent` ones (upserts,
+        ON CONFLICT DO NOTHING, ...) are re-run under the retry policy; the
+        others only retry the connection checkout and run exactly once.
+        """
+        if idempotent:
+            return self.run_with_retry(operation, *args, self.get_connection_and_cursor)
+        return operation(*args, self.checkout_with_retry)
+
+    def _record_primary_outcome(self, connection, error: Exception = None):
+        """Feed the result of a statement on a primary connection to the circuit breaker."""
+        if connection is None or self._replica_index(connection) is not None:
+            return
+        if isinstance(error, (OperationalError, InterfaceError)):
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
 
-        raise Exception("Failed to get a database connection after multiple attempts.")
-    
     def close_connection_and_cursor(self, connection, cursor):
-        """Close the cursor and return the connection to the pool."""
-        if cursor:
+        """Close the cursor and return the connection to the pool it came from."""
+        if cursor and not cursor.closed:
             cursor.close()
         if connection and self.connection_pool:
-            print("Inside close_connection_and_cursor and connection is ", connection.closed)
-            if connection.closed == 0: # for preventing error: trying to put unkeyed connection
-                self.connection_pool.putconn(connection)
+            replica_index = self._replica_index(connection)
+            if replica_index is not None:
+                owner_pool = self.replica_pools[replica_index]
+            elif self.connection_pool.owns(connection):
+                owner_pool = self.connection_pool
             else:
-                print(f"Connection already closed in close_connection_and_cursor {connection.closed}")    
+                # Checked out from a pool that has since been replaced.
+                connection.close()
+                return
+            # Always hand the connection back so its slot is released; closed ones are discarded.
+            owner_pool.putconn(connection, close=connection.closed != 0)
+
+    def pool_stats(self):
+        """Return checkout wait time, in-use and exhaustion metrics for the pool."""
+        if not self.connection_pool:
+            return {}
+        return self.connection_pool.stats()
+
+    def invalidate_reference_cache(self, key=None):
+        """Drop cached roles/LLM models after they change. The cache is shared with AsyncDB."""
+        self.reference_cache.invalidate(key)
+
+    def circuit_breaker_stats(self):
+        return {**self.circuit_breaker.stats(), "pool_generation": self.pool_generation}
+
+    def replica_stats(self):
+        """Health, routing counters and pool metrics of each read replica."""
+        stats = self.replica_router.stats()
+        for index, replica in enumerate(stats["replicas"]):
+            replica_pool = self.replica_pools[index]
+            replica["pool"] = replica_pool.stats() if replica_pool else None
+        return stats
 
     def close_pool(self):
         """Close all connections in the pool."""
         if self.connection_pool:
             self.connection_pool.closeall()
             print("Connection pool closed")
+        for replica_pool in self.replica_pools:
+            if replica_pool:
+                replica_pool.closeall()
 
-    def retry_for_operational_error(self, query, data):
-        for attempt in range(self.max_retries):
-            try:
-                print("Inside Operation Method", self.max_retries)
-                time.sleep(1)  # Wait before retrying
-                self.init_connection_pool()
-                connection, cursor = self.get_connection_and_cursor()
-                cursor.execute(query, data if data else ())
-                result = cursor.fetchall()
-                logger.info(f"Data retrieved successfully after retry in retry_for_operational_error method. query: {query}, data: {data}, result: {result}")
-                return result
-            except Exception as e:
-                logger.error(f"Retry attempt {attempt + 1} failed. Error: {e} for query: {query}")
-            finally:
-                self.close_connection_and_cursor(connection, cursor)
-        raise Exception("Retry not working")
-    
-    def retrieve_data(self, query='', data=None):
+    def retrieve_data(self, query='', data=None, use_primary: bool = False):
+        """Run a read query. It is routed to a read replica unless `use_primary` is set."""
+        try:
+            return self.run_with_retry(self._retrieve_data_once, query, data, use_primary)
+        except CircuitOpenError:
+            raise
+        except Exception as error:
+            logger.error(f"Error retrieving data: {error} for query: {query}")
+            raise Exception(f"Error retrieving data: {error} for query: {query}")
+
+    def _retrieve_data_once(self, query, data, use_primary):
         connection, cursor = None, None
         try:
-            connection, cursor = self.get_connection_and_cursor()
+            connection, cursor = self.get_connection_and_cursor(read_only=not use_primary)
             if data:
                 cursor.execute(query, data)
             else:
                 cursor.execute(query)
             result = cursor.fetchall()
-            logger.info(f"Data retrieved successfully in retrieve_data. query: {query}, data: {data}, result: {result}")
+            self._record_primary_outcome(connection)
+            logger.info(f"Data retrieved successfully in retrieve_data. query: {query}, rows: {len(result)}")
+            logger.debug(f"retrieve_data data: {data}, result: {result}")
             return result
-        except (OperationalError, InterfaceError) as e: 
-            print("Operation Error occurred in retrieve_data", e)
-            return self.retry_for_operational_error(query, data)
-        
-        except Exception as error:
-            print("Error occurred in retrieve_data", error)
-            logger.error(f"Error retrieving data: {error} for query: {query}")
-            if connection:
+        except (OperationalError, InterfaceError) as e:
+            replica_index = self._replica_index(connection)
+            if replica_index is not None:
+                self.replica_router.mark_failed(replica_index, e)
+                return self._retrieve_data_once(query, data, use_primary=True)
+            self._record_primary_outcome(connection, e)
+            raise
+        except Exception as e:
+            self._record_primary_outcome(connection, e)
+            if connection and connection.closed == 0:
                 connection.rollback()
-            raise Exception(f"Error retrieving data: {error} for query: {query}")    
+            raise
         finally:
             self.close_connection_and_cursor(connection, cursor)
 
-    def execute_query(self, query, data=None):
+    def stream_data(self, query, data=None, itersize: int = STREAM_ITERSIZE):
+        """
+        Yield rows one by one from a named (server-side) cursor that fetches
+        `itersize` rows per round trip, so large reads never sit fully in memory.
+        The pooled connection is held until the generator is exhausted or closed.
+        """
         connection, cursor = None, None
+        previous_autocommit = None
+        row_count = 0
         try:
-            connection, cursor = self.get_connection_and_cursor() 
+            connection, default_cursor = self.get_connection_and_cursor(read_only=True)
+            default_cursor.close()
+            previous_autocommit = connection.autocommit
+            # Named cursors only live inside a transaction.
+            connection.autocommit = False
+            cursor = connection.cursor(name=f"stream_{uuid.uuid4().hex}")
+            cursor.itersize = itersize
+            cursor.execute(query, data if data else None)
+            for row in cursor:
+                row_count += 1
+                yield row
+            logger.info(f"Data streamed successfully in stream_data. query: {query}, rows: {row_count}")
+        except Exception as error:
+            self._record_primary_outcome(connection, error)
+            logger.error(f"Error streaming data: {error} for query: {query} after {row_count} rows")
+            raise Exception(f"Error streaming data: {error} for query: {query}")
+        finally:
+            if connection and connection.closed == 0:
+                if cursor and not cursor.closed:
+                    cursor.close()
+                connection.rollback()
+                connection.autocommit = previous_autocommit
+            self.close_connection_and_cursor(connection, None)
+
+    def execute_query(self, query, data=None, idempotent: bool = False):
+        """Execute a writing statement. Pass `idempotent=True` if re-running it after a connection error is safe."""
+        try:
+            return self.run_write(self._execute_once, query, data, False, idempotent=idempotent)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            error_message = f"Database query failed: {str(e)}\nQuery: {query}\nParameters: {data}"
+            logger.error(error_message)
+            raise Exception("Database query failed")
+
+    def execute_and_fetch(self, query, data=None, idempotent: bool = False):
+        """Execute a writing statement that RETURNs rows and commit it on the same connection."""
+        try:
+            return self.run_write(self._execute_once, query, data, True, idempotent=idempotent)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Database query failed: {str(e)}\nQuery: {query}\nParameters: {data}")
+            raise Exception(f"Database query failed: {e}")
+
+    def _execute_once(self, query, data, fetch: bool, checkout):
+        connection, cursor = None, None
+        try:
+            connection, cursor = checkout()
             if data:
                 cursor.execute(query, data)
             else:
                 cursor.execute(query)
-            
+            result = cursor.fetchall() if fetch else True
             connection.commit()
+            record_write()
+            self._record_primary_outcome(connection)
             logger.info(f"Query executed successfully. query: {query} , data: {data}")
-            return True
-        
-        except (OperationalError, InterfaceError) as e: 
-            print("Operation Error occurred in retrieve_data", e)
-            return self.retry_execute_query(query, data)
-        
+            return result
         except Exception as e:
-            print("Error executing query:", e)
-            if connection:
+            self._record_primary_outcome(connection, e)
+            if connection and connection.closed == 0:
                 connection.rollback()
-            error_message = f"Database query failed: {str(e)}\nQuery: {query}\nParameters: {data}"
-            logger.error(error_message)
-            raise Exception("Database query failed")
-
+            raise
         finally:
-            self.close_connection_and_cursor(connection, cursor)     
-
-    def retry_execute_query(self, query, data):
-        """Retry executing a query in case of transient errors."""
-        for attempt in range(1, self.max_retries + 1):
-            connection, cursor = None, None
-            try:
-                print(f"Retrying query execution (Attempt {attempt}/{self.max_retries})")
-                time.sleep(1)  # Wait before retrying
-                connection, cursor = self.get_connection_and_cursor()
-
-                cursor.execute(query, data if data else ())
-
-                # Commit only for modification queries
-                if query.strip().lower().startswith(("insert", "update", "delete")):
-                    connection.commit()
-
-                logger.info(f"Query executed successfully after retry. Attempt {attempt}. Query: {query}")
-                return True
-
-            except Exception as e:
-                logger.error(f"Retry attempt {attempt} failed in retry_execute_query. Error: {e} for query: {query}")
-                if connection:
-                    connection.rollback()
-                raise Exception("Query execution failed after multiple retries.")
-
-            finally:
-                self.close_connection_and_cursor(connection, cursor)
+            self.close_connection_and_cursor(connection, cursor)
 
-    def insert_project(self, project_id: str, project_name : str ,  conversation_id: str , user_id : str ):
-        """Insert a new project into the database if it does not already exist."""
+    def create_project_and_conversation(self, project_id: str, project_name: str, conversation_id: str, chat_type: str, user_id: str) -> Dict[str, bool]:
+        """
+        Idempotently create a project and its conversation in a single statement (one round trip).
+        Returns which of the two rows were newly created.
+        """
         try:
-            # Check if project exists
-            check_query = f"""
-                SELECT 1 FROM {self.schema}.projects WHERE project_id = %s
+            query = f"""
+                WITH new_project AS (
+                    INSERT INTO {self.schema}.projects (project_id, project_name, created_by, created_at)
+                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (project_id) DO NOTHING
+                    RETURNING 1
+                ), new_conversation AS (
+                    INSERT INTO {self.schema}.conversation (conversation_id, project_id, user_id, chat_type, created_at)
+                    VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (conversation_id) DO NOTHING
+                    RETURNING 1
+                )
+                SELECT EXISTS (SELECT 1 FROM new_project), EXISTS (SELECT 1 FROM new_conversation)
             """
-            exists = self.retrieve_data(check_query, (project_id,))
-            if exists:
-                logger.info(f"Project already exists: {project_id}")
-                return
+            data = (project_id, project_name, user_id, conversation_id, project_id, user_id, chat_type)
+            result = self.execute_and_fetch(query, data, idempotent=True)
+            created = {"project_created": result[0][0], "conversation_created": result[0][1]}
+            logger.info(f"Project/conversation upserted: {project_id}, {conversation_id}, {created}")
+            return created
+        except Exception as e:
+            logger.error(f"Error creating project and conversation: {e}")
+            raise Exception(f"Error creating project and conversation: {e}")
 
-            # Insert if not exists
+    def insert_project(self, project_id: str, project_name : str ,  conversation_id: str , user_id : str ) -> bool:
+        """Insert a new project if it does not already exist. Returns True if it was created."""
+        try:
             insert_query = f"""
                 INSERT INTO {self.schema}.projects (project_id, project_name, created_by ,created_at )
                 VALUES (%s, %s , %s , CURRENT_TIMESTAMP)
+                ON CONFLICT (project_id) DO NOTHING
+                RETURNING project_id
             """
             data = (project_id, project_name , user_id )
-            self.execute_query(insert_query, data)
-            logger.info(f"Project inserted successfully: {project_id}")
+            created = bool(self.execute_and_fetch(insert_query, data, idempotent=True))
+            logger.info(f"Project {'inserted' if created else 'already exists'}: {project_id}")
+            return created
         except Exception as e:
             logger.error(f"Error inserting project: {e}")
             raise Exception(f"Error inserting project: {e}")
     
-    def insert_conversation(self, conversation_id: str, project_id: str, chat_type: str , user_id: str):
-        """Insert a new conversation into the database if it does not already exist."""
+    def insert_conversation(self, conversation_id: str, project_id: str, chat_type: str , user_id: str) -> bool:
+        """Insert a new conversation if it does not already exist. Returns True if it was created."""
         try:
-            # Check if conversation exists
-            check_query = f"""
-                SELECT 1 FROM {self.schema}.conversation WHERE conversation_id = %s
-            """
-            exists = self.retrieve_data(check_query, (conversation_id,))
-            if exists:
-                logger.info(f"Conversation already exists: {conversation_id}")
-                return
-
-            # Insert if not exists
             insert_query = f"""
                 INSERT INTO {self.schema}.conversation (conversation_id, project_id, user_id ,chat_type, created_at)
                 VALUES (%s, %s, %s,%s, CURRENT_TIMESTAMP)
+                ON CONFLICT (conversation_id) DO NOTHING
+                RETURNING conversation_id
             """
             data = (conversation_id, project_id, user_id ,  chat_type)
-            self.execute_query(insert_query, data)
-            logger.info(f"Conversation inserted successfully: {conversation_id}, {project_id}, {chat_type}")
+            created = bool(self.execute_and_fetch(insert_query, data, idempotent=True))
+            logger.info(f"Conversation {'inserted' if created else 'already exists'}: {conversation_id}, {project_id}, {chat_type}")
+            return created
         except Exception as e:
             logger.error(f"Error inserting conversation: {e}")
             raise Exception(f"Error inserting conversation: {e}")
         
+    def bulk_insert(self, table: str, columns: List[str], rows: List[tuple], template: str = None, page_size: int = BULK_PAGE_SIZE,
+                    idempotent: bool = False) -> int:
+        """
+        Insert any number of rows with `execute_values`, paging the VALUES list
+        by `page_size`, in a single transaction on one pooled connection.
+        Returns the number of rows written.
+        """
+        if not rows:
+            return 0
+        try:
+            return self.run_write(self._bulk_insert_once, table, columns, rows, template, page_size, idempotent=idempotent)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Bulk insert into {table} failed: {e}")
+            raise Exception(f"Bulk insert into {table} failed: {e}")
+
+    def _bulk_insert_once(self, table, columns, rows, template, page_size, checkout):
+        connection, cursor = None, None
+        try:
+            connection, cursor = checkout()
+            query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
+            execute_values(cursor, query, rows, template=template, page_size=page_size)
+            connection.commit()
+            record_write()
+            self._record_primary_outcome(connection)
+            logger.info(f"Bulk inserted {len(rows)} row(s) into {table}")
+            return len(rows)
+        except Exception as e:
+            self._record_primary_outcome(connection, e)
+            if connection and connection.closed == 0:
+                connection.rollback()
+            raise
+        finally:
+            self.close_connection_and_cursor(connection, cursor)
+
     def save_file_attachments(self , conversation_id: str, processed_files: List[Dict[str, Any]]) -> List[str]:
+        """
+        Save file attachments to the database.
+        Returns a list of attachment IDs.
+        """
         try:
-            """
-            Save file attachments to the database.
-            Returns a list of attachment IDs.
-            """
             attachment_ids = []
-            
-            attachment_query =f"""
-                    INSERT INTO {self.schema}.conversation_attachment 
-                    (attachment_id, conversation_id, file_name, file_type, file_size, file_content, created_at, is_deleted) 
-                    VALUES
-                    """
+            rows = []
             for file_info in processed_files:
                 attachment_id = str(uuid.uuid4())
-                
-                # Insert the attachment record
-                attachment_query += """(%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, FALSE),"""
-                
-                attachment_data = (
-                    attachment_id, 
-                    conversation_id, 
+                # Only the hash goes to Postgres; the bytes live once in the blob store.
+                content_hash = file_info.get("content_hash") or self.blob_store.put(file_info["file_content"])
+                rows.append((
+                    attachment_id,
+                    conversation_id,
                     file_info["file_name"],
                     file_info["file_type"],
                     file_info["file_size"],
-                file_info["file_content"]
-                )
+                    content_hash,
+                    *compress_text(file_info.get("file_text")),
+                    file_info.get("token_count"),
+                    Json(file_info.get("section_offsets") or []),
+                    file_info.get("chunk_index_hash"),
+                ))
                 attachment_ids.append(attachment_id)
 
-            attachment_query = attachment_query[:-1]   
-            self.execute_query(attachment_query, attachment_data)
-            
-            
+            self.bulk_insert(
+                table=f"{self.schema}.conversation_attachment",
+                columns=["attachment_id", "conversation_id", "file_name", "file_type", "file_size", "content_hash",
+                         "extracted_text", "extracted_text_zstd", "token_count", "section_offsets", "chunk_index_hash",
+                         "created_at", "is_deleted"],
+                rows=rows,
+                template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, FALSE)"
+            )
             return attachment_ids
         except Exception as e:
             logger.error(f"Error saving file attachments: {e}")
@@ -300,20 +545,46 @@ class DB:
         Read file contents from the database based on provided file IDs.
         Returns a string containing the concatenated file contents.
         """
+        try:
+            return "".join(
+                f"File Name: {file['file_name']}\nContent:\n{file['text']}\n\n"
+                for file in self.read_file_texts(file_ids)
+            )
+        except Exception as e:
+            logger.error(f"Error reading files: {e}")
+            raise Exception(f"Error reading files: {e}")
+
+    def read_file_texts(self, file_ids: List[str]) -> List[Dict[str, Any]]:
+        """
+        Read the text extracted at upload time for the given attachments, with its
+        token count and page/section offsets. Attachments uploaded before text was
+        persisted fall back to their stored content and have no token count.
+        """
         try:
             if not file_ids:
-                return ''
-            
+                return []
+
             query = f"""
-                SELECT file_name , file_content FROM {self.schema}.conversation_attachment 
+                SELECT file_name, extracted_text, extracted_text_zstd, token_count, section_offsets, content_hash, file_content,
+                       chunk_index_hash
+                FROM {self.schema}.conversation_attachment 
                 WHERE attachment_id = ANY(%s) AND is_deleted = FALSE
             """
             result = self.retrieve_data(query, (file_ids,))
-            file_content = ""
-            for file_info in result:
-                file_content += f"File Name: {file_info[0]}\nContent:\n{file_info[1]}\n\n"
-            
-            return file_content
+            files = []
+            for file_name, extracted_text, compressed_text, token_count, sections, content_hash, legacy_content, index_hash in result:
+                extracted_text = decompress_text(extracted_text, compressed_text)
+                if extracted_text is None:
+                    extracted_text = blob_text(self.blob_store, content_hash) if content_hash else (legacy_content or '')
+                    token_count, sections, index_hash = None, [], None
+                files.append({
+                    "file_name": file_name,
+                    "text": extracted_text,
+                    "token_count": token_count,
+                    "sections": sections or [],
+                    "chunk_index_hash": index_hash,
+                })
+            return files
         
         except Exception as e:
             logger.error(f"Error reading files: {e}")
@@ -321,16 +592,38 @@ class DB:
         
 
 
-    def insert_conversation_message(self, conversation_id: str, user_query: str, agent_response: str, model_id: str, model_type: str):
-        """Insert a new conversation message into the database."""
+    def insert_conversation_message(self, conversation_id: str, user_query: str, agent_response: str, model_id: str, model_type: str,
+                                    token_count: Optional[int] = None):
+        """
+        Insert a new conversation message into the database and, in the same
+        statement, make it the project's current SRS in project_srs.
+        """
         try:
             message_id = str(uuid.uuid4())
+            content_hash = hashlib.sha256((agent_response or '').encode("utf-8")).hexdigest()
+            # Large responses are stored zstd-compressed; agent_response is NOT NULL so it is left empty.
+            plain_response, compressed_response = compress_text(agent_response)
             insert_query = f"""
-                INSERT INTO {self.schema}.conversation_message 
-                (message_id , conversation_id, user_query, agent_response, model_id, model_type, created_at) 
-                VALUES (%s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+                WITH message AS (
+                    INSERT INTO {self.schema}.conversation_message
+                    (message_id , conversation_id, user_query, agent_response, agent_response_zstd, model_id, model_type, created_at, search_vector)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, {MESSAGE_SEARCH_VECTOR_SQL})
+                    RETURNING message_id, conversation_id, created_at
+                )
+                INSERT INTO {self.schema}.project_srs (project_id, message_id, content_hash, token_count, updated_at)
+                SELECT c.project_id, message.message_id, %s, %s, message.created_at
+                FROM message
+                JOIN {self.schema}.conversation c ON c.conversation_id = message.conversation_id
+                WHERE c.project_id IS NOT NULL
+                ON CONFLICT (project_id) DO UPDATE SET
+                    message_id = EXCLUDED.message_id,
+                    content_hash = EXCLUDED.content_hash,
+                    token_count = EXCLUDED.token_count,
+                    updated_at = EXCLUDED.updated_at
+                WHERE {self.schema}.project_srs.updated_at <= EXCLUDED.updated_at
             """
-            data = (message_id , conversation_id, user_query, agent_response, model_id, model_type)
+            data = (message_id, conversation_id, user_query, plain_response or '', compressed_response, model_id, model_type,
+                    user_query, agent_response, content_hash, token_count)
             self.execute_query(insert_query, data)
             logger.info(f"Conversation message inserted successfully: {conversation_id}")
         except Exception as e:
@@ -345,17 +638,15 @@ class DB:
                 WHERE is_deleted = FALSE
                 ORDER BY created_at DESC
             """
-            return self.retrieve_data(query=query)
+            return list(self.reference_cache.get_or_load("llm_models", lambda: self.retrieve_data(query=query)))
         except Exception as e:
             logger.error(f"Error retrieving LLM models: {e}")
             raise Exception("Failed to retrieve LLM models.")
     
     def get_role_id_by_name(self, role_name: str):
-        query = """
-            SELECT role_id FROM task_management.roles WHERE role_name = %s
-        """
-        result = self.retrieve_data(query=query, data=(role_name,))
-        return result if result else None
+        # Looked up in the cached roles table, so unknown names add no cache entries.
+        role_ids = [(role_id,) for role_id, name, _ in self.get_role() if name == role_name]
+        return role_ids or None
     
     def check_user_query(self, email: str) -> bool:
         query = """
@@ -386,60 +677,51 @@ class DB:
             SELECT role_id, role_name, description 
             FROM task_management.roles
         """
-        return self.retrieve_data(query=query)
+        return list(self.reference_cache.get_or_load("roles", lambda: self.retrieve_data(query=query)))
 
 
+    def get_project_srs(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Current SRS of a project with its content hash and token count, or None."""
+        try:
+            result = self.retrieve_data(*project_srs_query(self.schema, project_id))
+            if not result:
+                return None
+            message_id, content, compressed_content, content_hash, token_count, updated_at = result[0]
+            return {
+                "message_id": message_id,
+                "content": decompress_text(content, compressed_content),
+                "content_hash": content_hash,
+                "token_count": token_count,
+                "updated_at": updated_at,
+            }
+        except Exception as e:
+            logger.error(f"Error retrieving project SRS: {e}")
+            raise Exception(f"Error retrieving project SRS: {e}")
+
     def get_finalize_srs(self, project_id: str) -> str:
         """Retrieve the final SRS from the conversation messages."""
         try:
-
-            query = f"""
-                SELECT agent_response 
-                FROM {self.schema}.conversation_message cm
-                JOIN {self.schema}.conversation c ON cm.conversation_id = c.conversation_id
-                WHERE c.project_id = %s 
-                Order by cm.created_at DESC LIMIT 1"""
-            
-            result = self.retrieve_data(query, (project_id,))
-            if result:
-                return result[0][0]  # Return the agent response
-            return ""
+            project_srs = self.get_project_srs(project_id)
+            return project_srs["content"] if project_srs else ""
         except Exception as e:
             logger.error(f"Error retrieving final SRS: {e}")
             raise Exception(f"Error retrieving final SRS: {e}")
 
     def insert_task(self, project_id: str, task_data: List[Dict[str, Any]]):
         """
-        Insert multiple tasks into the tasks table using a single query with multiple value sets.
+        Insert multiple tasks into the tasks table in one bulk operation.
         """
         try:
             if not task_data:
                 return []
-                
-            # Start building the query
-            insert_query = f"""
-                INSERT INTO {self.schema}.tasks (
-                    task_id, title, description, project_id, status, priority, complexity,
-                    estimated_hours, created_by, due_date, technical_requirements, acceptance_criteria, 
-                    created_at, updated_at
-                ) VALUES 
-            """
-            
-            # Collect all task IDs and prepare data tuples
+
             task_ids = []
-            all_values = ()
-            
-            # Build the values part of the query and collect all data
+            rows = []
             for task in task_data:
                 # Generate task ID if not provided
                 task_id = task.get("id") or task.get("task_id") or f"TASK-{str(uuid.uuid4())[:8]}"
                 task_ids.append(task_id)
-                
-                # Add value placeholders for this task
-                insert_query += "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP),"
-                
-                # Add actual values to the data tuple
-                task_values = (
+                rows.append((
                     task_id,
                     task.get("task_title") or task.get("title"),
                     task.get("description"),
@@ -452,38 +734,45 @@ class DB:
                     task.get("due_date"),
                     task.get("technical_requirements", ""),
                     task.get("acceptance_criteria", "")
-                )
-                all_values += task_values
-            
-            # Remove the trailing comma
-            insert_query = insert_query[:-1]
-            
-            # Execute the query with all data
-            self.execute_query(insert_query, all_values)
+                ))
+
+            self.bulk_insert(
+                table=f"{self.schema}.tasks",
+                columns=[
+                    "task_id", "title", "description", "project_id", "status", "priority", "complexity",
+                    "estimated_hours", "created_by", "due_date", "technical_requirements", "acceptance_criteria",
+                    "created_at", "updated_at"
+                ],
+                rows=rows,
+                template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+            )
             logger.info(f"{len(task_data)} task(s) inserted successfully.")
-            
+
             return task_ids
-            
+
         except Exception as e:
             logger.error(f"Error inserting tasks: {e}")
             raise Exception(f"Error inserting tasks: {e}")
 
-    def get_user_chat_details(self, user_id: str , project_id : str ) -> List[Dict[str, Any]]:
+    def get_user_chat_details(self, user_id: str , project_id : str, page_size: Optional[int] = None, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
         """
-        Retrieve chat information for a specific user.
-        Returns a list of dictionaries containing chat details.
+        Retrieve chat messages of a user's project.
+        Without `page_size` every message is returned. With it, messages are returned
+        newest first in keyset pages on (created_at, message_id); pass the returned
+        cursor back to fetch the next page. Returns (chat_details, next_cursor).
         """
         try:
-            query = f"""
-                SELECT c.conversation_id, c.project_id, c.chat_type,  TO_CHAR(c.created_at, 'YYYY-MM-DD HH24:MI:SS') AS created_at,
-                       cm.message_id, cm.user_query, cm.agent_response, TO_CHAR(cm.created_at, 'YYYY-MM-DD HH24:MI:SS') AS message_created_at
-                FROM {self.schema}.conversation c
-                JOIN {self.schema}.conversation_message cm ON c.conversation_id = cm.conversation_id
-                WHERE c.user_id = %s and c.project_id = %s
-                ORDER BY c.created_at DESC
-            """
-            result = self.retrieve_data(query, (user_id,project_id))
-            return [
+            if page_size:
+                page_size = clamp_page_size(page_size)
+            query, data = user_chat_details_query(self.schema, user_id, project_id, page_size, cursor)
+            result = self.retrieve_data(query, data)
+
+            next_cursor = None
+            if page_size and len(result) > page_size:
+                result = result[:page_size]
+                next_cursor = encode_cursor(result[-1][8], result[-1][4])
+
+            chat_details = [
                 {
                     "conversation_id": row[0],
                     "project_id": row[1],
@@ -491,33 +780,66 @@ class DB:
                     "created_at": row[3],
                     "message_id": row[4],
                     "user_query": row[5],
-                    "agent_response": row[6],
+                    "agent_response": decompress_text(row[6], row[9]),
                     "message_created_at": row[7]
                 } for row in result
             ]
+            return chat_details, next_cursor
         except Exception as e:
             logger.error(f"Error retrieving user chat info: {e}")
             raise Exception(f"Error retrieving user chat info: {e}")
     
-    def get_user_chat_info(self, user_id: str) -> List[Dict[str, Any]]:
+    def stream_user_chat_details(self, user_id: str, project_id: str):
+        """
+        Stream every message of a user's project, oldest first, as dictionaries
+        without materialising the whole history.
+        """
+        query = f"""
+            SELECT c.conversation_id, c.project_id, c.chat_type, TO_CHAR(c.created_at, 'YYYY-MM-DD HH24:MI:SS') AS created_at,
+                   cm.message_id, cm.user_query, cm.agent_response, TO_CHAR(cm.created_at, 'YYYY-MM-DD HH24:MI:SS') AS message_created_at,
+                   cm.agent_response_zstd
+            FROM {self.schema}.conversation c
+            JOIN {self.schema}.conversation_message cm ON c.conversation_id = cm.conversation_id
+            WHERE c.user_id = %s and c.project_id = %s
+            ORDER BY cm.created_at, cm.message_id
+        """
+        for row in self.stream_data(query, (user_id, project_id)):
+            yield {
+                "conversation_id": row[0],
+                "project_id": row[1],
+                "chat_type": row[2],
+                "created_at": row[3],
+                "message_id": row[4],
+                "user_query": row[5],
+                "agent_response": decompress_text(row[6], row[8]),
+                "message_created_at": row[7]
+            }
+
+    def get_user_chat_info(self, user_id: str, page_size: Optional[int] = None, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
         """
-        Retrieve chat information for a specific user.
-        Returns a list of dictionaries containing chat details.
+        Retrieve the projects owned by a user, newest first.
+        With `page_size` the projects are returned in keyset pages on
+        (created_at, project_id). Returns (chat_info, next_cursor).
         """
         try:
-            query = f"""
-                SELECT project_id , project_name, TO_CHAR(created_at, 'YYYY-MM-DD HH24:MI:SS') AS created_at
-                from {self.schema}.projects
-                WHERE created_by = %s ORDER BY created_at DESC
-            """
-            result = self.retrieve_data(query, (user_id,))
-            return [
+            if page_size:
+                page_size = clamp_page_size(page_size)
+            query, data = user_chat_info_query(self.schema, user_id, page_size, cursor)
+            result = self.retrieve_data(query, data)
+
+            next_cursor = None
+            if page_size and len(result) > page_size:
+                result = result[:page_size]
+                next_cursor = encode_cursor(result[-1][3], result[-1][0])
+
+            chat_info = [
                 {
                     "project_id": row[0],
                     "project_name": row[1],
                     "created_at": row[2]
                 } for row in result
             ]
+            return chat_info, next_cursor
         except Exception as e:
             logger.error(f"Error retrieving user chat info: {e}")
-            raise Exception(f"Error retrieving user chat info: {e}")
\ No newline at end of file
+            raise Exception(f"Error retrieving user chat info: {e}")
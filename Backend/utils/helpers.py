@@ -1,7 +1,7 @@
 import os
 import tempfile
-from utils import logger
-from typing import List, Optional , Dict, Any
+from utils import logger, blob_store
+from typing import List, Optional , Dict, Any, Tuple
 from fastapi import UploadFile
 import fitz  # PyMuPDF
 import pandas as pd
@@ -15,6 +15,8 @@ from langchain_community.document_loaders import (
     UnstructuredPowerPointLoader
 )
 import shutil
+from utils.model_token_manager import number_of_tokens
+from utils.retrieval import build_chunk_index
 
 
 def read_text_file(file_path):
@@ -28,6 +30,37 @@ def combine_docs(docs):
         return "\n".join(str(d) for d in docs)
     return str(docs)
 
+def section_label(doc, index):
+    """Page label from loader metadata, or a running section number."""
+    metadata = getattr(doc, "metadata", None) or {}
+    if "page" in metadata:
+        return f"page {int(metadata['page']) + 1}"
+    if "page_number" in metadata:
+        return f"page {metadata['page_number']}"
+    return f"section {index + 1}"
+
+def combine_docs_with_sections(docs) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Join document pieces with newlines and record the character range of every
+    page/section. Consecutive pieces with the same label are merged.
+    """
+    if not isinstance(docs, list):
+        docs = [docs]
+
+    parts, sections, offset = [], [], 0
+    for index, doc in enumerate(docs):
+        text = doc.page_content if hasattr(doc, "page_content") else str(doc)
+        if parts:
+            offset += 1  # the joining newline
+        start, offset = offset, offset + len(text)
+        label = section_label(doc, index)
+        if sections and sections[-1]["label"] == label:
+            sections[-1]["end"] = offset
+        else:
+            sections.append({"label": label, "start": start, "end": offset})
+        parts.append(text)
+    return "\n".join(parts), sections
+
 def detect_scanned(file_path):
     """Detect if a PDF is scanned (contains mostly images instead of text)."""
     try:
@@ -90,6 +123,10 @@ def fallback_loader(file_path, file_type, extract_images=False):
 
 def get_file_text(file_path="", extract_images=False, file_type=None):
     """Extract text from various document formats."""
+    return extract_file_text(file_path, extract_images, file_type)[0]
+
+def extract_file_text(file_path="", extract_images=False, file_type=None) -> Tuple[str, List[Dict[str, Any]]]:
+    """Extract text from various document formats, with the character offsets of each page/section."""
     try:
         if not file_type:
             file_type = file_path.split(".")[-1].lower()
@@ -101,7 +138,7 @@ def get_file_text(file_path="", extract_images=False, file_type=None):
                 text = extract_text_from_scanned_pdf(file_path)
                 logger.info(f"Detected scanned PDF: {file_path}. Content length: {len(text)}")
                 if text:
-                    return text
+                    return combine_docs_with_sections(text)
                
             docs = PyPDFium2Loader(file_path, extract_images=extract_images).load()
         elif file_type in ["xlsx", "xls"]:
@@ -115,14 +152,14 @@ def get_file_text(file_path="", extract_images=False, file_type=None):
         else:
             raise ValueError(f"Unsupported file type: {file_type}")
         
-        return combine_docs(docs)
+        return combine_docs_with_sections(docs)
     except Exception as primary_error:
         logger.warning(f"Primary loader failed for {file_path}: {primary_error}. Attempting fallback loaders...")
         try:
-            return fallback_loader(file_path, file_type, extract_images)
+            return combine_docs_with_sections(fallback_loader(file_path, file_type, extract_images))
         except Exception as fallback_error:
             logger.error(f"Fallback loader failed for {file_path}: {fallback_error}")
-            return ''
+            return '', []
 
 def process_files_for_storage(files: List[UploadFile]) -> List[Dict[str, Any]]:
     """
@@ -150,24 +187,37 @@ def process_files_for_storage(files: List[UploadFile]) -> List[Dict[str, Any]]:
             # Get the file size
             file_size = os.path.getsize(temp_file_path)
             
-            # Read the file content as binary
+            # Store the bytes once under their SHA-256; identical uploads are deduplicated
             with open(temp_file_path, "rb") as f:
-                file_binary = f.read()
+                content_hash = blob_store.put_stream(f)
             
-            # Get the text content for display
+            # Extract the text once here so prompts never have to re-read or re-tokenise the file
             try:
-                file_text = get_file_text(temp_file_path, extract_images=False, file_type=file_type)
+                file_text, sections = extract_file_text(temp_file_path, extract_images=False, file_type=file_type)
             except Exception as text_error:
                 logger.warning(f"Could not extract text from {file.filename}: {str(text_error)}")
-                file_text = "[Content extraction not supported for this file type]"
+                file_text, sections = "[Content extraction not supported for this file type]", []
+
+            for section in sections:
+                section["token_count"] = number_of_tokens(file_text[section["start"]:section["end"]])
+
+            # BM25 index of the chunks, so prompts can include only the parts relevant to the query
+            try:
+                chunk_index_hash = build_chunk_index(blob_store, file_text, sections)
+            except Exception as index_error:
+                logger.warning(f"Could not index {file.filename}: {str(index_error)}")
+                chunk_index_hash = None
             
             # Add file information to the list
             processed_files.append({
                 "file_name": file.filename,
                 "file_type": file.content_type or f"application/{file_type}",
                 "file_size": file_size,
-                "file_content": file_binary,  # Binary content for storage
-                "file_text": file_text        # Text content for display
+                "content_hash": content_hash,  # Key of the content in the blob store
+                "file_text": file_text,        # Extracted text used in prompts
+                "token_count": number_of_tokens(file_text),
+                "section_offsets": sections,   # [{label, start, end, token_count}]
+                "chunk_index_hash": chunk_index_hash
             })
             
             # Clean up the temporary file
@@ -0,0 +1,293 @@
+"""
+Versioned schema migrations.
+
+Migrations live in Backend/migrations as `<version>_<name>.sql` and are applied
+in version order, each in its own transaction, and recorded in
+task_management.schema_migrations. Every migration must be idempotent.
+
+Usage:
+    python -m utils.migrations upgrade
+    python -m utils.migrations status
+    python -m utils.migrations seed --messages 1000000
+    python -m utils.migrations check-indexes
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import List, Dict, Any, NamedTuple
+from .shared import logger
+from .pagination import clamp_page_size, encode_cursor
+from .read_queries import project_srs_query, user_chat_details_query, user_chat_info_query
+
+MIGRATIONS_DIR = Path(os.getenv("MIGRATIONS_DIR", Path(__file__).resolve().parent.parent / "migrations"))
+MIGRATIONS_TABLE = "task_management.schema_migrations"
+# Arbitrary constant so concurrent workers do not apply migrations twice.
+MIGRATION_LOCK_ID = 725_190_001
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d+)_([\w-]+)\.sql$")
+# Migrations take table locks and run backfills, so they are a deploy step
+# (`python -m utils.migrations upgrade`), not something every worker does at startup.
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "false").lower() == "true"
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: Path
+    checksum: str
+
+
+def discover_migrations(directory: Path = MIGRATIONS_DIR) -> List[Migration]:
+    """Return the migrations found on disk, sorted by version."""
+    migrations = []
+    for path in sorted(Path(directory).glob("*.sql")):
+        match = MIGRATION_FILE_PATTERN.match(path.name)
+        if not match:
+            logger.warning(f"Skipping file with unexpected migration name: {path.name}")
+            continue
+        checksum = hashlib.sha256(path.read_bytes()).hexdigest()
+        migrations.append(Migration(int(match.group(1)), match.group(2), path, checksum))
+
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise Exception(f"Duplicate migration versions in {directory}")
+    return sorted(migrations, key=lambda m: m.version)
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("CREATE SCHEMA IF NOT EXISTS task_management")
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum VARCHAR(64) NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _applied_versions(cursor) -> Dict[int, str]:
+    cursor.execute(f"SELECT version, checksum FROM {MIGRATIONS_TABLE}")
+    return {row[0]: row[1] for row in cursor.fetchall()}
+
+
+def run_migrations(db, directory: Path = MIGRATIONS_DIR) -> List[int]:
+    """
+    Apply all pending migrations. Safe to call from several workers at once:
+    a session-level advisory lock serialises them. Returns the versions applied.
+    """
+    migrations = discover_migrations(directory)
+    connection, cursor = db.get_connection_and_cursor()
+    previous_autocommit = connection.autocommit
+    applied_now = []
+    try:
+        connection.autocommit = True
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            _ensure_migrations_table(cursor)
+            applied = _applied_versions(cursor)
+
+            connection.autocommit = False
+            for migration in migrations:
+                if migration.version in applied:
+                    if applied[migration.version] != migration.checksum:
+                        logger.warning(f"Migration {migration.version}_{migration.name} changed after it was applied")
+                    continue
+
+                logger.info(f"Applying migration {migration.version}_{migration.name}")
+                try:
+                    cursor.execute(migration.path.read_text(encoding="utf-8"))
+                    cursor.execute(
+                        f"INSERT INTO {MIGRATIONS_TABLE} (version, name, checksum) VALUES (%s, %s, %s)",
+                        (migration.version, migration.name, migration.checksum)
+                    )
+                    connection.commit()
+                except Exception as e:
+                    connection.rollback()
+                    logger.critical(f"Migration {migration.version}_{migration.name} failed: {e}")
+                    raise Exception(f"Migration {migration.version}_{migration.name} failed: {e}")
+                applied_now.append(migration.version)
+        finally:
+            connection.autocommit = True
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+    finally:
+        connection.autocommit = previous_autocommit
+        db.close_connection_and_cursor(connection, cursor)
+
+    logger.info(f"Migrations complete. Applied: {applied_now or 'none'}")
+    return applied_now
+
+
+def migration_status(db, directory: Path = MIGRATIONS_DIR) -> List[Dict[str, Any]]:
+    """List every migration on disk with whether (and when) it was applied."""
+    connection, cursor = db.get_connection_and_cursor()
+    try:
+        _ensure_migrations_table(cursor)
+        cursor.execute(f"SELECT version, applied_at FROM {MIGRATIONS_TABLE}")
+        applied = {row[0]: row[1] for row in cursor.fetchall()}
+        connection.commit()
+    finally:
+        db.close_connection_and_cursor(connection, cursor)
+
+    return [
+        {
+            "version": m.version,
+            "name": m.name,
+            "applied": m.version in applied,
+            "applied_at": applied[m.version].isoformat() if m.version in applied else None,
+        }
+        for m in discover_migrations(directory)
+    ]
+
+
+def warn_if_pending(db, directory: Path = MIGRATIONS_DIR) -> List[int]:
+    """Log pending migrations at startup when AUTO_MIGRATE is off. Returns their versions."""
+    try:
+        pending = [m["version"] for m in migration_status(db, directory) if not m["applied"]]
+    except Exception as e:
+        logger.error(f"Could not check for pending migrations: {e}")
+        return []
+    if pending:
+        logger.warning(f"Pending migrations {pending}; run `python -m utils.migrations upgrade`")
+    return pending
+
+
+SEED_HOT_PATH_SQL = """
+    INSERT INTO task_management.users (user_id, username, email, password, role_id)
+    SELECT 'seed-user-' || u, 'seed_user_' || u, 'seed_user_' || u || '@example.com', 'seed', '1'
+    FROM generate_series(1, %(users)s) u
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO task_management.projects (project_id, project_name, created_by, created_at)
+    SELECT 'seed-project-' || p, 'Seed project ' || p, 'seed-user-' || (1 + p %% %(users)s),
+           now() - (p || ' minutes')::interval
+    FROM generate_series(1, %(projects)s) p
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO task_management.conversation (conversation_id, project_id, user_id, chat_type, created_at)
+    SELECT 'seed-conversation-' || c, 'seed-project-' || (1 + c %% %(projects)s),
+           'seed-user-' || (1 + (1 + c %% %(projects)s) %% %(users)s), 'srs_document',
+           now() - (c || ' minutes')::interval
+    FROM generate_series(1, %(conversations)s) c
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO task_management.conversation_message
+        (message_id, conversation_id, user_query, agent_response, model_id, model_type, created_at)
+    SELECT 'seed-message-' || m, 'seed-conversation-' || (1 + m %% %(conversations)s),
+           'Seed query ' || m, repeat('Seed SRS content ', 20), 'gpt-4o', 'openai',
+           now() - (m || ' seconds')::interval
+    FROM generate_series(1, %(messages)s) m
+    ON CONFLICT DO NOTHING;
+
+    ANALYZE task_management.users;
+    ANALYZE task_management.projects;
+    ANALYZE task_management.conversation;
+    ANALYZE task_management.conversation_message;
+"""
+
+
+def seed_hot_path_dataset(db, messages: int = 1_000_000):
+    """Seed synthetic users/projects/conversations/messages (ids prefixed `seed-`) for EXPLAIN checks."""
+    scale = {
+        "messages": messages,
+        "conversations": max(messages // 50, 1),
+        "projects": max(messages // 100, 1),
+        "users": max(messages // 1000, 1),
+    }
+    logger.info(f"Seeding hot path dataset: {scale}")
+    db.execute_query(SEED_HOT_PATH_SQL, scale)
+    return scale
+
+
+def hot_path_queries(schema: str, sample: Dict[str, Any]) -> Dict[str, tuple]:
+    """
+    The read queries whose plans must use indexes, built exactly as DB/AsyncDB
+    build them (utils/read_queries.py): unpaged, first page and keyset page.
+    """
+    page_size = clamp_page_size(None)
+    message_cursor = encode_cursor(sample["message_created_at"], sample["message_id"])
+    project_cursor = encode_cursor(sample["project_created_at"], sample["project_id"])
+    user_id, project_id = sample["user_id"], sample["project_id"]
+    return {
+        "get_finalize_srs": project_srs_query(schema, project_id),
+        "get_user_chat_details": user_chat_details_query(schema, user_id, project_id),
+        "get_user_chat_details (first page)": user_chat_details_query(schema, user_id, project_id, page_size),
+        "get_user_chat_details (next page)": user_chat_details_query(schema, user_id, project_id, page_size, message_cursor),
+        "get_user_chat_info": user_chat_info_query(schema, user_id),
+        "get_user_chat_info (first page)": user_chat_info_query(schema, user_id, page_size),
+        "get_user_chat_info (next page)": user_chat_info_query(schema, user_id, page_size, project_cursor),
+    }
+
+
+HOT_PATH_TABLES = {"projects", "conversation", "conversation_message", "project_srs"}
+
+
+def _seq_scans(plan: Dict[str, Any]) -> List[str]:
+    """Collect the relations that a plan reads with a sequential scan."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in HOT_PATH_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def check_hot_path_indexes(db) -> Dict[str, Any]:
+    """
+    EXPLAIN the hot read paths against a sample project and report whether each
+    one avoids sequential scans on the large tables.
+    """
+    # A keyset cursor from the middle of the sample's messages, as a client paging through them would send.
+    sample = db.retrieve_data(f"""
+        SELECT c.project_id, c.user_id, p.created_at, cm.created_at, cm.message_id
+        FROM {db.schema}.conversation c
+        JOIN {db.schema}.projects p ON p.project_id = c.project_id
+        JOIN {db.schema}.conversation_message cm ON cm.conversation_id = c.conversation_id
+        WHERE c.user_id IS NOT NULL
+        ORDER BY c.conversation_id, cm.created_at
+        LIMIT 1 OFFSET 5
+    """)
+    if not sample:
+        raise Exception("No conversations found; seed the database first.")
+    project_id, user_id, project_created_at, message_created_at, message_id = sample[0]
+    sample = {"project_id": project_id, "user_id": user_id, "project_created_at": project_created_at,
+              "message_created_at": message_created_at, "message_id": message_id}
+
+    report = {}
+    for name, (query, params) in hot_path_queries(db.schema, sample).items():
+        plan = db.retrieve_data(f"EXPLAIN (FORMAT JSON) {query}", params)[0][0]
+        plan = plan if isinstance(plan, list) else json.loads(plan)
+        seq_scans = _seq_scans(plan[0]["Plan"])
+        report[name] = {"uses_index": not seq_scans, "seq_scans": seq_scans}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SprintSeed schema migrations")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("upgrade", help="Apply pending migrations")
+    subparsers.add_parser("status", help="Show applied and pending migrations")
+    seed_parser = subparsers.add_parser("seed", help="Seed a synthetic dataset for EXPLAIN checks")
+    seed_parser.add_argument("--messages", type=int, default=1_000_000)
+    subparsers.add_parser("check-indexes", help="EXPLAIN the hot read paths and verify index usage")
+    args = parser.parse_args()
+
+    from utils import db_obj
+
+    if args.command == "upgrade":
+        print(run_migrations(db_obj))
+    elif args.command == "status":
+        print(json.dumps(migration_status(db_obj), indent=2))
+    elif args.command == "seed":
+        print(seed_hot_path_dataset(db_obj, args.messages))
+    elif args.command == "check-indexes":
+        report = check_hot_path_indexes(db_obj)
+        print(json.dumps(report, indent=2))
+        if not all(entry["uses_index"] for entry in report.values()):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
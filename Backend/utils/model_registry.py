@@ -0,0 +1,235 @@
+"""
+Single source of LLM model metadata.
+
+The registry is loaded from task_management.llm_models at startup and indexed
+by model_name, model_id and model_type, so lookups are dict hits rather than
+queries or list scans. A trigger on llm_models (migration 0010) sends a NOTIFY
+on every change; each worker keeps one connection LISTENing and reloads the
+registry when it fires, so edits show up everywhere without a restart.
+
+STATIC_MODELS is only used until the first successful load, or when the
+database cannot be reached at startup.
+"""
+import os
+import select
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import psycopg2
+from .shared import logger
+from .ttl_cache import reference_data_cache
+
+MODELS_CHANNEL = "llm_models_changed"
+# How often the listener wakes up to check for shutdown.
+LISTEN_POLL_SECONDS = float(os.getenv("MODEL_REGISTRY_POLL_SECONDS", 5))
+LISTEN_RECONNECT_SECONDS = float(os.getenv("MODEL_REGISTRY_RECONNECT_SECONDS", 10))
+# Used for unknown models when no model of the requested type is registered.
+DEFAULT_MODEL_NAME = os.getenv("DEFAULT_MODEL_NAME", "gemini-2.5-flash")
+
+MODEL_COLUMNS = ["model_id", "display_model_name", "model_name", "model_type", "context_window", "max_token",
+                 "location", "is_image_support", "is_deleted", "created_at"]
+
+STATIC_MODELS = [
+    {"model_name": "claude-3-7-sonnet@20250219", "model_type": "anthropic", "max_token": 64000,
+     "context_window": 200000, "location": "europe-west1", "is_image_support": True},
+    {"model_name": "gemini-1.5-pro-001", "model_type": "google_genai", "max_token": 8192,
+     "context_window": 2000000, "location": "us-central1", "is_image_support": True},
+    {"model_name": "gemini-1.5-pro-002", "model_type": "google_genai", "max_token": 8192,
+     "context_window": 2000000, "location": "us-central1", "is_image_support": True},
+    {"model_name": "gemini-1.5-flash-001", "model_type": "google_genai", "max_token": 8192,
+     "context_window": 1000000, "location": "us-central1", "is_image_support": True},
+    {"model_name": "gemini-1.5-flash-002", "model_type": "google_genai", "max_token": 8192,
+     "context_window": 1000000, "location": "us-central1", "is_image_support": True},
+    {"model_name": "gemini-2.0-flash-exp", "model_type": "google_genai", "max_token": 8192,
+     "context_window": 1048576, "location": "us-central1", "is_image_support": True},
+    {"model_name": "gpt-4", "model_type": "openai", "max_token": 8192,
+     "context_window": 8192, "location": "us-central1", "is_image_support": False},
+    {"model_name": "gpt-4o", "model_type": "openai", "max_token": 8192,
+     "context_window": 100000, "location": "us-central1", "is_image_support": True},
+    {"model_name": "gpt-4-turbo", "model_type": "openai", "max_token": 8192,
+     "context_window": 100000, "location": "us-central1", "is_image_support": True},
+    {"model_name": "claude-3-5-sonnet@20240620", "model_type": "anthropic", "max_token": 4096,
+     "context_window": 200000, "location": "europe-west1", "is_image_support": True},
+    {"model_name": "claude-3-5-sonnet-v2@20241022", "model_type": "anthropic", "max_token": 4096,
+     "context_window": 200000, "location": "us-central1", "is_image_support": True},
+    {"model_name": "gemini-2.0-flash-thinking-exp", "model_type": "google_genai", "max_token": 64000,
+     "context_window": 1000000, "location": "us-central1", "is_image_support": True},
+    {"model_name": "gemini-2.5-pro", "model_type": "google_genai", "max_token": 64000,
+     "context_window": 1000000, "location": "us-central1", "is_image_support": True},
+    {"model_name": "gemini-2.5-flash", "model_type": "google_genai", "max_token": 64000,
+     "context_window": 1000000, "location": "us-central1", "is_image_support": True},
+]
+
+
+def is_valid(config: Dict[str, Any]) -> bool:
+    return all([
+        config.get("context_window"),
+        config.get("max_token"),
+        config.get("model_name"),
+        config.get("model_type"),
+        config.get("location"),
+        config.get("is_image_support") is not None
+    ])
+
+
+class ModelRegistry:
+
+    def __init__(self, models: Optional[List[Dict[str, Any]]] = None):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listener: Optional[threading.Thread] = None
+        self._models: List[Dict[str, Any]] = []
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_type: Dict[str, List[Dict[str, Any]]] = {}
+        self.source = "static"
+        self.version = 0
+        self.loaded_at = None
+        self.reloads = 0
+        self.unknown_lookups = 0
+        self.replace(models or STATIC_MODELS, source="static")
+
+    def replace(self, models: List[Dict[str, Any]], source: str):
+        """Swap in a new model list. Each index is replaced whole, so lookups never see a partial list."""
+        valid = [m for m in models if is_valid(m)]
+        for model in models:
+            if not is_valid(model):
+                logger.warning(f"Skipping incomplete model definition: {model.get('model_name')}")
+        by_type: Dict[str, List[Dict[str, Any]]] = {}
+        for model in valid:
+            by_type.setdefault(model["model_type"], []).append(model)
+        with self._lock:
+            self._models = valid
+            self._by_name = {m["model_name"]: m for m in valid}
+            self._by_id = {str(m["model_id"]): m for m in valid if m.get("model_id") is not None}
+            self._by_type = by_type
+            self.source = source
+            self.version += 1
+            self.loaded_at = datetime.now(timezone.utc)
+
+    def load(self, db) -> bool:
+        """(Re)load from llm_models. On failure the current models are kept."""
+        try:
+            rows = db.retrieve_data(f"""
+                SELECT {", ".join(MODEL_COLUMNS)}
+                FROM task_management.llm_models
+                WHERE is_deleted = FALSE
+                ORDER BY created_at DESC
+            """, use_primary=True)
+            models = [dict(zip(MODEL_COLUMNS, row)) for row in rows]
+            if not any(is_valid(m) for m in models):
+                logger.warning(f"llm_models has no usable models, keeping {self.source} models")
+                return False
+            self.replace(models, source="database")
+            reference_data_cache.invalidate("llm_models")
+            logger.info(f"Model registry loaded {len(self._models)} model(s) (version {self.version})")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading model registry, keeping {self.source} models: {e}")
+            return False
+
+    def all(self) -> List[Dict[str, Any]]:
+        return list(self._models)
+
+    def get(self, name_or_id) -> Optional[Dict[str, Any]]:
+        """Model by model_name, else by model_id."""
+        if name_or_id is None:
+            return None
+        return self._by_name.get(name_or_id) or self._by_id.get(str(name_or_id))
+
+    def by_type(self, model_type: str) -> List[Dict[str, Any]]:
+        return list(self._by_type.get(model_type, []))
+
+    def resolve(self, name_or_id=None, model_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Model for `name_or_id`. Unknown models fall back, with a warning, to the
+        first model of `model_type`, then to DEFAULT_MODEL_NAME, then to any model.
+        """
+        model = self.get(name_or_id)
+        if model is not None:
+            return model
+        same_type = self.by_type(model_type) if model_type else []
+        fallback = same_type[0] if same_type else self._by_name.get(DEFAULT_MODEL_NAME)
+        if fallback is None and self._models:
+            fallback = self._models[0]
+        if fallback is None:
+            raise Exception("No LLM models are registered")
+        self.unknown_lookups += 1
+        logger.warning(f"Unknown model {name_or_id!r} (type {model_type!r}), using {fallback['model_name']}")
+        return fallback
+
+    def start_listener(self, db):
+        """
+        Load the models and reload whenever llm_models changes. LISTEN is issued
+        before the first load, so no change can slip in between; the connection
+        is then handed to a daemon thread. If it cannot connect, the models are
+        still loaded and the thread keeps reconnecting.
+        """
+        if self._listener and self._listener.is_alive():
+            return
+        self._stop.clear()
+        connection = None
+        try:
+            connection = self._connect_listener(db)
+        except Exception as e:
+            logger.error(f"Model registry listener could not connect, retrying in {LISTEN_RECONNECT_SECONDS}s: {e}")
+        self.load(db)
+        self._listener = threading.Thread(target=self._listen, args=(db, connection), name="model-registry-listener",
+                                          daemon=True)
+        self._listener.start()
+
+    def stop_listener(self):
+        self._stop.set()
+        if self._listener:
+            self._listener.join(timeout=LISTEN_POLL_SECONDS + 1)
+
+    @staticmethod
+    def _connect_listener(db):
+        connection = psycopg2.connect(host=db.host, port=db.port, user=db.username, password=db.password)
+        try:
+            connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            connection.cursor().execute(f"LISTEN {MODELS_CHANNEL}")
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def _listen(self, db, connection=None):
+        """`connection` is already LISTENing and the models loaded after it; otherwise connect first."""
+        while not self._stop.is_set():
+            try:
+                if connection is None:
+                    connection = self._connect_listener(db)
+                    # Changes made while the listener was down were never notified.
+                    self.load(db)
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                        continue
+                    connection.poll()
+                    if connection.notifies:
+                        connection.notifies.clear()
+                        self.reloads += 1
+                        self.load(db)
+            except Exception as e:
+                logger.error(f"Model registry listener failed, reconnecting in {LISTEN_RECONNECT_SECONDS}s: {e}")
+                if connection is not None:
+                    connection.close()
+                    connection = None
+                self._stop.wait(LISTEN_RECONNECT_SECONDS)
+        if connection is not None:
+            connection.close()
+
+    def stats(self):
+        return {
+            "source": self.source,
+            "version": self.version,
+            "models": len(self._models),
+            "types": {model_type: len(models) for model_type, models in self._by_type.items()},
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "listening": bool(self._listener and self._listener.is_alive()),
+            "reloads": self.reloads,
+            "unknown_lookups": self.unknown_lookups,
+        }
+
+
+model_registry = ModelRegistry()
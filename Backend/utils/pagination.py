@@ -0,0 +1,31 @@
+import base64
+import json
+import os
+from datetime import datetime
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 50))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 200))
+
+
+def clamp_page_size(page_size: Optional[int]) -> int:
+    """Bound a client supplied page size to [1, MAX_PAGE_SIZE]."""
+    if not page_size:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(int(page_size), MAX_PAGE_SIZE))
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    """Encode the keyset position (created_at, id) of the last row on a page as an opaque token."""
+    payload = json.dumps({"t": created_at.isoformat(), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a token produced by `encode_cursor`. Raises ValueError for malformed tokens."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(payload["t"]), str(payload["id"])
+    except Exception as e:
+        raise ValueError(f"Invalid pagination cursor: {e}")
@@ -0,0 +1,161 @@
+"""
+Token-budgeted prompt assembly.
+
+A prompt is described as typed segments (system prompt, user query, file text,
+chat history, ...) with priorities. Every segment is encoded at most once, and
+the assembler packs them into an exact token budget: required segments first,
+then the others by priority, truncating the first one that does not fit and
+dropping the rest. Segments are emitted in the order they were given.
+
+Counts are in the target model family's tokens (utils/tokenizers.py). Texts
+without a known count are encoded exactly unless the fast estimate's lower
+bound already puts them over the remaining budget, so every packed segment is
+counted with its real token count, never an estimate.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from utils.model_token_manager import get_valid_llm_config, number_of_tokens, pack_file_texts, truncate_by_sections
+from utils.tokenizers import Tokenizer, get_tokenizer
+
+SEGMENT_SEPARATOR = "\n"
+
+
+class PromptBudgetError(Exception):
+    pass
+
+
+@dataclass
+class PromptSegment:
+    name: str
+    text: str = ""
+    # Lower numbers are packed first. Required segments are always packed whole.
+    priority: int = 0
+    required: bool = False
+    truncatable: bool = True
+    # Which end to keep when truncating: "head" (documents) or "tail" (history).
+    keep: str = "head"
+    # Wrapper around the text, e.g. "<CHAT_HISTORY> {text}</CHAT_HISTORY>".
+    template: str = "{text}"
+    # cl100k token count of `text` when already known (e.g. persisted at upload time).
+    token_count: Optional[int] = None
+    # Page/section offsets with token counts, used to truncate on boundaries.
+    sections: List[Dict[str, Any]] = field(default_factory=list)
+    # Attachments from DB.read_file_texts; rendered instead of `text` when set.
+    files: Optional[List[Dict[str, Any]]] = None
+
+    def is_empty(self) -> bool:
+        return not (self.files or self.text)
+
+
+@dataclass
+class AssembledPrompt:
+    prompt: str
+    token_count: int
+    budget: int
+    segments: Dict[str, Dict[str, Any]]
+
+
+class PromptAssembler:
+
+    def __init__(self, token_budget: int, tokenizer: Optional[Tokenizer] = None):
+        self.token_budget = token_budget
+        self.tokenizer = tokenizer or get_tokenizer("openai")
+
+    def _content_tokens(self, segment: PromptSegment, token_budget: int):
+        """
+        Rendered content and token count of the whole segment, without its
+        template. The count is exact whenever it is within `token_budget`; above
+        it, it may be the tokenizer's lower bound, which is only used to reject.
+        """
+        if segment.files is not None:
+            text, base_tokens = pack_file_texts(segment.files, float("inf"))
+            return text, self.tokenizer.from_base(base_tokens)
+        if segment.token_count is not None:
+            return segment.text, self.tokenizer.from_base(segment.token_count)
+        return segment.text, self.tokenizer.measure(segment.text, token_budget)
+
+    def _truncate(self, segment: PromptSegment, token_budget: int):
+        if segment.files is not None:
+            text, base_tokens = pack_file_texts(segment.files, self.tokenizer.to_base(token_budget))
+            return text, self.tokenizer.from_base(base_tokens)
+        if segment.keep == "tail":
+            text = self.tokenizer.truncate(segment.text, token_budget, keep="tail")
+            return text, self.tokenizer.count(text)
+        text, base_tokens = truncate_by_sections(segment.text, segment.sections, self.tokenizer.to_base(token_budget))
+        return text, self.tokenizer.from_base(base_tokens)
+
+    def assemble(self, segments: List[PromptSegment]) -> AssembledPrompt:
+        segments = [s for s in segments if not s.is_empty()]
+        overheads = [self.tokenizer.count(s.template.format(text="")) + len(SEGMENT_SEPARATOR) for s in segments]
+        rendered: Dict[int, str] = {}
+        report: Dict[str, Dict[str, Any]] = {}
+        used = 0
+
+        order = sorted(range(len(segments)), key=lambda i: (not segments[i].required, segments[i].priority))
+        for index in order:
+            segment = segments[index]
+            remaining = self.token_budget - used - overheads[index]
+            content, tokens = self._content_tokens(segment, remaining)
+
+            if tokens <= remaining:
+                status = "included"
+            elif segment.required:
+                raise PromptBudgetError(
+                    f"Required segment {segment.name} needs {tokens + overheads[index]} tokens, "
+                    f"only {self.token_budget - used} left"
+                )
+            elif segment.truncatable and remaining > 0:
+                original_tokens = tokens
+                content, tokens = self._truncate(segment, remaining)
+                status = f"truncated from {original_tokens}"
+            else:
+                report[segment.name] = {"status": "dropped", "tokens": 0}
+                continue
+
+            if not content:
+                report[segment.name] = {"status": "dropped", "tokens": 0}
+                continue
+            rendered[index] = segment.template.format(text=content)
+            used += tokens + overheads[index]
+            report[segment.name] = {"status": status, "tokens": tokens + overheads[index]}
+
+        prompt = SEGMENT_SEPARATOR.join(rendered[i] for i in sorted(rendered))
+        return AssembledPrompt(prompt=prompt, token_count=used, budget=self.token_budget, segments=report)
+
+
+def prompt_budget_for_model(model_config: Dict[str, Any]) -> int:
+    """Context window minus the output reservation (max_token, at most half the window)."""
+    context_size = model_config["context_window"]
+    return context_size - min(model_config["max_token"], context_size // 2)
+
+
+def file_budget_for_model(model_id: str, reserved_texts: List[str], llm_config=None,
+                          model_type: Optional[str] = None) -> int:
+    """Base (cl100k) tokens left for attachments once `reserved_texts` are in the prompt of `model_id`."""
+    model_config = get_valid_llm_config(llm_config, model_id, model_type)
+    tokenizer = get_tokenizer(model_config["model_type"])
+    return tokenizer.to_base(prompt_budget_for_model(model_config)) - sum(number_of_tokens(t) for t in reserved_texts)
+
+
+def assemble_prompt_for_model(model_name: str, segments: List[PromptSegment], llm_config=None,
+                              model_type: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Pack `segments` for `model_name` and return the prompt together with the model
+    settings. An unknown `model_name` falls back to a registered model of `model_type`.
+    """
+    model_config = get_valid_llm_config(llm_config, model_name, model_type)
+    context_size = model_config["context_window"]
+    tokenizer = get_tokenizer(model_config["model_type"])
+    assembled = PromptAssembler(prompt_budget_for_model(model_config), tokenizer).assemble(segments)
+    remaining_tokens = context_size - assembled.token_count
+
+    return {
+        "prompt": assembled.prompt.strip(),
+        "prompt_tokens": assembled.token_count,
+        "segments": assembled.segments,
+        "remaining_tokens": remaining_tokens,
+        "required_token": min(model_config["max_token"], remaining_tokens),
+        "model_name": model_config.get("model_name"),
+        "model_type": model_config.get("model_type"),
+        "location": model_config.get("location"),
+    }
@@ -0,0 +1,71 @@
+"""
+SQL of the hot read paths, shared by DB, AsyncDB and
+`python -m utils.migrations check-indexes`, so the plans checked there are the
+ones the endpoints run. Each builder returns (query, params).
+"""
+from typing import Optional, Tuple
+from .pagination import decode_cursor
+
+
+def project_srs_query(schema: str, project_id: str) -> Tuple[str, tuple]:
+    query = f"""
+        SELECT ps.message_id, cm.agent_response, cm.agent_response_zstd, ps.content_hash, ps.token_count, ps.updated_at
+        FROM {schema}.project_srs ps
+        JOIN {schema}.conversation_message cm ON cm.message_id = ps.message_id
+        WHERE ps.project_id = %s"""
+    return query, (project_id,)
+
+
+def user_chat_details_query(schema: str, user_id: str, project_id: str, page_size: Optional[int] = None,
+                            cursor: Optional[str] = None) -> Tuple[str, tuple]:
+    """
+    Messages of a user's project. Without `page_size` (already clamped) every
+    message is selected; with it, one row more than the page, newest first,
+    after the keyset `cursor`.
+    """
+    data = [user_id, project_id]
+    keyset_filter = ""
+    order_by = "c.created_at DESC"
+    limit = ""
+    if page_size:
+        order_by = "cm.created_at DESC, cm.message_id DESC"
+        limit = "LIMIT %s"
+        if cursor:
+            keyset_filter = "AND (cm.created_at, cm.message_id) < (%s, %s)"
+            data.extend(decode_cursor(cursor))
+        data.append(page_size + 1)
+
+    query = f"""
+        SELECT c.conversation_id, c.project_id, c.chat_type,  TO_CHAR(c.created_at, 'YYYY-MM-DD HH24:MI:SS') AS created_at,
+               cm.message_id, cm.user_query, cm.agent_response, TO_CHAR(cm.created_at, 'YYYY-MM-DD HH24:MI:SS') AS message_created_at,
+               cm.created_at, cm.agent_response_zstd
+        FROM {schema}.conversation c
+        JOIN {schema}.conversation_message cm ON c.conversation_id = cm.conversation_id
+        WHERE c.user_id = %s and c.project_id = %s {keyset_filter}
+        ORDER BY {order_by}
+        {limit}
+    """
+    return query, tuple(data)
+
+
+def user_chat_info_query(schema: str, user_id: str, page_size: Optional[int] = None,
+                         cursor: Optional[str] = None) -> Tuple[str, tuple]:
+    """Projects owned by a user, newest first; paged like user_chat_details_query."""
+    data = [user_id]
+    keyset_filter = ""
+    limit = ""
+    if page_size:
+        limit = "LIMIT %s"
+        if cursor:
+            keyset_filter = "AND (created_at, project_id) < (%s, %s)"
+            data.extend(decode_cursor(cursor))
+        data.append(page_size + 1)
+
+    query = f"""
+        SELECT project_id , project_name, TO_CHAR(created_at, 'YYYY-MM-DD HH24:MI:SS') AS created_at, created_at
+        from {schema}.projects
+        WHERE created_by = %s {keyset_filter}
+        ORDER BY projects.created_at DESC, projects.project_id DESC
+        {limit}
+    """
+    return query, tuple(data)
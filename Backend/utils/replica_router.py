@@ -0,0 +1,106 @@
+import contextvars
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+from .shared import logger
+
+# Set by `read_your_writes()`; while set, the first write pins later reads to the primary.
+_read_your_writes = contextvars.ContextVar("read_your_writes", default=False)
+_primary_pinned = contextvars.ContextVar("primary_pinned", default=False)
+
+
+@contextmanager
+def read_your_writes():
+    """
+    Opt-in read-your-writes scope for the current request/task. Reads go to
+    replicas until the first write inside the scope; after that every read in
+    the scope is served by the primary so it observes its own writes.
+    """
+    mode_token = _read_your_writes.set(True)
+    pin_token = _primary_pinned.set(False)
+    try:
+        yield
+    finally:
+        _primary_pinned.reset(pin_token)
+        _read_your_writes.reset(mode_token)
+
+
+def record_write():
+    """Called by the DB layer after every write."""
+    if _read_your_writes.get():
+        _primary_pinned.set(True)
+
+
+def reads_pinned_to_primary() -> bool:
+    return _primary_pinned.get()
+
+
+def dsn_label(dsn: str) -> str:
+    """host:port of a libpq DSN or URI, without credentials, for logs and stats."""
+    if "://" in dsn:
+        netloc = dsn.split("://", 1)[1].split("/", 1)[0]
+        return netloc.rsplit("@", 1)[-1]
+    parts = dict(part.split("=", 1) for part in dsn.split() if "=" in part)
+    return f"{parts.get('host', 'localhost')}:{parts.get('port', '5432')}"
+
+
+class ReplicaRouter:
+    """
+    Round-robin selection over read replicas with passive health checks:
+    a replica that fails is skipped for `cooldown` seconds and then tried again.
+    """
+
+    def __init__(self, replica_names: List[str], cooldown: float = 30.0):
+        self.replica_names = replica_names
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._unhealthy_until = [0.0] * len(replica_names)
+        self._failures = [0] * len(replica_names)
+        self._reads = [0] * len(replica_names)
+        self._primary_fallbacks = 0
+        self._round_robin = itertools.cycle(range(len(replica_names)))
+
+    def __len__(self):
+        return len(self.replica_names)
+
+    def choose(self) -> Optional[int]:
+        """Index of the next healthy replica, or None when reads must fall back to the primary."""
+        if not self.replica_names:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.replica_names)):
+                index = next(self._round_robin)
+                if self._unhealthy_until[index] <= now:
+                    self._reads[index] += 1
+                    return index
+            self._primary_fallbacks += 1
+            return None
+
+    def mark_failed(self, index: int, error: Exception = None):
+        with self._lock:
+            self._failures[index] += 1
+            self._unhealthy_until[index] = time.monotonic() + self.cooldown
+        logger.warning(f"Read replica {self.replica_names[index]} marked unhealthy for {self.cooldown}s: {error}")
+
+    def mark_healthy(self, index: int):
+        with self._lock:
+            self._unhealthy_until[index] = 0.0
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "primary_fallbacks": self._primary_fallbacks,
+                "replicas": [
+                    {
+                        "replica": name,
+                        "healthy": self._unhealthy_until[i] <= now,
+                        "reads": self._reads[i],
+                        "failures": self._failures[i],
+                    }
+                    for i, name in enumerate(self.replica_names)
+                ],
+            }
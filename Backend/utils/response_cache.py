@@ -0,0 +1,175 @@
+"""
+Exact-match cache for JSON LLM responses (email summaries, task plans) in Redis.
+
+The key is a hash of the rendered prompt, model id, temperature and an
+optional scope (e.g. the project), so any change to the SRS document, the
+instructions or the model settings is a miss.
+Entries expire after RESPONSE_CACHE_TTL; responses larger than
+RESPONSE_CACHE_MAX_BYTES are not stored, and beyond RESPONSE_CACHE_MAX_ENTRIES
+the oldest entries are dropped. Concurrent misses for the same key are
+coalesced: one caller holds a SET NX lock and calls the LLM, the others wait
+for its result. Redis being unavailable only disables the cache.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Optional
+import redis
+from . import redis_url
+from .shared import logger
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 24 * 3600))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 256 * 1024))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+# Longest a caller computes under the lock; waiters give up and compute themselves after it.
+RESPONSE_CACHE_LOCK_SECONDS = int(os.getenv("RESPONSE_CACHE_LOCK_SECONDS", 120))
+RESPONSE_CACHE_POLL_SECONDS = 0.2
+RESPONSE_CACHE_SOCKET_TIMEOUT = float(os.getenv("RESPONSE_CACHE_SOCKET_TIMEOUT", 2))
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+
+# Deletes the lock only if it still holds our token; a lock that expired during a
+# slow compute may already belong to another worker.
+RELEASE_LOCK_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def wants_cache_bypass(headers) -> bool:
+    """True when the request carries X-Cache-Bypass: 1/true/yes."""
+    return (headers.get(CACHE_BYPASS_HEADER) or "").strip().lower() in ("1", "true", "yes")
+
+
+class ResponseCache:
+
+    def __init__(self, url: Optional[str], prefix: str = "sprint_speed:llm_response", ttl: int = RESPONSE_CACHE_TTL,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.url = url
+        self.prefix = prefix
+        self.index_key = f"{prefix}:index"
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.enabled = enabled and bool(url)
+        self._client = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._bypassed = 0
+        self._errors = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            # An unreachable Redis must fail fast; the model is called directly instead.
+            self._client = redis.Redis.from_url(self.url, socket_timeout=RESPONSE_CACHE_SOCKET_TIMEOUT,
+                                                socket_connect_timeout=RESPONSE_CACHE_SOCKET_TIMEOUT)
+        return self._client
+
+    def make_key(self, prompt: str, model_id: str, temperature, scope: Optional[str] = None) -> str:
+        material = json.dumps([prompt, model_id, temperature, scope], ensure_ascii=False)
+        return f"{self.prefix}:{hashlib.sha256(material.encode('utf-8')).hexdigest()}"
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _read(self, key: str):
+        raw = self.client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    def _store(self, key: str, value: Any):
+        payload = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        if len(payload) > self.max_bytes:
+            logger.warning(f"Not caching {len(payload)} byte response, over RESPONSE_CACHE_MAX_BYTES")
+            return
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(key, payload, ex=self.ttl)
+        pipe.zadd(self.index_key, {key: time.time()})
+        pipe.zcard(self.index_key)
+        entries = pipe.execute()[-1]
+        if entries > self.max_entries:
+            oldest = [member for member, _ in self.client.zpopmin(self.index_key, entries - self.max_entries)]
+            if oldest:
+                self.client.delete(*oldest)
+
+    def get_or_compute(self, prompt: str, model_id: str, temperature, compute: Callable[[], Any],
+                       bypass: bool = False, cacheable: Optional[Callable[[Any], bool]] = None,
+                       scope: Optional[str] = None) -> Any:
+        """
+        Cached response for (prompt, model_id, temperature, scope), else
+        `compute()`. `bypass` skips the lookup but stores the fresh response;
+        `cacheable` rejects responses that should not be reused (e.g. unparsed
+        output); `scope` keeps entries of e.g. one project apart from the rest.
+        """
+        if not self.enabled:
+            return compute()
+        key = self.make_key(prompt, model_id, temperature, scope)
+        lock_key = f"{key}:lock"
+        lock_token = uuid.uuid4().hex
+        holds_lock = False
+        try:
+            if bypass:
+                self._count("_bypassed")
+            else:
+                cached = self._read(key)
+                if cached is not None:
+                    self._count("_hits")
+                    return cached
+                self._count("_misses")
+            holds_lock = bool(self.client.set(lock_key, lock_token, nx=True, ex=RESPONSE_CACHE_LOCK_SECONDS))
+            if not holds_lock and not bypass:
+                deadline = time.monotonic() + RESPONSE_CACHE_LOCK_SECONDS
+                while time.monotonic() < deadline and self.client.exists(lock_key):
+                    time.sleep(RESPONSE_CACHE_POLL_SECONDS)
+                cached = self._read(key)
+                if cached is not None:
+                    self._count("_coalesced")
+                    return cached
+        except Exception as e:
+            self._count("_errors")
+            logger.error(f"Response cache lookup failed, calling the model directly: {e}")
+            return compute()
+
+        try:
+            value = compute()
+            if value is not None and (cacheable is None or cacheable(value)):
+                try:
+                    self._store(key, value)
+                except Exception as e:
+                    self._count("_errors")
+                    logger.error(f"Failed to store cached response: {e}")
+            return value
+        finally:
+            if holds_lock:
+                try:
+                    self.client.eval(RELEASE_LOCK_SCRIPT, 1, lock_key, lock_token)
+                except Exception as e:
+                    logger.error(f"Failed to release response cache lock: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "enabled": self.enabled,
+                "ttl_seconds": self.ttl,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "bypassed": self._bypassed,
+                "errors": self._errors,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else None,
+            }
+
+
+response_cache = ResponseCache(redis_url)
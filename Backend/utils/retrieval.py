@@ -0,0 +1,319 @@
+"""
+Lexical (BM25) retrieval over attachment chunks.
+
+At upload time every attachment's extracted text is split into chunks of about
+RETRIEVAL_CHUNK_TOKENS tokens on page/section boundaries, and a term-frequency
+matrix of the chunks (CSR arrays: indptr, indices, data) is saved with NumPy in
+the blob store; conversation_attachment.chunk_index_hash points at it. At prompt
+time the indexes of the requested attachments are scored together against the
+user query. The best-scoring chunks are taken first and the rest of the
+model's token budget is filled with the remaining chunks in document order, so
+narrowing never drops more than the budget requires. Chunks are emitted in
+document order. Nothing leaves the process: no embeddings, no network.
+
+Usage:
+    python -m utils.retrieval build-indexes
+"""
+import argparse
+import io
+import math
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from .shared import logger
+from .ttl_cache import TTLCache
+from .model_token_manager import number_of_tokens
+
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "true").lower() == "true"
+RETRIEVAL_CHUNK_TOKENS = int(os.getenv("RETRIEVAL_CHUNK_TOKENS", 400))
+BM25_K1 = 1.2
+BM25_B = 0.75
+INDEX_FORMAT_VERSION = 1
+# A cl100k token is at least this many characters in practice; used to size chunks without encoding.
+MIN_CHARS_PER_TOKEN = 3
+
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having he her here
+hers him his how i if in into is it its itself just me more most my no nor not now of off on once only or
+other our ours out over own please same she should so some such than that the their theirs them then there
+these they this those through to too under until up very was we were what when where which while who whom
+why will with would you your yours
+""".split())
+
+chunk_index_cache = TTLCache(
+    maxsize=int(os.getenv("CHUNK_INDEX_CACHE_SIZE", 256)),
+    ttl=float(os.getenv("CHUNK_INDEX_CACHE_TTL", 3600)),
+    name="chunk_indexes",
+)
+
+
+def tokenize_terms(text: str) -> List[str]:
+    return [t for t in re.findall(r"\w+", text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _split_by_chars(text: str, max_chars: int, offset: int = 0) -> List[Tuple[int, int]]:
+    """(start, end) spans of at most `max_chars`, cut on paragraph, then line boundaries."""
+    pieces, start = [], 0
+    for paragraph in re.split(r"(?<=\n\n)", text):
+        end = start + len(paragraph)
+        while end - start > max_chars:
+            cut = text.rfind("\n", start, start + max_chars)
+            cut = cut if cut > start else start + max_chars
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+        start = end
+
+    spans, current = [], None
+    for start, end in pieces:
+        if current and end - current[0] > max_chars:
+            spans.append(current)
+            current = None
+        current = (current[0] if current else start, end)
+    if current and text[current[0]:current[1]].strip():
+        spans.append(current)
+    return [(offset + start, offset + end) for start, end in spans]
+
+
+def split_into_chunks(text: str, sections: List[Dict[str, Any]], chunk_tokens: int) -> List[Dict[str, Any]]:
+    """
+    Split `text` into [{label, start, end}] chunks of about `chunk_tokens` tokens.
+    Whole pages/sections are grouped using the token counts stored at upload
+    time; text not covered by them, and sections larger than a chunk, are split
+    by size.
+    """
+    max_chars = chunk_tokens * MIN_CHARS_PER_TOKEN
+    chunks, group, group_tokens, covered = [], [], 0, 0
+
+    def flush():
+        if group:
+            label = group[0]["label"] if len(group) == 1 else f"{group[0]['label']} - {group[-1]['label']}"
+            chunks.append({"label": label, "start": group[0]["start"], "end": group[-1]["end"]})
+
+    for section in sections:
+        tokens = section.get("token_count")
+        if tokens is None:
+            break
+        if tokens > chunk_tokens:
+            flush()
+            group, group_tokens = [], 0
+            spans = _split_by_chars(text[section["start"]:section["end"]], max_chars, section["start"])
+            for i, (start, end) in enumerate(spans, 1):
+                chunks.append({"label": f"{section['label']} part {i}", "start": start, "end": end})
+        elif group_tokens + tokens > chunk_tokens:
+            flush()
+            group, group_tokens = [section], tokens
+        else:
+            group.append(section)
+            group_tokens += tokens
+        covered = section["end"]
+    flush()
+
+    for start, end in _split_by_chars(text[covered:], max_chars, covered):
+        chunks.append({"label": f"Part {len(chunks) + 1}", "start": start, "end": end})
+    return chunks
+
+
+class ChunkIndex:
+    """Term frequencies of one attachment's chunks as CSR arrays."""
+
+    def __init__(self, vocabulary, indptr, indices, data, chunk_starts, chunk_ends, chunk_tokens, labels):
+        self.vocabulary = vocabulary
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.chunk_starts = chunk_starts
+        self.chunk_ends = chunk_ends
+        self.chunk_tokens = chunk_tokens
+        self.labels = labels
+        self.term_ids = {term: i for i, term in enumerate(vocabulary.tolist())}
+        self.rows = np.repeat(np.arange(len(labels)), np.diff(indptr))
+        self.chunk_lengths = np.bincount(self.rows, weights=data, minlength=len(labels)).astype(np.float32)
+
+    @classmethod
+    def build(cls, text: str, sections: List[Dict[str, Any]], chunk_tokens: int = RETRIEVAL_CHUNK_TOKENS) -> "ChunkIndex":
+        chunks = split_into_chunks(text, sections, chunk_tokens)
+        term_ids: Dict[str, int] = {}
+        indptr, indices, data = [0], [], []
+        for chunk in chunks:
+            counts: Dict[int, int] = {}
+            for term in tokenize_terms(text[chunk["start"]:chunk["end"]]):
+                term_id = term_ids.setdefault(term, len(term_ids))
+                counts[term_id] = counts.get(term_id, 0) + 1
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        return cls(
+            vocabulary=np.array(list(term_ids), dtype=str),
+            indptr=np.array(indptr, dtype=np.int64),
+            indices=np.array(indices, dtype=np.int32),
+            data=np.array(data, dtype=np.float32),
+            chunk_starts=np.array([c["start"] for c in chunks], dtype=np.int64),
+            chunk_ends=np.array([c["end"] for c in chunks], dtype=np.int64),
+            chunk_tokens=np.array([number_of_tokens(text[c["start"]:c["end"]]) for c in chunks], dtype=np.int32),
+            labels=np.array([c["label"] for c in chunks], dtype=str),
+        )
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer, version=np.array(INDEX_FORMAT_VERSION), vocabulary=self.vocabulary, indptr=self.indptr,
+            indices=self.indices, data=self.data, chunk_starts=self.chunk_starts, chunk_ends=self.chunk_ends,
+            chunk_tokens=self.chunk_tokens, labels=self.labels,
+        )
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, payload: bytes) -> "ChunkIndex":
+        with np.load(io.BytesIO(payload), allow_pickle=False) as arrays:
+            if int(arrays["version"]) != INDEX_FORMAT_VERSION:
+                raise Exception(f"Unsupported chunk index version {int(arrays['version'])}")
+            return cls(**{name: arrays[name] for name in arrays.files if name != "version"})
+
+    def term_document_frequencies(self, query_ids: np.ndarray) -> np.ndarray:
+        return np.bincount(self.indices, minlength=len(self.vocabulary))[query_ids] if len(query_ids) else np.zeros(0)
+
+    def bm25_scores(self, term_weights: Dict[str, float], average_length: float) -> np.ndarray:
+        """BM25 score of every chunk; `term_weights` maps query terms to their idf."""
+        weights = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for term, idf in term_weights.items():
+            term_id = self.term_ids.get(term)
+            if term_id is not None:
+                weights[term_id] = idf
+        mask = weights[self.indices] > 0
+        rows, tf = self.rows[mask], self.data[mask]
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.chunk_lengths[rows] / max(average_length, 1e-9))
+        contributions = weights[self.indices[mask]] * tf * (BM25_K1 + 1) / (tf + norm)
+        return np.bincount(rows, weights=contributions, minlength=len(self.labels))
+
+
+def build_chunk_index(store, text: str, sections: List[Dict[str, Any]]) -> Optional[str]:
+    """Build and store the chunk index of an attachment's text. Returns its blob hash."""
+    if not text:
+        return None
+    return store.put(ChunkIndex.build(text, sections).to_bytes())
+
+
+def load_chunk_index(store, index_hash: str) -> ChunkIndex:
+    # Blobs are content-addressed, so a cached index can never be stale.
+    return chunk_index_cache.get_or_load(index_hash, lambda: ChunkIndex.from_bytes(store.get(index_hash)))
+
+
+def select_relevant_chunks(store, files: List[Dict[str, Any]], query: str,
+                           token_budget: int) -> List[Dict[str, Any]]:
+    """
+    Narrow attachments from DB.read_file_texts to `token_budget` tokens in total
+    (the model's prompt budget for files): chunks relevant to `query` first,
+    then the others in document order. Files are returned as is when they
+    already fit, when retrieval is disabled or when nothing matches the query;
+    attachments without an index are always passed through whole.
+    """
+    indexed = [f for f in files if f.get("chunk_index_hash")]
+    total = sum(f.get("token_count") or 0 for f in files)
+    query_terms = set(tokenize_terms(query or ""))
+    if not RETRIEVAL_ENABLED or not indexed or not query_terms or total <= token_budget:
+        return files
+
+    try:
+        indexes = [load_chunk_index(store, f["chunk_index_hash"]) for f in indexed]
+    except Exception as e:
+        logger.warning(f"Could not load chunk indexes, using whole files: {e}")
+        return files
+
+    # Collection statistics over the chunks of every requested attachment.
+    chunk_count = sum(len(index.labels) for index in indexes)
+    average_length = sum(float(index.chunk_lengths.sum()) for index in indexes) / max(chunk_count, 1)
+    document_frequency = dict.fromkeys(query_terms, 0)
+    for index in indexes:
+        ids = [(term, index.term_ids[term]) for term in query_terms if term in index.term_ids]
+        frequencies = index.term_document_frequencies(np.array([i for _, i in ids], dtype=np.int64))
+        for (term, _), frequency in zip(ids, frequencies):
+            document_frequency[term] += int(frequency)
+    term_weights = {
+        term: math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+        for term, df in document_frequency.items() if df
+    }
+    if not term_weights:
+        return files
+
+    candidates = []
+    for file_index, index in enumerate(indexes):
+        scores = index.bm25_scores(term_weights, average_length)
+        candidates.extend((-float(score), file_index, chunk) for chunk, score in enumerate(scores) if score > 0)
+    candidates.sort()
+    # Whatever budget the matches leave is filled with the other chunks in document order.
+    matched = {(file_index, chunk) for _, file_index, chunk in candidates}
+    candidates.extend(
+        (0.0, file_index, chunk)
+        for file_index, index in enumerate(indexes) for chunk in range(len(index.labels))
+        if (file_index, chunk) not in matched
+    )
+
+    unindexed = [f for f in files if not f.get("chunk_index_hash")]
+    remaining = token_budget - sum(f.get("token_count") or 0 for f in unindexed)
+    chosen: Dict[int, List[int]] = {}
+    for _, file_index, chunk in candidates:
+        tokens = int(indexes[file_index].chunk_tokens[chunk]) + 8  # label line
+        if tokens <= remaining:
+            chosen.setdefault(file_index, []).append(chunk)
+            remaining -= tokens
+
+    selected = list(unindexed)
+    for file_index, chunks in sorted(chosen.items()):
+        file, index = indexed[file_index], indexes[file_index]
+        text, sections = "", []
+        for chunk in sorted(chunks):
+            part = f"[{index.labels[chunk]}]\n{file['text'][index.chunk_starts[chunk]:index.chunk_ends[chunk]]}\n\n"
+            sections.append({"label": str(index.labels[chunk]), "start": len(text), "end": len(text) + len(part),
+                             "token_count": number_of_tokens(part)})
+            text += part
+        selected.append({**file, "text": text, "sections": sections,
+                         "token_count": sum(s["token_count"] for s in sections)})
+    logger.info(
+        f"Selected {sum(len(c) for c in chosen.values())} of {chunk_count} chunk(s) "
+        f"({len(matched)} matching the query): "
+        f"{sum(f['token_count'] or 0 for f in selected)} of {total} tokens"
+    )
+    return selected
+
+
+def build_missing_indexes(db, store, batch_size: int = 100) -> int:
+    """Index attachments uploaded before chunk indexes existed."""
+    built, last_id = 0, ""
+    while True:
+        rows = db.retrieve_data("""
+            SELECT attachment_id FROM task_management.conversation_attachment
+            WHERE chunk_index_hash IS NULL AND token_count IS NOT NULL AND is_deleted = FALSE AND attachment_id > %s
+            ORDER BY attachment_id LIMIT %s
+        """, (last_id, batch_size), use_primary=True)
+        if not rows:
+            break
+        for (attachment_id,) in rows:
+            file = db.read_file_texts([attachment_id])[0]
+            index_hash = build_chunk_index(store, file["text"], file["sections"])
+            if index_hash:
+                db.execute_query("""
+                    UPDATE task_management.conversation_attachment SET chunk_index_hash = %s WHERE attachment_id = %s
+                """, (index_hash, attachment_id), idempotent=True)
+                built += 1
+        last_id = rows[-1][0]
+    logger.info(f"Built {built} chunk index(es)")
+    return built
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SprintSeed attachment retrieval")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build-indexes", help="Index attachments uploaded before chunk indexes existed")
+    args = parser.parse_args()
+
+    from utils import db_obj, blob_store
+
+    if args.command == "build-indexes":
+        print(build_missing_indexes(db_obj, blob_store))
+
+
+if __name__ == "__main__":
+    main()
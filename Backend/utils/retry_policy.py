@@ -0,0 +1,169 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Callable, Optional, Tuple, Type
+from .shared import logger
+
+
+class CircuitOpenError(Exception):
+    """Raised without touching the database while the circuit breaker is open."""
+    status_code = 503
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker.
+
+    After `failure_threshold` consecutive failures the breaker opens and every
+    call fails fast for `reset_timeout` seconds. Then a single trial call is let
+    through (half-open): success closes the breaker, failure re-opens it.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0, name: str = "database"):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._rejected = 0
+        self._times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not reach the database."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            # A trial whose outcome was never recorded must not wedge the breaker.
+            trial_expired = time.monotonic() - self._trial_started >= self.reset_timeout
+            if state == self.HALF_OPEN and (not self._trial_in_flight or trial_expired):
+                self._trial_in_flight = True
+                self._trial_started = time.monotonic()
+                return
+            self._rejected += 1
+        raise CircuitOpenError(f"Circuit breaker for {self.name} is open; failing fast")
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit breaker for {self.name} closed")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    self._times_opened += 1
+                    logger.error(f"Circuit breaker for {self.name} opened after {self._consecutive_failures} consecutive failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._consecutive_failures,
+                "times_opened": self._times_opened,
+                "rejected_calls": self._rejected,
+            }
+
+
+class RetryPolicy:
+    """
+    Retry with exponential backoff and full jitter: retry number n (1-based) sleeps
+    a random time in [0, min(max_delay, base_delay * 2**(n-1))]. `CircuitOpenError`
+    and `no_retry_on` (subclasses of `retry_on` that must fail at once) are never
+    retried.
+    """
+
+    def __init__(self,
+                 max_attempts: int = 3,
+                 base_delay: float = 0.1,
+                 max_delay: float = 2.0,
+                 retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+                 no_retry_on: Tuple[Type[BaseException], ...] = ()):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.no_retry_on = no_retry_on
+
+    def backoff(self, attempt: int) -> float:
+        """Jittered delay before retry number `attempt` (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        return attempt < self.max_attempts and isinstance(error, self.retry_on) \
+            and not isinstance(error, (CircuitOpenError, *self.no_retry_on))
+
+    def call(self, func: Callable, *args, on_retry: Optional[Callable] = None, **kwargs):
+        """Run `func` synchronously under the policy. `on_retry(error, attempt)` runs before each retry."""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                logger.warning(f"Attempt {attempt}/{self.max_attempts} failed: {e}. Retrying")
+                if on_retry:
+                    on_retry(e, attempt)
+                time.sleep(self.backoff(attempt))
+
+    async def acall(self, func: Callable, *args, on_retry: Optional[Callable] = None, **kwargs):
+        """Async variant of `call`; awaits `func` and backs off with asyncio.sleep."""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                logger.warning(f"Attempt {attempt}/{self.max_attempts} failed: {e}. Retrying")
+                if on_retry:
+                    result = on_retry(e, attempt)
+                    if asyncio.iscoroutine(result):
+                        await result
+                await asyncio.sleep(self.backoff(attempt))
+
+
+def default_db_retry_policy(retry_on: Tuple[Type[BaseException], ...],
+                            no_retry_on: Tuple[Type[BaseException], ...] = ()) -> RetryPolicy:
+    return RetryPolicy(
+        max_attempts=int(os.getenv("DB_RETRY_ATTEMPTS", 3)),
+        base_delay=float(os.getenv("DB_RETRY_BASE_DELAY", 0.1)),
+        max_delay=float(os.getenv("DB_RETRY_MAX_DELAY", 2.0)),
+        retry_on=retry_on,
+        no_retry_on=no_retry_on,
+    )
+
+
+def default_db_circuit_breaker(name: str = "database") -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_threshold=int(os.getenv("DB_BREAKER_FAILURE_THRESHOLD", 5)),
+        reset_timeout=float(os.getenv("DB_BREAKER_RESET_TIMEOUT", 10)),
+        name=name,
+    )
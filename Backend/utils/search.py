@@ -0,0 +1,123 @@
+"""
+Postgres full-text search over SRS documents (conversation_message) and tasks.
+
+tasks.search_vector is a generated column. conversation_message.search_vector
+is written by insert_conversation_message from the plaintext response, since
+compressed responses (see utils/compression.py) cannot feed a generated column.
+
+Usage:
+    python -m utils.search reindex   # after upgrading past migration 0008
+"""
+import argparse
+import re
+from typing import List
+from .shared import logger
+from .compression import decompress_text
+
+SEARCH_CONFIG = "english"
+MAX_SEARCH_RESULTS = 50
+HEADLINE_MAX_FRAGMENTS = 2
+HEADLINE_MAX_WORDS = 30
+HEADLINE_DELIMITER = " ... "
+HEADLINE_OPTIONS = (f'MaxFragments={HEADLINE_MAX_FRAGMENTS}, MinWords=8, MaxWords={HEADLINE_MAX_WORDS}, '
+                    f'FragmentDelimiter="{HEADLINE_DELIMITER}", StartSel=<mark>, StopSel=</mark>')
+TSQUERY_LEXEME = re.compile(r"'((?:[^']|'')*)'")
+
+# tsvector for a message: the SRS text weighs more than the query that produced it.
+# Parameters: (user_query, agent_response)
+MESSAGE_SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(%s, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(%s, '')), 'A')"
+)
+
+
+def query_lexemes(tsquery_text: str) -> List[str]:
+    """Lexemes of a tsquery in its text form, e.g. "'requir' & 'secur'"."""
+    return [match.replace("''", "'") for match in TSQUERY_LEXEME.findall(tsquery_text or "")]
+
+
+def _matches(word: str, lexemes: List[str]) -> bool:
+    token = re.sub(r"\W", "", word.lower())
+    # Stems are prefixes of their words, except the Porter y -> i ending ("happi" for "happy").
+    return bool(token) and any(token.startswith(lexeme) or (lexeme.endswith("i") and token.startswith(lexeme[:-1]))
+                               for lexeme in lexemes)
+
+
+def headline(text: str, lexemes: List[str]) -> str:
+    """
+    Snippet like ts_headline with HEADLINE_OPTIONS, for compressed responses
+    Postgres cannot read: up to HEADLINE_MAX_FRAGMENTS windows of
+    HEADLINE_MAX_WORDS words around words matching `lexemes`, matches marked.
+    """
+    words = (text or "").split()
+    fragments, covered = [], -1
+    for index, word in enumerate(words):
+        if index <= covered or not _matches(word, lexemes):
+            continue
+        start = max(0, index - HEADLINE_MAX_WORDS // 3)
+        end = min(len(words), start + HEADLINE_MAX_WORDS)
+        fragments.append(" ".join(f"<mark>{w}</mark>" if _matches(w, lexemes) else w for w in words[start:end]))
+        covered = end - 1
+        if len(fragments) == HEADLINE_MAX_FRAGMENTS:
+            break
+    return HEADLINE_DELIMITER.join(fragments) if fragments else " ".join(words[:HEADLINE_MAX_WORDS])
+
+
+def reindex_search_vectors(db, batch_size: int = 500) -> int:
+    """
+    Fill search_vector for messages that have none (rows written before migration
+    0008), `batch_size` at a time. Plain responses are indexed by one UPDATE per
+    batch; compressed ones are decompressed here and updated one by one.
+    """
+    indexed, last_id = 0, ""
+    while True:
+        rows = db.retrieve_data(f"""
+            SELECT message_id, agent_response_zstd IS NOT NULL
+            FROM {db.schema}.conversation_message
+            WHERE search_vector IS NULL AND message_id > %s
+            ORDER BY message_id LIMIT %s
+        """, (last_id, batch_size), use_primary=True)
+        if not rows:
+            break
+        plain_ids = [message_id for message_id, compressed in rows if not compressed]
+        if plain_ids:
+            db.execute_query(f"""
+                UPDATE {db.schema}.conversation_message
+                SET search_vector =
+                    setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(user_query, '')), 'B') ||
+                    setweight(to_tsvector('{SEARCH_CONFIG}', COALESCE(agent_response, '')), 'A')
+                WHERE message_id = ANY(%s) AND search_vector IS NULL
+            """, (plain_ids,), idempotent=True)
+        compressed_ids = [message_id for message_id, compressed in rows if compressed]
+        if compressed_ids:
+            compressed_rows = db.retrieve_data(f"""
+                SELECT message_id, user_query, agent_response, agent_response_zstd
+                FROM {db.schema}.conversation_message
+                WHERE message_id = ANY(%s)
+            """, (compressed_ids,), use_primary=True)
+            for message_id, user_query, agent_response, compressed_response in compressed_rows:
+                db.execute_query(f"""
+                    UPDATE {db.schema}.conversation_message
+                    SET search_vector = {MESSAGE_SEARCH_VECTOR_SQL}
+                    WHERE message_id = %s
+                """, (user_query, decompress_text(agent_response, compressed_response), message_id), idempotent=True)
+        indexed += len(rows)
+        last_id = rows[-1][0]
+        logger.info(f"Indexed {indexed} message(s) for search")
+    return indexed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SprintSeed full-text search")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("reindex", help="Build search vectors for messages that have none")
+    args = parser.parse_args()
+
+    from utils import db_obj
+
+    if args.command == "reindex":
+        print(reindex_search_vectors(db_obj))
+
+
+if __name__ == "__main__":
+    main()
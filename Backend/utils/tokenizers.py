@@ -0,0 +1,283 @@
+"""
+Per-model-family token counting for prompt budgets.
+
+OpenAI models count with cl100k_base (tiktoken). Gemini shares the Gemma
+SentencePiece vocabulary and counts natively when `sentencepiece` is installed
+and GEMINI_TOKENIZER_MODEL points to its tokenizer.model. Anthropic has not
+published the Claude 3 tokenizer, so Anthropic models (and Gemini without the
+vocabulary) count with cl100k and scale by the family's `base_ratio`, its
+tokens per cl100k token as measured by `calibrate`. Token counts persisted at
+upload time are cl100k counts and are converted with `from_base`.
+
+Each tokenizer also has a fast estimate: lower/upper token bounds from the
+UTF-8 byte length, using the bytes-per-token range measured on the bundled
+corpus (calibration_corpus/). The corpus is prose; dense text (JSON, code,
+numbers, base64) has far fewer bytes per token, so only the lower bound is
+safe to act on. With TOKENIZER_MODE=fast (the default) budget checks reject a
+text without encoding it when even its lower bound is over the remaining
+budget, and count it exactly otherwise.
+
+Usage:
+    python -m utils.tokenizers calibrate --gemini-tokenizer tokenizer.model --anthropic-tokenizer tokenizer.json
+    python -m utils.tokenizers show
+"""
+import argparse
+import json
+import math
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from .shared import logger
+from .model_token_manager import number_of_tokens, truncate_to_last_tokens, truncate_to_tokens
+
+try:
+    import sentencepiece
+except ImportError:  # pragma: no cover - optional dependency
+    sentencepiece = None
+
+try:
+    import tokenizers as hf_tokenizers
+except ImportError:  # pragma: no cover - optional dependency
+    hf_tokenizers = None
+
+TOKENIZER_MODE = os.getenv("TOKENIZER_MODE", "fast").lower()
+CALIBRATION_FILE = Path(os.getenv("TOKENIZER_CALIBRATION_FILE", Path(__file__).resolve().parent / "tokenizer_calibration.json"))
+CALIBRATION_CORPUS_DIR = Path(__file__).resolve().parent.parent / "calibration_corpus"
+# Extra slack on the calibrated bytes-per-token range, for text unlike the corpus.
+ESTIMATE_MARGIN = float(os.getenv("TOKEN_ESTIMATE_MARGIN", 0.10))
+# Shorter texts are cheap to encode (and usually cached); estimating them is not worth it.
+ESTIMATE_MIN_CHARS = int(os.getenv("TOKEN_ESTIMATE_MIN_CHARS", 8192))
+# Gemma/Gemini SentencePiece model (tokenizer.model from the Gemma release).
+GEMINI_TOKENIZER_MODEL = os.getenv("GEMINI_TOKENIZER_MODEL", "")
+# Only used by `calibrate`: the Claude tokenizer.json older anthropic SDKs shipped (pre-Claude 3), the closest
+# local stand-in for Anthropic's current tokenizer.
+ANTHROPIC_TOKENIZER_FILE = os.getenv("ANTHROPIC_TOKENIZER_FILE", "")
+
+
+def load_calibration(path: Path = CALIBRATION_FILE) -> Dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Tokenizer(ABC):
+    """Token counting, truncation and estimation for one model family."""
+
+    def __init__(self, model_type: str, calibration: Dict, mode: str = TOKENIZER_MODE):
+        families = calibration["families"]
+        family = families.get(model_type, families["default"])
+        self.model_type = model_type
+        self.mode = mode
+        self.base_ratio = family["base_ratio"]
+        bytes_per_token = calibration["bytes_per_token"]
+        # Bytes per token of this family; a higher base_ratio means shorter tokens.
+        self.min_bytes_per_token = bytes_per_token["min"] / self.base_ratio / (1 + ESTIMATE_MARGIN)
+        self.max_bytes_per_token = bytes_per_token["max"] / self.base_ratio * (1 + ESTIMATE_MARGIN)
+
+    @classmethod
+    def available(cls) -> bool:
+        """False when the tokenizer's library or vocabulary is missing; get_tokenizer then falls back to tiktoken."""
+        return True
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        ...
+
+    @abstractmethod
+    def truncate(self, text: str, max_tokens: int, keep: str = "head") -> str:
+        ...
+
+    def from_base(self, base_tokens: int) -> int:
+        """Convert a cl100k token count (as persisted at upload time) to this family's tokens."""
+        return math.ceil(base_tokens * self.base_ratio)
+
+    def to_base(self, tokens: int) -> int:
+        """Largest cl100k budget that cannot exceed `tokens` of this family."""
+        return math.floor(tokens / self.base_ratio)
+
+    def estimate_bounds(self, text: str) -> Tuple[int, int]:
+        size = len(text.encode("utf-8", errors="surrogatepass"))
+        return math.floor(size / self.max_bytes_per_token), math.ceil(size / self.min_bytes_per_token)
+
+    def measure(self, text: str, token_budget: int) -> int:
+        """
+        Token count of `text` for comparing against `token_budget`: exact
+        whenever it can fit. In fast mode a text whose lower bound is already
+        over the budget is not encoded and the (over-budget) lower bound is
+        returned instead.
+        """
+        if self.mode == "fast" and len(text) >= ESTIMATE_MIN_CHARS:
+            low, _ = self.estimate_bounds(text)
+            if low > token_budget:
+                return low
+        return self.count(text)
+
+
+class TiktokenTokenizer(Tokenizer):
+    """Exact counts with tiktoken, scaled by `base_ratio` for families without a local tokenizer."""
+
+    def count(self, text: str) -> int:
+        return self.from_base(number_of_tokens(text))
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "head") -> str:
+        if keep == "tail":
+            return truncate_to_last_tokens(text, self.to_base(max_tokens))
+        return truncate_to_tokens(text, self.to_base(max_tokens))
+
+
+class SentencePieceTokenizer(Tokenizer):
+    """Native Gemini counts with the Gemma SentencePiece vocabulary."""
+
+    _processor = None
+
+    @classmethod
+    def available(cls) -> bool:
+        return sentencepiece is not None and os.path.isfile(GEMINI_TOKENIZER_MODEL)
+
+    @classmethod
+    def processor(cls):
+        if cls._processor is None:
+            cls._processor = sentencepiece.SentencePieceProcessor(model_file=GEMINI_TOKENIZER_MODEL)
+        return cls._processor
+
+    def count(self, text: str) -> int:
+        return len(self.processor().encode(text))
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "head") -> str:
+        if max_tokens <= 0:
+            return ""
+        ids = self.processor().encode(text)
+        if len(ids) <= max_tokens:
+            return text
+        return self.processor().decode(ids[-max_tokens:] if keep == "tail" else ids[:max_tokens])
+
+
+# model_type -> Tokenizer class. Register a class here to plug in a native tokenizer.
+TOKENIZER_CLASSES = {
+    "openai": TiktokenTokenizer,
+    "anthropic": TiktokenTokenizer,
+    "google_genai": SentencePieceTokenizer,
+}
+
+_calibration = load_calibration()
+_tokenizers: Dict[str, Tokenizer] = {}
+
+
+def register_tokenizer(model_type: str, tokenizer_class):
+    TOKENIZER_CLASSES[model_type] = tokenizer_class
+    _tokenizers.pop(model_type, None)
+
+
+def get_tokenizer(model_type: str) -> Tokenizer:
+    tokenizer = _tokenizers.get(model_type)
+    if tokenizer is None:
+        tokenizer_class = TOKENIZER_CLASSES.get(model_type, TiktokenTokenizer)
+        if not tokenizer_class.available():
+            tokenizer_class = TiktokenTokenizer
+        tokenizer = _tokenizers[model_type] = tokenizer_class(model_type, _calibration)
+    return tokenizer
+
+
+def family_counters(gemini_tokenizer: Optional[str] = GEMINI_TOKENIZER_MODEL,
+                    anthropic_tokenizer: Optional[str] = ANTHROPIC_TOKENIZER_FILE) -> Dict[str, Callable[[str], int]]:
+    """Token counters for every family whose tokenizer is available locally."""
+    counters = {"openai": number_of_tokens}
+    if gemini_tokenizer and sentencepiece is not None:
+        processor = sentencepiece.SentencePieceProcessor(model_file=str(gemini_tokenizer))
+        counters["google_genai"] = lambda text: len(processor.encode(text))
+    if anthropic_tokenizer and hf_tokenizers is not None:
+        claude = hf_tokenizers.Tokenizer.from_file(str(anthropic_tokenizer))
+        counters["anthropic"] = lambda text: len(claude.encode(text, add_special_tokens=False).ids)
+    return counters
+
+
+def calibrate(corpus_dir: Path = CALIBRATION_CORPUS_DIR, path: Path = CALIBRATION_FILE,
+              counters: Optional[Dict[str, Callable[[str], int]]] = None) -> Dict:
+    """
+    Measure cl100k bytes per token, and each family's tokens per cl100k token,
+    on every file of the corpus and write them to the calibration file.
+
+    A family's base_ratio is its highest per-file ratio, so budgets converted
+    from cl100k counts stay on the safe side. Families without a local
+    tokenizer, and "default", get the highest measured ratio of any family.
+    """
+    counters = counters if counters is not None else family_counters()
+    files = sorted(p for p in Path(corpus_dir).iterdir() if p.is_file())
+    if not files:
+        raise Exception(f"No calibration files in {corpus_dir}")
+    per_file, total_bytes, total_tokens = {}, 0, 0
+    family_totals = dict.fromkeys(counters, 0)
+    for file in files:
+        text = file.read_text(encoding="utf-8")
+        size, tokens = len(text.encode("utf-8")), number_of_tokens(text)
+        stats = {"bytes": size, "tokens": tokens, "bytes_per_token": round(size / tokens, 3), "families": {}}
+        for model_type, count in counters.items():
+            family_tokens = count(text)
+            family_totals[model_type] += family_tokens
+            stats["families"][model_type] = {"tokens": family_tokens, "ratio": round(family_tokens / tokens, 3)}
+        per_file[file.name] = stats
+        total_bytes += size
+        total_tokens += tokens
+
+    calibration = load_calibration(path)
+    ratios = [stats["bytes_per_token"] for stats in per_file.values()]
+    calibration["bytes_per_token"] = {
+        "mean": round(total_bytes / total_tokens, 3),
+        "min": min(ratios),
+        "max": max(ratios),
+    }
+    calibration["files"] = per_file
+
+    families = {}
+    for model_type in counters:
+        file_ratios = [stats["families"][model_type]["ratio"] for stats in per_file.values()]
+        families[model_type] = {
+            "base_ratio": max(file_ratios),
+            "mean_ratio": round(family_totals[model_type] / total_tokens, 3),
+            "source": "measured",
+        }
+    fallback = max(family["base_ratio"] for family in families.values())
+    for model_type in set(calibration["families"]) - set(families):
+        families[model_type] = {
+            "base_ratio": fallback,
+            "source": "highest measured ratio" if model_type == "default" else "not measured; highest measured ratio",
+        }
+    calibration["families"] = dict(sorted(families.items()))
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, indent=2)
+        f.write("\n")
+    logger.info(f"Calibrated token estimates on {len(files)} file(s): {calibration['bytes_per_token']}, "
+                f"measured families: {sorted(counters)}")
+    return calibration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SprintSeed tokenizer calibration")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    calibrate_parser = subparsers.add_parser("calibrate", help="Measure bytes and family tokens per cl100k token on the bundled corpus")
+    calibrate_parser.add_argument("--corpus", type=Path, default=CALIBRATION_CORPUS_DIR)
+    calibrate_parser.add_argument("--gemini-tokenizer", default=GEMINI_TOKENIZER_MODEL,
+                                  help="Gemma SentencePiece tokenizer.model (needs sentencepiece)")
+    calibrate_parser.add_argument("--anthropic-tokenizer", default=ANTHROPIC_TOKENIZER_FILE,
+                                  help="Claude tokenizer.json (needs tokenizers)")
+    subparsers.add_parser("show", help="Show the calibration and the per-family estimate ranges")
+    args = parser.parse_args()
+
+    if args.command == "calibrate":
+        counters = family_counters(args.gemini_tokenizer, args.anthropic_tokenizer)
+        print(json.dumps(calibrate(args.corpus, counters=counters), indent=2))
+    elif args.command == "show":
+        report = {"mode": TOKENIZER_MODE, "calibration": _calibration, "families": {}}
+        for model_type in TOKENIZER_CLASSES:
+            tokenizer = get_tokenizer(model_type)
+            report["families"][model_type] = {
+                "tokenizer": type(tokenizer).__name__,
+                "base_ratio": tokenizer.base_ratio,
+                "bytes_per_token_range": [round(tokenizer.min_bytes_per_token, 3), round(tokenizer.max_bytes_per_token, 3)],
+            }
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
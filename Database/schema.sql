@@ -1,3 +1,7 @@
+-- Initial schema, kept for reference. Later changes (indexes, new tables and
+-- columns) live in the versioned, idempotent migrations in Backend/migrations,
+-- applied once per release as a deploy step with `python -m utils.migrations upgrade`.
+
 -- Create schema
 CREATE SCHEMA task_management;
 
@@ -113,7 +117,9 @@ CREATE TABLE IF NOT EXISTS task_management.conversation_message (
     message_id VARCHAR(100) PRIMARY KEY,
     conversation_id VARCHAR(100) REFERENCES task_management.conversation(conversation_id) ON DELETE CASCADE,
     user_query VARCHAR(5000) NOT NULL, 
-    agent_response TEXT NOT NULL,
+    agent_response TEXT NOT NULL, -- '' when stored compressed
+    agent_response_zstd BYTEA, -- zstd frame of large responses
+    search_vector TSVECTOR, -- written by insert_conversation_message (utils/search.py)
     model_id VARCHAR(100), -- Required for agent messages, NULL for user messages
     model_type VARCHAR(50), -- e.g., 'text', 'vision'
     tokens_used INTEGER, -- Track token usage
@@ -121,6 +127,15 @@ CREATE TABLE IF NOT EXISTS task_management.conversation_message (
     is_deleted BOOLEAN DEFAULT FALSE
 );
 
+-- Current SRS (latest message) of each project, maintained by insert_conversation_message
+CREATE TABLE IF NOT EXISTS task_management.project_srs (
+    project_id VARCHAR(100) PRIMARY KEY REFERENCES task_management.projects(project_id) ON DELETE CASCADE,
+    message_id VARCHAR(100) NOT NULL REFERENCES task_management.conversation_message(message_id) ON DELETE CASCADE,
+    content_hash CHAR(64) NOT NULL, -- SHA-256 of agent_response
+    token_count INTEGER,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create conversation_attachment table for files attached to messages
 CREATE TABLE IF NOT EXISTS task_management.conversation_attachment (
     attachment_id VARCHAR(100) PRIMARY KEY,
@@ -128,20 +143,18 @@ CREATE TABLE IF NOT EXISTS task_management.conversation_attachment (
     file_name VARCHAR(255) NOT NULL,
     file_type VARCHAR(100) NOT NULL, -- MIME type
     file_size BIGINT NOT NULL, -- in bytes
-    file_content TEXT,
+    file_content TEXT, -- legacy; content now lives in the blob store
+    content_hash CHAR(64), -- SHA-256 of the content in the blob store
+    extracted_text TEXT, -- text extracted at upload time, NULL when stored compressed
+    extracted_text_zstd BYTEA, -- zstd frame of large extracted text
+    token_count INTEGER,
+    section_offsets JSONB NOT NULL DEFAULT '[]'::jsonb, -- [{label, start, end, token_count}]
+    chunk_index_hash CHAR(64), -- blob store key of the BM25 chunk index (utils/retrieval.py)
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     is_deleted BOOLEAN DEFAULT FALSE
 );
 
 
--- Add unique constraint to username
-ALTER TABLE task_management.users
-ADD CONSTRAINT unique_username UNIQUE (username);
-
--- Add unique constraint to email
-ALTER TABLE task_management.users
-ADD CONSTRAINT unique_email UNIQUE (email);
-
 -- Insert predefined roles with manual role_id values
 INSERT INTO task_management.roles (role_id, role_name, description)
 VALUES 
@@ -150,18 +163,18 @@ VALUES
   ('3', 'Backend Developer', 'Handles server-side logic, database, and application integration.'),
   ('4', 'Database Manager', 'Manages the database schema, security, and data integrity.');
 
--- CREATE TABLE task_management.llm_models (
---     model_id VARCHAR(100) PRIMARY KEY,  
---     display_model_name VARCHAR(100) NOT NULL,
---     model_name VARCHAR(100) NOT NULL UNIQUE,
---     model_type VARCHAR(50) NOT NULL,
---     context_window INTEGER,
---     max_token INTEGER,
---     location VARCHAR(100),
---     is_image_support BOOLEAN DEFAULT FALSE,
---     is_deleted BOOLEAN DEFAULT FALSE,
---     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
--- );
+CREATE TABLE task_management.llm_models (
+    model_id VARCHAR(100) PRIMARY KEY,  
+    display_model_name VARCHAR(100) NOT NULL,
+    model_name VARCHAR(100) NOT NULL UNIQUE,
+    model_type VARCHAR(50) NOT NULL,
+    context_window INTEGER,
+    max_token INTEGER,
+    location VARCHAR(100),
+    is_image_support BOOLEAN DEFAULT FALSE,
+    is_deleted BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
 
 INSERT INTO task_management.llm_models (
 	model_id,
@@ -182,16 +195,19 @@ INSERT INTO task_management.llm_models (
 -- 4
 (4,'Gemini 2.0 Flash Thinking', 'gemini-2.0-flash-thinking-exp', 'google_genai', 64000, 1000000, 'us-central1', TRUE),
 -- 5
-(5,'Gemini 2.5 Flash', 'gemini-2.5-flash', 'google_genai', 64000, 1000000, 'us-central1', TRUE)
+(5,'Gemini 2.5 Flash', 'gemini-2.5-flash', 'google_genai', 64000, 1000000, 'us-central1', TRUE);
 
+-- Reload the model registry of every worker when llm_models changes (utils/model_registry.py)
+CREATE OR REPLACE FUNCTION task_management.notify_llm_models_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('llm_models_changed', TG_OP);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
 
--- Add technical_requirements column to tasks table
-ALTER TABLE task_management.tasks 
-ADD COLUMN technical_requirements TEXT;
-
--- Add acceptance_criteria column to tasks table
-ALTER TABLE task_management.tasks 
-ADD COLUMN acceptance_criteria TEXT
+CREATE TRIGGER llm_models_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON task_management.llm_models
+    FOR EACH STATEMENT EXECUTE FUNCTION task_management.notify_llm_models_changed();
 
 
 -- Add technical_requirements column to tasks table
@@ -200,7 +216,14 @@ ADD COLUMN technical_requirements TEXT;
 
 -- Add acceptance_criteria column to tasks table
 ALTER TABLE task_management.tasks 
-ADD COLUMN acceptance_criteria TEXT
+ADD COLUMN acceptance_criteria TEXT;
+
+-- Full-text search vector for tasks (utils/search.py)
+ALTER TABLE task_management.tasks
+ADD COLUMN search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', COALESCE(title, '')), 'A') ||
+    setweight(to_tsvector('english', COALESCE(description, '')), 'B')
+) STORED;
 
 
 INSERT INTO task_management.users (